@@ -1,15 +1,27 @@
 from flask import Flask
 from flask_cors import CORS  # <-- ajouter ceci
+from services.logging_config import setup_logging
+
+# Avant l'import des routes : leurs messages d'initialisation sont journalisés
+setup_logging()
+
 from routes.chat import chat_bp
-from services.vector_db import init_chroma
+from services.resources import resources
+from services.llm_service import llm_lifecycle
+from config import FLASK_PORT, FLASK_DEBUG, WARM_UP_ON_START, OLLAMA_WARM_UP
 
 app = Flask(__name__)
 CORS(app)  # <-- autorise toutes les origines pour le développement
 app.register_blueprint(chat_bp)
 
-# 🔹 Initialisation ChromaDB
-client, collection = init_chroma()
-print("✅ ChromaDB initialisée. Collection:", collection.name)
+# 🔹 ChromaDB, index, modèle d'embedding et SQLite : préchargés en arrière-plan
+# (GET /ready passe à 200 une fois terminé), sinon chargés à la première requête
+if WARM_UP_ON_START:
+    resources.start_warm_up()
+
+# 🔹 Modèle Ollama : préchargé puis gardé en mémoire (keep_alive)
+llm_lifecycle.start(warm_up=OLLAMA_WARM_UP)
 
+# Serveur de développement ; en production : python serve.py (ASGI, uvicorn)
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    app.run(host="0.0.0.0", port=FLASK_PORT, debug=FLASK_DEBUG)
@@ -0,0 +1,378 @@
+"""
+Application ASGI (Starlette) : mêmes routes et mêmes réponses que
+l'application Flask (routes/chat.py), pour le serveur de production
+(serve.py). L'attente du LLM ne mobilise pas de thread : les appels à
+Ollama passent par httpx en asynchrone, seules les étapes bloquantes
+(embeddings, ChromaDB, SQLite) sont exécutées dans un pool de threads
+borné (ASGI_BLOCKING_THREADS). Des centaines de générations peuvent
+ainsi être en cours ou en attente d'un slot Ollama simultanément.
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from services.logging_config import setup_logging
+
+# Avant l'import des routes : leurs messages d'initialisation sont journalisés
+setup_logging()
+
+from config import (
+    ASGI_BLOCKING_THREADS, CONVERSATIONS_PAGE_SIZE, WARM_UP_ON_START, OLLAMA_WARM_UP, ASK_SINGLE_FLIGHT,
+    ASK_BATCH_CONCURRENCY
+)
+from routes import chat
+from services.conversation_db import create_conversation, add_message, get_conversation, list_conversations
+from services.llm_async import async_llm_client, generate_juridique_async, stream_ollama_juridique_async
+from services.llm_service import (
+    llm_lifecycle, RESPONSE_HEADER, STREAM_INTERRUPTED_NOTICE, LLMStreamInterrupted, clean_juridique_answer,
+    format_ai_response_with_sources, format_sources_footer, generate_smart_fallback
+)
+from services.answer_cache import normalize_question
+from services.metrics import REGISTRY, CONTENT_TYPE, COALESCED_REQUESTS, RequestTimings, gauge
+from services.resources import resources
+from services.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+_blocking_pool = ThreadPoolExecutor(max_workers=ASGI_BLOCKING_THREADS, thread_name_prefix="asgi-blocking")
+
+# Questions identiques (normalisées) en cours de traitement dans /ask
+ask_flights = AsyncSingleFlight()
+
+gauge("rag_asgi_llm_in_flight", "Générations Ollama en cours (mode ASGI)",
+      lambda: async_llm_client.get_stats()["in_flight"])
+gauge("rag_asgi_llm_waiting", "Requêtes en attente d'un slot Ollama (mode ASGI)",
+      lambda: async_llm_client.get_stats()["waiting"])
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Exécute un appel bloquant (Chroma, SQLite, embeddings) hors de la boucle d'événements."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_pool, functools.partial(func, *args, **kwargs))
+
+
+async def _json_body(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _start_turn(question, conversation_id):
+    """Crée la conversation si besoin et enregistre la question (appel bloquant)."""
+    conversation_id = chat._ensure_conversation(question, conversation_id)
+    chat._save_message(conversation_id, 'user', question)
+    return conversation_id
+
+
+async def _answer_question(question, timings, corpus=None):
+    """Recherche puis génération complètes de /ask (calcul partagé par single-flight)."""
+    prepared = await run_blocking(chat._prepare_answer, question, timings, corpus)
+    if prepared["status"] == "generate":
+        with timings.stage("llm"):
+            answer, used_llm = await generate_juridique_async(question, prepared["context"], prepared["references"])
+        await run_blocking(chat._complete_answer, question, prepared, answer, used_llm)
+    return prepared
+
+
+async def _coalesced_answer(question, timings, corpus=None):
+    """Comme chat._coalesced_answer : retourne (prepared, partagé)."""
+    if not ASK_SINGLE_FLIGHT:
+        return await _answer_question(question, timings, corpus), False
+    start = time.perf_counter()
+    prepared, shared = await ask_flights.do(
+        (normalize_question(question), corpus), lambda: _answer_question(question, timings, corpus)
+    )
+    if shared:
+        timings.record("coalesced_wait", time.perf_counter() - start)
+        COALESCED_REQUESTS.inc(endpoint=timings.endpoint)
+    return prepared, shared
+
+
+# ================================
+# 💬 Endpoint principal : /ask
+# ================================
+async def ask(request):
+    timings = RequestTimings('/ask')
+    data = await _json_body(request)
+    question = str(data.get('question') or '').strip()
+
+    if not question:
+        timings.finish("bad_request")
+        return JSONResponse({"error": "❌ Question manquante.", "question": ""}, status_code=400)
+
+    corpus, error = chat._corpus_param(data.get('corpus'))
+    if error:
+        timings.finish("bad_request")
+        return JSONResponse({"error": f"❌ {error}", "question": question}, status_code=400)
+
+    try:
+        conversation_id = await run_blocking(_start_turn, question, data.get('conversation_id'))
+
+        prepared, coalesced = await _coalesced_answer(question, timings, corpus)
+
+        await run_blocking(chat._save_message, conversation_id, 'bot', prepared["answer"])
+
+        payload = chat._ask_payload(question, prepared, conversation_id, coalesced)
+        timings.finish(payload["status"], fallback=payload["fallback"], cached=payload["cached"],
+                       sources=payload["sources_count"], coalesced=coalesced,
+                       prompt_tokens=prepared.get("prompt_tokens"))
+        return JSONResponse(payload)
+
+    except Exception as e:
+        logger.exception("Erreur serveur : %s", e)
+        timings.finish("error")
+        return JSONResponse({"error": f"Erreur serveur : {str(e)}", "question": question}, status_code=500)
+
+
+# ================================
+# 📡 Endpoint streaming : /ask/stream (SSE)
+# ================================
+async def ask_stream(request):
+    data = await _json_body(request)
+    question = str(data.get('question') or '').strip()
+
+    if not question:
+        return JSONResponse({"error": "❌ Question manquante.", "question": ""}, status_code=400)
+
+    corpus, error = chat._corpus_param(data.get('corpus'))
+    if error:
+        return JSONResponse({"error": f"❌ {error}", "question": question}, status_code=400)
+
+    timings = RequestTimings('/ask/stream')
+    conversation_id = await run_blocking(_start_turn, question, data.get('conversation_id'))
+
+    async def generate():
+        try:
+            prepared = await run_blocking(chat._prepare_answer, question, timings, corpus)
+            yield chat._sse('meta', chat._meta_payload(question, prepared, conversation_id))
+
+            if prepared["status"] != "generate":
+                yield chat._sse('token', {"text": prepared["answer"]})
+                await run_blocking(chat._save_message, conversation_id, 'bot', prepared["answer"])
+                yield chat._sse('done', chat._stream_done(timings, prepared))
+                return
+
+            context, references = prepared["context"], prepared["references"]
+            llm_start = time.perf_counter()
+            tokens = stream_ollama_juridique_async(question, context)
+
+            # Même logique que la version Flask : en-tête envoyé après le premier token
+            first_token = await anext(tokens, None)
+            timings.record("llm_first_token", time.perf_counter() - llm_start)
+            if first_token is None:
+                logger.warning("LLM local n'a pas répondu → utilisation du fallback")
+                answer = generate_smart_fallback(question, references)
+                await run_blocking(chat._complete_answer, question, prepared, answer, used_llm=False)
+                yield chat._sse('token', {"text": answer})
+                await run_blocking(chat._save_message, conversation_id, 'bot', answer)
+                yield chat._sse('done', chat._stream_done(timings, prepared))
+                return
+
+            yield chat._sse('token', {"text": RESPONSE_HEADER})
+            parts = [first_token]
+            yield chat._sse('token', {"text": first_token})
+            try:
+                async for token in tokens:
+                    parts.append(token)
+                    yield chat._sse('token', {"text": token})
+            except LLMStreamInterrupted:
+                # Réponse coupée : signalée au client, jamais présentée comme complète
+                logger.warning("Flux du LLM interrompu → réponse partielle signalée")
+                prepared["interrupted"] = True
+                yield chat._sse('token', {"text": STREAM_INTERRUPTED_NOTICE})
+            timings.record("llm", time.perf_counter() - llm_start)
+
+            yield chat._sse('references', {"text": "\n\n" + format_sources_footer(references)})
+
+            text = clean_juridique_answer(''.join(parts))
+            if prepared.get("interrupted"):
+                text += STREAM_INTERRUPTED_NOTICE
+            answer = format_ai_response_with_sources(text, references)
+            if prepared.get("interrupted"):
+                chat._interrupted_answer(prepared, answer)
+            else:
+                await run_blocking(chat._complete_answer, question, prepared, answer, used_llm=True)
+            await run_blocking(chat._save_message, conversation_id, 'bot', answer)
+            yield chat._sse('done', chat._stream_done(timings, prepared))
+
+        except Exception as e:
+            logger.exception("Erreur serveur (streaming) : %s", e)
+            timings.finish("error")
+            yield chat._sse('error', {"error": f"Erreur serveur : {str(e)}"})
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# ================================
+# 📦 Endpoint en lot : /ask/batch (NDJSON)
+# ================================
+async def ask_batch(request):
+    """Même contrat que la version Flask (chat.ask_batch)."""
+    data = await _json_body(request)
+    items, error = chat._batch_items(data)
+    if error:
+        return JSONResponse({"error": f"❌ {error}"}, status_code=400)
+    persist = bool(data.get('persist'))
+    conversation_id = data.get('conversation_id')
+
+    timings = RequestTimings('/ask/batch')
+    groups = chat._batch_groups(items)
+    unique = [items[indices[0]] for indices in groups]
+    slots = asyncio.Semaphore(ASK_BATCH_CONCURRENCY)
+
+    async def lines_for(indices, prepared):
+        if persist:
+            return await run_blocking(chat._batch_lines, items, indices, prepared, persist, conversation_id)
+        return chat._batch_lines(items, indices, prepared, persist, conversation_id)
+
+    async def answer(indices, question, prepared):
+        async with slots:
+            start = time.perf_counter()
+            text, used_llm = await generate_juridique_async(question, prepared["context"], prepared["references"])
+        timings.record("llm", time.perf_counter() - start)
+        await run_blocking(chat._complete_answer, question, prepared, text, used_llm)
+        return indices, prepared
+
+    async def generate():
+        tasks = []
+        try:
+            prepared_list = await run_blocking(chat._prepare_batch, unique, timings)
+
+            for indices, (question, _), prepared in zip(groups, unique, prepared_list):
+                if prepared["status"] == "generate":
+                    tasks.append(asyncio.create_task(answer(indices, question, prepared)))
+                else:
+                    for line in await lines_for(indices, prepared):
+                        yield line
+
+            for next_done in asyncio.as_completed(tasks):
+                indices, prepared = await next_done
+                for line in await lines_for(indices, prepared):
+                    yield line
+
+            yield chat._batch_done(timings, items, prepared_list)
+
+        except Exception as e:
+            logger.exception("Erreur serveur (lot) : %s", e)
+            timings.finish("error")
+            yield chat._ndjson({"error": f"Erreur serveur : {str(e)}"})
+        finally:
+            # Client déconnecté : les générations restantes sont annulées
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+
+# ================================
+# 🗂️ Endpoints d'historique
+# ================================
+async def create_conv(request):
+    data = await _json_body(request)
+    conv_id = await run_blocking(create_conversation, title=data.get('title'))
+    return JSONResponse({"conversation_id": conv_id}, status_code=201)
+
+
+async def list_conv(request):
+    limit, error = chat._page_limit(request.query_params.get('limit', CONVERSATIONS_PAGE_SIZE))
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
+
+    convs = await run_blocking(
+        list_conversations,
+        limit=limit,
+        before=request.query_params.get('before'),
+        before_id=request.query_params.get('before_id')
+    )
+    return JSONResponse(convs)
+
+
+async def get_conv(request):
+    conv = await run_blocking(get_conversation, request.path_params['conv_id'])
+    if not conv:
+        return JSONResponse({"error": "Conversation introuvable"}, status_code=404)
+    return JSONResponse(conv)
+
+
+async def post_message(request):
+    data = await _json_body(request)
+    role = data.get('role')
+    text = data.get('text')
+    if not role or not text:
+        return JSONResponse({"error": "role et text sont requis"}, status_code=400)
+    try:
+        await run_blocking(add_message, request.path_params['conv_id'], role, text, data.get('timestamp'))
+        return JSONResponse({"status": "ok"}, status_code=201)
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+# ================================
+# 🩺 Endpoints de santé et de métriques
+# ================================
+async def health(request):
+    try:
+        payload = await run_blocking(chat._health_payload, async_llm_client.get_stats(), ask_flights.get_stats())
+        return JSONResponse(payload)
+    except Exception as e:
+        return JSONResponse({"status": "❌ Erreur", "error": str(e)}, status_code=500)
+
+
+async def ready(request):
+    payload, status_code = chat._ready_payload()
+    return JSONResponse(payload, status_code=status_code)
+
+
+async def metrics(request):
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await async_llm_client.start()
+    if WARM_UP_ON_START:
+        # En arrière-plan : le serveur répond (GET /ready → 503) pendant le chargement
+        resources.start_warm_up()
+    # Modèle Ollama préchargé puis gardé en mémoire (thread, hors des slots de génération)
+    llm_lifecycle.start(warm_up=OLLAMA_WARM_UP)
+    logger.info("Serveur ASGI prêt", extra={"blocking_threads": ASGI_BLOCKING_THREADS})
+    try:
+        yield
+    finally:
+        llm_lifecycle.stop()
+        await async_llm_client.aclose()
+        _blocking_pool.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/ask', ask, methods=['POST']),
+        Route('/ask/stream', ask_stream, methods=['POST']),
+        Route('/ask/batch', ask_batch, methods=['POST']),
+        Route('/conversations', create_conv, methods=['POST']),
+        Route('/conversations', list_conv, methods=['GET']),
+        Route('/conversations/{conv_id}', get_conv, methods=['GET']),
+        Route('/conversations/{conv_id}/messages', post_message, methods=['POST']),
+        Route('/health', health, methods=['GET']),
+        Route('/ready', ready, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
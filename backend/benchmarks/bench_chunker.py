@@ -0,0 +1,131 @@
+"""
+Benchmark du découpage des articles : "sentences" (phrases, 1000 caractères)
+contre "structure" (marqueurs I.-, 1°-, a)..., budget en tokens, recouvrement).
+
+Pour chaque découpage, sur les CSV bundlés (data/*.csv) :
+  - nombre de chunks, tokens par chunk (p50 / p95 / max), part des chunks
+    au-delà de la limite du modèle d'embedding (256 tokens, tronqués)
+  - qualité de la recherche sur les questions de benchmarks/queries.json
+    (article attendu) : recall@TOP_K et MRR@10, en BM25 par défaut ou en
+    vecteurs avec --vector (modèle d'embedding requis)
+  - tokens par prompt : tokens des TOP_K chunks envoyés au LLM
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_chunker [--data-dir data] [--vector]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import TOP_K  # noqa: E402
+from preprocessing.chunker import get_chunker  # noqa: E402
+from preprocessing.load_csv import iter_chunks, iter_unique, source_name_for  # noqa: E402
+from services.article_index import normalize_article_number, normalize_doc  # noqa: E402
+from services.lexical_index import build_lexical_index, load_lexical_index  # noqa: E402
+
+EMBEDDING_LIMIT = 256
+QUERIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "queries.json")
+
+
+def _load_chunks(files, chunker):
+    chunks = []
+    for file_name in files:
+        chunks.extend(iter_unique(iter_chunks(file_name, source_name_for(file_name), chunker)))
+    return chunks
+
+
+def _article_key(meta):
+    return normalize_doc(meta.get("doc", "")), normalize_article_number(meta.get("article", ""))
+
+
+def _lexical_ranker(chunks, workdir):
+    path = os.path.join(workdir, "lexical")
+    build_lexical_index([c[0] for c in chunks], [c[1] for c in chunks], path)
+    index = load_lexical_index(path)
+    position = {c[0]: i for i, c in enumerate(chunks)}
+    return lambda question, k: [position[chunk_id] for chunk_id, _ in index.search(question, k)]
+
+
+def _vector_ranker(chunks):
+    from services.embedding_service import embedding_service
+    matrix = np.asarray(embedding_service.embed_documents([c[1] for c in chunks]), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+
+    def rank(question, k):
+        query = np.asarray(embedding_service.embed_query(question), dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) + 1e-12))
+        return list(np.argsort(-scores)[:k])
+    return rank
+
+
+def evaluate(name, chunks, queries, rank, count):
+    tokens = np.array([count(text) for _, text, _ in chunks])
+    hits, reciprocal, prompt_tokens = 0, 0.0, []
+    for query in queries:
+        expected = (query["doc"], query["article"])
+        ranked = rank(query["question"], 10)
+        keys = [_article_key(chunks[i][2]) for i in ranked]
+        if expected in keys[:TOP_K]:
+            hits += 1
+        if expected in keys:
+            reciprocal += 1 / (keys.index(expected) + 1)
+        prompt_tokens.append(int(tokens[ranked[:TOP_K]].sum()) if ranked else 0)
+
+    return {
+        "chunker": name,
+        "chunks": len(chunks),
+        "tokens_p50": round(float(np.percentile(tokens, 50)), 1),
+        "tokens_p95": round(float(np.percentile(tokens, 95)), 1),
+        "tokens_max": int(tokens.max()),
+        "over_limit_pct": round(100 * float((tokens > EMBEDDING_LIMIT - 2).mean()), 1),
+        f"recall@{TOP_K}": round(hits / len(queries), 3),
+        "mrr@10": round(reciprocal / len(queries), 3),
+        "prompt_tokens_p50": round(float(np.percentile(prompt_tokens, 50)), 1),
+        "prompt_tokens_max": int(max(prompt_tokens)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--vector", action="store_true", help="recherche vectorielle au lieu de BM25")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.csv")))
+    with open(args.queries, encoding="utf-8") as f:
+        # Les références directes ("Article 2 du CGI") ne passent pas par la recherche
+        queries = [q for q in json.load(f) if q.get("type", "question") == "question"]
+    # Même tokenizer pour les deux découpages : les comptes sont comparables
+    count = get_chunker().count
+
+    results = []
+    for name in ("sentences", "structure"):
+        chunks = _load_chunks(files, name)
+        with tempfile.TemporaryDirectory() as workdir:
+            rank = _vector_ranker(chunks) if args.vector else _lexical_ranker(chunks, workdir)
+            results.append(evaluate(name, chunks, queries, rank, count))
+
+    print(f"\n📊 {len(queries)} questions, recherche {'vectorielle' if args.vector else 'BM25'}, "
+          f"tokenizer : {get_chunker().tokenizer.name}\n")
+    columns = list(results[0])
+    print("  ".join(f"{c:>17}" for c in columns))
+    for result in results:
+        print("  ".join(f"{str(result[c]):>17}" for c in columns))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
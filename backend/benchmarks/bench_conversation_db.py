@@ -0,0 +1,90 @@
+"""
+Micro-benchmark des écritures dans l'historique des conversations.
+
+Compare, sous N threads concurrents (comme les workers Flask) :
+  - avant : une connexion SQLite ouverte/fermée par appel (journal par défaut)
+  - après : conversation_db (pool de connexions persistantes, WAL)
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_conversation_db --threads 8 --writes 500
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+def _legacy_add_message(db_filename, conversation_id, role, text):
+    """Copie de l'ancienne implémentation : connexion par appel."""
+    os.makedirs(os.path.dirname(db_filename), exist_ok=True)
+    conn = sqlite3.connect(db_filename, check_same_thread=False)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO messages (conversation_id, role, text, timestamp) VALUES (?,?,?,?)",
+        (conversation_id, role, text, datetime.utcnow().isoformat())
+    )
+    conn.commit()
+    conn.close()
+
+
+def _run(label, write, threads, writes):
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(writes):
+                write(f"conv-{n}", "user" if i % 2 else "bot", f"message {i} du thread {n}")
+        except Exception as e:
+            errors.append(e)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * writes - len(errors)
+    print(f"{label:<8} {total:>7} écritures en {elapsed:6.2f}s → {total / elapsed:9.1f} écritures/s"
+          f"{f'  ({len(errors)} erreurs)' if errors else ''}")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=500, help="écritures par thread")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # CHROMA_DIR doit être défini avant l'import de config
+        os.environ["CHROMA_DIR"] = os.path.join(tmp, "after")
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from services import conversation_db
+
+        conversation_db.init_db()
+
+        legacy_db = os.path.join(tmp, "before", "conversations.sqlite3")
+        os.makedirs(os.path.dirname(legacy_db))
+        with sqlite3.connect(legacy_db) as conn:
+            conn.execute(
+                "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "conversation_id TEXT, role TEXT, text TEXT, timestamp TEXT)"
+            )
+
+        print(f"🧪 {args.threads} threads × {args.writes} écritures\n")
+        before = _run("avant", lambda c, r, t: _legacy_add_message(legacy_db, c, r, t), args.threads, args.writes)
+        after = _run("après", conversation_db.add_message, args.threads, args.writes)
+        print(f"\n📈 Gain : x{after / before:.1f}")
+
+        conversation_db.close_db()
+
+
+if __name__ == "__main__":
+    main()
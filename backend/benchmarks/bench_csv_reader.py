@@ -0,0 +1,101 @@
+"""
+Benchmark de la lecture des CSV bundlés (data/*.csv) jusqu'aux chunks.
+
+Compare :
+  - avant : pandas.read_csv + prétraitement du DataFrame + iterrows,
+            tous les chunks accumulés en mémoire (ancien ingest_simple)
+  - après : preprocessing.load_csv.iter_chunks, lecture en flux
+
+Mesure le temps et le pic mémoire (tracemalloc) par fichier, et vérifie
+que les deux lectures produisent les mêmes chunks.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_csv_reader [--data-dir data]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing.load_csv import chunk_text, iter_chunks, source_name_for, MAX_CHUNK_CHARS  # noqa: E402
+
+
+def _legacy_chunks(file_name):
+    """Copie de l'ancienne lecture pandas (load_csv + preprocess_csv + prepare_chunks)."""
+    import pandas as pd
+
+    df = pd.read_csv(file_name, encoding='utf-8-sig')
+    df.columns = [col.strip().lower() for col in df.columns]
+    col_mapping = {
+        'doc': 'DOC', 'titre': 'Titre', 'chapitre': 'Chapitre',
+        'section': 'Section', 'article': 'Article',
+        'contenu': 'Contenu', 'texte': 'Contenu', 'pages': 'Pages'
+    }
+    df = df.rename(columns={col: col_mapping.get(col, col) for col in df.columns})
+    for col in ['DOC', 'Titre', 'Chapitre', 'Section', 'Article', 'Contenu', 'Pages']:
+        if col not in df.columns:
+            df[col] = ''
+    df['texte_complet'] = df['Article'].fillna('') + ' ' + df['Contenu'].fillna('')
+    df['texte_complet'] = df['texte_complet'].str.replace('\r\n', ' ').str.strip()
+
+    texts = []
+    for _, row in df.iterrows():
+        content = str(row['texte_complet']).strip()
+        if not content or content == 'nan':
+            continue
+        texts.extend(chunk_text(content) if len(content) > MAX_CHUNK_CHARS else [content])
+    return texts
+
+
+def _streaming_chunks(file_name):
+    # Consommé au fil de l'eau : seul le compte et une empreinte sont gardés
+    count, texts = 0, []
+    for _, text, _ in iter_chunks(file_name, source_name_for(file_name)):
+        count += 1
+        texts.append(hash(text))
+    return count, texts
+
+
+def _measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    args = parser.parse_args()
+
+    try:
+        import pandas  # noqa: F401
+        has_pandas = True
+    except ImportError:
+        has_pandas = False
+        print("⚠️ pandas absent : seule la lecture en flux est mesurée\n")
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.csv")))
+    print(f"{'fichier':<45} {'mode':<6} {'chunks':>7} {'temps':>8} {'pic mém.':>10}")
+    for file_name in files:
+        name = os.path.basename(file_name)
+        (count, hashes), elapsed, peak = _measure(_streaming_chunks, file_name)
+        print(f"{name:<45} {'flux':<6} {count:>7} {elapsed:7.2f}s {peak:8.1f}Mo")
+
+        if has_pandas:
+            texts, elapsed, peak = _measure(_legacy_chunks, file_name)
+            same = [hash(t) for t in texts] == hashes
+            print(f"{'':<45} {'pandas':<6} {len(texts):>7} {elapsed:7.2f}s {peak:8.1f}Mo"
+                  f"  {'✅ chunks identiques' if same else '⚠️ chunks différents'}")
+
+
+if __name__ == "__main__":
+    main()
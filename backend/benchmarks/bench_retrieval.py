@@ -0,0 +1,314 @@
+"""
+Benchmark de la chaîne de recherche de /ask sur les corpus bundlés.
+
+Construit un index (ChromaDB, BM25, articles) depuis data/*.csv dans un
+dossier temporaire, démarre un faux Ollama local (benchmarks/mock_ollama.py)
+puis exécute les questions de benchmarks/queries.json par le chemin de
+/ask (chat._answer_question), avec un chronométrage compatible
+RequestTimings : mêmes étapes et mêmes noms que les journaux de l'API
+(article_lookup, route, embed, chroma_query, filter, lexical_fusion,
+article_boost, rerank, context, llm).
+  - questions reformulées : article attendu dans les résultats
+  - références directes ("Article 2 du CGI") : réponse 'article_lookup'
+Les caches (embeddings, scores du cross-encoder, réponses) sont désactivés
+sauf réglage explicite : chaque passe mesure le coût réel.
+
+Rapporte la latence p50 / p95 / p99 de chaque étape, le recall@TOP_K et le
+MRR (classement vectoriel brut et contexte final), le taux de routage
+vers un corpus et sa justesse, la taille du contexte et du prompt (tokens)
+et le taux de réussite des accès directs. Le résultat est écrit en JSON
+pour comparer les exécutions dans le temps (--baseline affiche les écarts
+avec une exécution précédente).
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_retrieval [--repeat 3] [--output run.json]
+                                         [--baseline previous.json]
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_ollama import start_mock_ollama  # noqa: E402
+
+QUERIES_FILE = os.path.join(BACKEND_DIR, "benchmarks", "queries.json")
+STAGES = [
+    "article_lookup", "route", "embed", "chroma_query", "filter", "lexical_fusion", "article_boost", "rerank",
+    "context", "llm",
+]
+
+
+def latency_stats(samples):
+    """Statistiques (ms) d'une liste de durées en secondes."""
+    if not samples:
+        return {"n": 0}
+    values = np.array(samples) * 1000
+    return {
+        "n": len(values),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _rank_of(expected, metas):
+    """Rang (1..n) du premier chunk de l'article attendu, ou None."""
+    from services.article_index import normalize_article_number, normalize_doc
+    for rank, meta in enumerate(metas, 1):
+        key = (normalize_doc(meta.get("doc", "")), normalize_article_number(meta.get("article", "")))
+        if key == expected:
+            return rank
+    return None
+
+
+class _Recorder:
+    """
+    Même interface que RequestTimings (stage, record), passée aux fonctions
+    de routes/chat.py : chaque étape exécutée ajoute un échantillon.
+    """
+
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self.tokens = {"context": [], "prompt": []}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+
+def run_question(chat, question, timer):
+    """Une question par le chemin complet de /ask ; retourne le dict de chat._answer_question."""
+    prepared = chat._answer_question(question, timer)
+    if prepared.get("context_tokens") is not None:
+        timer.tokens["context"].append(prepared["context_tokens"])
+        timer.tokens["prompt"].append(prepared["prompt_tokens"])
+    return prepared
+
+
+def ranks(chat, prepared, expected):
+    """
+    Rang de l'article attendu (hors chronométrage) : dans les résultats
+    vectoriels bruts du corpus retenu et dans les chunks finaux.
+    """
+    if not prepared.get("chunk_ids"):
+        return None, None
+    raw = chat._query_vectors(prepared["query_embedding"], prepared["corpus"])
+    found = chat.resources.collection.get(ids=prepared["chunk_ids"], include=["metadatas"])
+    by_id = dict(zip(found["ids"], found["metadatas"]))
+    final = [by_id[chunk_id] for chunk_id in prepared["chunk_ids"] if chunk_id in by_id]
+    return _rank_of(expected, raw["metadatas"][0]), _rank_of(expected, final)
+
+
+def run_lookup(chat, question, timer):
+    """Une référence directe ; retourne le (corpus, numéro) reconnu ou None."""
+    prepared = chat._answer_question(question, timer)
+    if prepared["status"] != "article_lookup":
+        return None
+    doc_key, number, _ = chat._parse_article_reference(question)
+    return doc_key, number
+
+
+def compare(current, baseline):
+    """Écarts avec une exécution précédente (latences p50/p95, qualité)."""
+    print(f"\n📈 Comparaison avec {baseline.get('git_commit')} ({baseline.get('timestamp')})")
+    for stage, stats in current["latency_ms"].items():
+        before = baseline.get("latency_ms", {}).get(stage, {})
+        if stats.get("n") and before.get("n"):
+            print(f"   {stage:<15} p50 {before['p50']:9.2f} → {stats['p50']:9.2f} ms"
+                  f"   p95 {before['p95']:9.2f} → {stats['p95']:9.2f} ms")
+    for metric, value in current["quality"].items():
+        before = baseline.get("quality", {}).get(metric)
+        if before is not None:
+            print(f"   {metric:<22} {before:6.3f} → {value:6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=os.path.join(BACKEND_DIR, "data"))
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--repeat", type=int, default=3, help="passes sur les questions (latences)")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="latence du faux Ollama")
+    parser.add_argument("--index-dir", help="dossier d'index réutilisé d'une exécution à l'autre")
+    parser.add_argument("--output", help="fichier JSON du résultat (sinon sur la sortie standard)")
+    parser.add_argument("--baseline", help="résultat JSON d'une exécution précédente à comparer")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.data_dir, "*.csv")))
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+    questions = [q for q in queries if q.get("type", "question") == "question"]
+    lookups = [q for q in queries if q.get("type") == "lookup"]
+
+    # La configuration est lue à l'import : index et faux Ollama d'abord
+    workdir = args.index_dir or tempfile.mkdtemp(prefix="bench_retrieval_")
+    os.environ["CHROMA_DIR"] = workdir
+    mock_server, mock_url = start_mock_ollama(first_token_ms=args.llm_latency_ms)
+    os.environ["OLLAMA_BASE_URL"] = mock_url
+    os.environ.setdefault("EMBEDDING_CACHE_SIZE", "0")
+    os.environ.setdefault("RERANK_CACHE_SIZE", "0")
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+
+    import config
+    from services.resources import resources
+
+    devnull = open(os.devnull, "w")
+    try:
+        with contextlib.redirect_stdout(devnull):
+            collection = resources.collection
+            build_s = None
+            if collection.count() == 0:
+                from init_index import index_csv_files
+                start = time.perf_counter()
+                index_csv_files(files)
+                build_s = round(time.perf_counter() - start, 2)
+
+            from routes import chat
+
+        print(f"📚 Index : {collection.count()} chunks ({workdir})"
+              + (f", construit en {build_s:.1f}s" if build_s is not None else ""), file=sys.stderr)
+
+        timer = _Recorder()
+        vector_ranks, final_ranks, lookup_hits = [], [], 0
+        routed, routed_right = 0, 0
+        with contextlib.redirect_stdout(devnull):
+            # Une passe d'échauffement (chargement du modèle, connexions)
+            for query in questions[:1]:
+                run_question(chat, query["question"], _Recorder())
+
+            for repetition in range(args.repeat):
+                for query in questions:
+                    expected = (query["doc"], query["article"])
+                    prepared = run_question(chat, query["question"], timer)
+                    if repetition == 0:
+                        vector_rank, final_rank = ranks(chat, prepared, expected)
+                        vector_ranks.append(vector_rank)
+                        final_ranks.append(final_rank)
+                        # Choix du routeur, avant un éventuel élargissement à tous les corpus
+                        corpus = chat.corpus_router.route(query["question"])[0] if chat.CORPUS_ROUTING else None
+                        routed += corpus is not None
+                        routed_right += corpus == query["doc"]
+                for query in lookups:
+                    reference = run_lookup(chat, query["question"], timer)
+                    if repetition == 0 and reference is not None:
+                        doc_key, number = reference
+                        lookup_hits += number == query["article"] and doc_key in (None, query["doc"])
+    finally:
+        devnull.close()
+        mock_server.shutdown()
+        if not args.index_dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    top_k = config.TOP_K
+    n = max(len(questions), 1)
+    result = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": _git_commit(),
+        "config": {
+            "top_k": top_k,
+            "hybrid_search": config.HYBRID_SEARCH,
+            "hybrid_candidates": config.HYBRID_CANDIDATES,
+            "rerank": chat.resources.reranker is not None,
+            "rerank_model": config.RERANK_MODEL,
+            "rerank_candidates": config.RERANK_CANDIDATES,
+            "rerank_budget_ms": config.RERANK_BUDGET_MS,
+            "similarity_threshold": chat.SIMILARITY_THRESHOLD,
+            "article_lookup": config.ARTICLE_LOOKUP,
+            "context_max_tokens": config.CONTEXT_MAX_TOKENS,
+            "context_expand_articles": config.CONTEXT_EXPAND_ARTICLES,
+            "context_tokenizer": chat.resources.context_builder.tokenizer.name,
+            "corpus_routing": config.CORPUS_ROUTING,
+            "corpus_router_min_score": config.CORPUS_ROUTER_MIN_SCORE,
+            "chunker": config.CHUNKER,
+            "chunk_max_tokens": config.CHUNK_MAX_TOKENS,
+            "embedding_model": config.EMBEDDING_MODEL,
+            "embedding_cache_size": config.EMBEDDING_CACHE_SIZE,
+            "rerank_cache_size": config.RERANK_CACHE_SIZE,
+            "answer_cache": config.ANSWER_CACHE_ENABLED,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "corpus": {
+            "files": [os.path.basename(f) for f in files],
+            "chunks": collection.count(),
+            "index_build_s": build_s,
+        },
+        "queries": {"questions": len(questions), "lookups": len(lookups), "repeat": args.repeat},
+        "tokens": {
+            kind: {
+                "p50": float(np.percentile(values, 50)) if values else None,
+                "p95": float(np.percentile(values, 95)) if values else None,
+                "max": max(values) if values else None,
+            }
+            for kind, values in timer.tokens.items()
+        },
+        "latency_ms": {stage: latency_stats(samples) for stage, samples in timer.samples.items()},
+        "quality": {
+            f"vector_recall@{top_k}": round(sum(1 for r in vector_ranks if r and r <= top_k) / n, 3),
+            "vector_mrr": round(sum(1 / r for r in vector_ranks if r) / n, 3),
+            f"final_recall@{top_k}": round(sum(1 for r in final_ranks if r) / n, 3),
+            "final_mrr": round(sum(1 / r for r in final_ranks if r) / n, 3),
+            "route_rate": round(routed / n, 3),
+            "route_accuracy": round(routed_right / max(routed, 1), 3),
+            "lookup_hit_rate": round(lookup_hits / max(len(lookups), 1), 3),
+        },
+    }
+
+    print(f"\n{'étape':<15} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)", file=sys.stderr)
+    for stage, stats in result["latency_ms"].items():
+        if stats["n"]:
+            print(f"{stage:<15} {stats['n']:>5} {stats['p50']:9.2f} {stats['p95']:9.2f} {stats['p99']:9.2f}",
+                  file=sys.stderr)
+    print("", file=sys.stderr)
+    for metric, value in result["quality"].items():
+        print(f"{metric:<22} {value:.3f}", file=sys.stderr)
+    for kind, stats in result["tokens"].items():
+        if stats["p50"] is not None:
+            print(f"{kind + '_tokens':<22} p50 {stats['p50']:.0f}  p95 {stats['p95']:.0f}  max {stats['max']}",
+                  file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            with contextlib.redirect_stdout(sys.stderr):
+                compare(result, json.load(f))
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"\n💾 Résultat : {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Mesure du démarrage à froid de l'application.
+
+Chaque mesure est faite dans un processus neuf (aucun cache Python ni
+modèle déjà chargé) :
+  - import_s : import de app.py (routes comprises), préchargement désactivé
+  - chargement de chaque ressource du registre (services/resources.py) :
+    ChromaDB, modèle d'embedding, index lexical, index des articles, SQLite
+  - warm_up_s : préchargement complet, ready_after_s : depuis l'import
+
+L'index utilisé est celui de CHROMA_DIR.
+
+Usage (depuis backend/) :
+    python -m benchmarks.bench_startup [--runs 3] [--output startup.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans le processus mesuré : une ligne JSON sur la sortie standard
+PROBE = """
+import contextlib, io, json, os, sys, time
+os.environ["WARM_UP_ON_START"] = "0"
+sys.path.insert(0, os.getcwd())
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app
+    import_s = time.perf_counter() - start
+    from services.resources import resources
+    status = resources.warm_up()
+status["import_s"] = round(import_s, 3)
+print(json.dumps(status))
+"""
+
+
+def run_probe():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="processus mesurés")
+    parser.add_argument("--output", help="écrit le résultat JSON dans ce fichier")
+    args = parser.parse_args()
+
+    runs = [run_probe() for _ in range(args.runs)]
+
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(float(np.median(values)), 3) if values else None
+
+    result = {
+        "runs": args.runs,
+        "ready": all(run["ready"] for run in runs),
+        "import_s": median(run["import_s"] for run in runs),
+        "warm_up_s": median(run["warm_up_s"] for run in runs),
+        "ready_after_s": median(run["ready_after_s"] for run in runs),
+        "load_ms": {
+            name: median(run["resources"][name].get("load_ms") for run in runs)
+            for name in runs[0]["resources"]
+        },
+        "errors": sorted({
+            f"{name}: {status['error']}"
+            for run in runs for name, status in run["resources"].items() if "error" in status
+        }),
+    }
+
+    print(f"🚀 Démarrage à froid (médiane de {args.runs} processus)")
+    print(f"   import de l'application  {result['import_s']:8.3f} s")
+    for name, load_ms in result["load_ms"].items():
+        print(f"   {name:<24} {load_ms / 1000 if load_ms is not None else float('nan'):8.3f} s")
+    print(f"   préchargement complet    {result['warm_up_s']:8.3f} s")
+    print(f"   prêt après               {result['ready_after_s'] or float('nan'):8.3f} s")
+    for error in result["errors"]:
+        print(f"   ❌ {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Résultat : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Générateur de charge pour POST /ask.
+
+Envoie les questions de benchmarks/queries.json à un débit cible (QPS) en
+boucle ouverte : chaque requête part à son heure prévue, qu'une réponse
+soit arrivée ou non, et sa latence est comptée depuis cette heure (les
+files d'attente côté client ne masquent donc pas la saturation du serveur).
+
+Rapporte le débit obtenu, l'histogramme et les percentiles de latence,
+la répartition des statuts et le taux de fallback (réponses produites par
+generate_smart_fallback faute de réponse du LLM).
+
+Deux modes :
+  - --url http://127.0.0.1:5000 : application déjà démarrée
+  - --in-process : démarre un faux Ollama (benchmarks/mock_ollama.py, mêmes
+    options) et l'application Flask dans ce processus ; l'index utilisé est
+    celui de CHROMA_DIR
+
+Usage (depuis backend/) :
+    python -m benchmarks.load_ask --in-process --qps 5 --duration 30 \\
+        --first-token-ms 400 --tokens-per-sec 25 --error-rate 0.05
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_ollama import add_mock_arguments, settings_from_args, start_mock_ollama  # noqa: E402
+
+QUERIES_FILE = os.path.join(BACKEND_DIR, "benchmarks", "queries.json")
+HISTOGRAM_BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf")]
+
+
+def start_app_in_process(args):
+    """Faux Ollama + application Flask (serveur werkzeug multi-threads) ; retourne (URL, faux Ollama)."""
+    mock_server, mock_url = start_mock_ollama(settings=settings_from_args(args))
+    os.environ["OLLAMA_BASE_URL"] = mock_url
+    if args.ollama_timeout:
+        os.environ["OLLAMA_TIMEOUT"] = str(args.ollama_timeout)
+
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-app", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", mock_server
+
+
+def _send(session, url, question, scheduled, timeout):
+    try:
+        response = session.post(f"{url}/ask", json={"question": question}, timeout=timeout)
+        body = response.json() if response.headers.get("Content-Type", "").startswith("application/json") else {}
+        outcome = {
+            "http": response.status_code,
+            "status": body.get("status", "error" if response.status_code != 200 else "unknown"),
+            "fallback": bool(body.get("fallback")),
+            "cached": bool(body.get("cached")),
+            "coalesced": bool(body.get("coalesced")),
+        }
+    except requests.RequestException as e:
+        outcome = {"http": None, "status": type(e).__name__, "fallback": False, "cached": False, "coalesced": False}
+    outcome["latency"] = time.perf_counter() - scheduled
+    return outcome
+
+
+def run_load(url, questions, qps, duration, concurrency, timeout, vary):
+    """Boucle ouverte à `qps` requêtes/s pendant `duration` s ; retourne (résultats, durée réelle)."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    total = int(qps * duration)
+    futures = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+        for i in range(total):
+            scheduled = started + i / qps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            question = questions[i % len(questions)]
+            if vary:
+                # Question unique : ni le cache des réponses ni celui des embeddings ne servent
+                question = f"{question} (#{i})"
+            futures.append(pool.submit(_send, session, url, question, scheduled, timeout))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, qps, duration):
+    latencies = np.array([r["latency"] for r in results]) * 1000
+    ok = [r for r in results if r["http"] == 200]
+    generated = [r for r in ok if r["status"] == "success" and not r["cached"]]
+    counts = np.histogram(latencies, bins=[0] + HISTOGRAM_BUCKETS_MS)[0] if len(latencies) else []
+
+    return {
+        "target_qps": qps,
+        "duration_s": duration,
+        "sent": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(float(np.percentile(latencies, p)), 1)
+            for name, p in (("p50", 50), ("p90", 90), ("p95", 95), ("p99", 99), ("max", 100))
+        } if len(latencies) else {},
+        "histogram_ms": {
+            (f"<{bound:g}" if bound != float("inf") else f">={HISTOGRAM_BUCKETS_MS[-2]:g}"): int(count)
+            for bound, count in zip(HISTOGRAM_BUCKETS_MS, counts)
+        },
+        "statuses": dict(Counter(r["status"] for r in results)),
+        "cached": sum(r["cached"] for r in ok),
+        "coalesced": sum(r["coalesced"] for r in ok),
+        "fallbacks": sum(r["fallback"] for r in ok),
+        # Parmi les réponses qui ont demandé une génération au LLM
+        "fallback_rate": round(sum(r["fallback"] for r in generated) / len(generated), 3) if generated else 0.0,
+    }
+
+
+def print_report(report, mock_stats=None):
+    print(f"\n📊 {report['sent']} requêtes à {report['target_qps']} QPS pendant {report['duration_s']}s")
+    print(f"   ✅ {report['ok']} OK, ❌ {report['errors']} erreurs — débit {report['throughput_rps']:.2f} req/s")
+    if report["latency_ms"]:
+        print("   ⏱️  " + "  ".join(f"{k} {v:.0f} ms" for k, v in report["latency_ms"].items()))
+
+    print("\n   Latence (ms)")
+    peak = max(report["histogram_ms"].values() or [1]) or 1
+    for bucket, count in report["histogram_ms"].items():
+        print(f"   {bucket:>8} {count:6d} {'█' * round(40 * count / peak)}")
+
+    print("\n   Statuts : " + ", ".join(f"{k}={v}" for k, v in sorted(report["statuses"].items())))
+    print(f"   Cache : {report['cached']}   Regroupées : {report['coalesced']}   Fallback : {report['fallbacks']} "
+          f"({report['fallback_rate']:.1%} des générations)")
+    if mock_stats:
+        print("   Faux Ollama : " + ", ".join(f"{k}={v}" for k, v in mock_stats.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--in-process", action="store_true", help="démarre faux Ollama + application")
+    parser.add_argument("--qps", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="secondes d'envoi")
+    parser.add_argument("--concurrency", type=int, default=64, help="requêtes simultanées max côté client")
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--ollama-timeout", type=int, help="OLLAMA_TIMEOUT de l'application (--in-process)")
+    parser.add_argument("--vary", action="store_true", help="rend chaque question unique (pas de cache)")
+    parser.add_argument("--queries", default=QUERIES_FILE)
+    parser.add_argument("--output", help="écrit le rapport JSON dans ce fichier")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        questions = [q["question"] for q in json.load(f) if q.get("type", "question") == "question"]
+
+    url, mock_server = args.url, None
+    # En mode --in-process, les traces de l'application ne noient pas le rapport
+    app_output = open(os.devnull, "w") if args.in_process else None
+    with contextlib.redirect_stdout(app_output) if app_output else contextlib.nullcontext():
+        if args.in_process:
+            url, mock_server = start_app_in_process(args)
+            print(f"🚀 Application sur {url}, faux Ollama sur port {mock_server.server_address[1]}",
+                  file=sys.stderr)
+
+        results, elapsed = run_load(url, questions, args.qps, args.duration,
+                                    args.concurrency, args.request_timeout, args.vary)
+    if app_output:
+        app_output.close()
+    report = summarize(results, elapsed, args.qps, args.duration)
+    if mock_server is not None:
+        report["mock_ollama"] = dict(mock_server.settings.stats)
+        mock_server.shutdown()
+    print_report(report, report.get("mock_ollama"))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Rapport : {args.output}")
+
+
+if __name__ == "__main__":
+    main()
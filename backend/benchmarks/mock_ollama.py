@@ -0,0 +1,256 @@
+"""
+Faux serveur Ollama local pour les benchmarks et les tests de charge :
+répond à /api/generate (streaming NDJSON ou réponse unique) comme Ollama,
+sans modèle. N'importe pas config : il peut être démarré avant que
+OLLAMA_BASE_URL soit lu.
+
+Réglages :
+  - latence avant le premier token (--first-token-ms)
+  - débit de génération (--tokens-per-sec, 0 = instantané) et longueur
+    de la réponse (--answer-tokens)
+  - injection de pannes : part de réponses HTTP 500 (--error-rate), de
+    requêtes qui ne répondent jamais avant --hang-s secondes (--timeout-rate,
+    à combiner avec un OLLAMA_TIMEOUT court côté application) et de
+    connexions coupées après --drop-after tokens, sans la ligne finale
+    "done" (--drop-rate)
+  - chargement du modèle (--cold-load-ms) à la première requête et après
+    expiration du keep_alive demandé (5 min par défaut, comme Ollama) ;
+    une requête sans prompt charge seulement le modèle
+
+GET /mock/stats retourne les compteurs (requêtes, erreurs, timeouts, chargements).
+
+Usage (depuis backend/) :
+    python -m benchmarks.mock_ollama [--port 11434] [--first-token-ms 300]
+                                     [--tokens-per-sec 20] [--error-rate 0.05]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER_WORDS = [
+    "Selon ", "l'article ", "cité, ", "la ", "règle ", "s'applique ", "aux ",
+    "personnes ", "visées ", "dans ", "les ", "conditions ", "prévues.",
+]
+
+
+class MockSettings:
+    def __init__(self, first_token_ms=0.0, tokens_per_sec=0.0, answer_tokens=len(ANSWER_WORDS),
+                 error_rate=0.0, timeout_rate=0.0, hang_s=600.0, cold_load_ms=0.0,
+                 drop_rate=0.0, drop_after=2, seed=None):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_s = hang_s
+        self.cold_load_ms = cold_load_ms
+        self.drop_rate = drop_rate
+        self.drop_after = drop_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._loaded_until = 0.0
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "timeouts": 0, "drops": 0, "loads": 0}
+
+    def draw(self):
+        """Sort de la requête : "error", "timeout", "drop" ou "ok" (compteurs mis à jour)."""
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.stats["errors"] += 1
+                return "error"
+            if roll < self.error_rate + self.timeout_rate:
+                self.stats["timeouts"] += 1
+                return "timeout"
+            if roll < self.error_rate + self.timeout_rate + self.drop_rate:
+                self.stats["drops"] += 1
+                return "drop"
+            return "ok"
+
+    def load(self, keep_alive):
+        """Temps de chargement du modèle (s) : nul s'il est encore en mémoire."""
+        with self._lock:
+            now = time.monotonic()
+            cold = now >= self._loaded_until
+            if cold:
+                self.stats["loads"] += 1
+            self._loaded_until = now + _keep_alive_seconds(keep_alive) + (self.cold_load_ms / 1000 if cold else 0)
+        return self.cold_load_ms / 1000 if cold else 0.0
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def tokens(self):
+        return [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.answer_tokens)]
+
+    def token_delay(self):
+        return 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+
+def _keep_alive_seconds(value):
+    """keep_alive d'Ollama : secondes, durée ("30m", "1h") ou négatif (toujours)."""
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+    if not match:
+        return 300.0
+    amount = float(match.group(1))
+    if amount < 0:
+        return float("inf")
+    return amount * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+
+
+def _make_handler(settings):
+    class MockOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # en-têtes et corps écrits séparément
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send_json({"models": [{"name": "mock"}]})
+            elif self.path == "/mock/stats":
+                self._send_json(dict(settings.stats))
+            else:
+                self._send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/api/generate":
+                self._send_json({"error": "not found"}, 404)
+                return
+
+            started = time.perf_counter()
+            load_s = settings.load(payload.get("keep_alive"))
+            time.sleep(load_s)
+            if "prompt" not in payload:
+                # Chargement seul (préchargement, keep_alive)
+                self._send_json({"model": payload.get("model"), "done": True, "done_reason": "load"})
+                return
+
+            outcome = settings.draw()
+            if outcome == "timeout":
+                time.sleep(settings.hang_s)
+                self.close_connection = True
+                return
+            time.sleep(settings.first_token_ms / 1000)
+            if outcome == "error":
+                self._send_json({"error": "mock: erreur injectée"}, 500)
+                return
+
+            tokens = settings.tokens()
+            delay = settings.token_delay()
+            final = {
+                "done": True,
+                "prompt_eval_count": len(str(payload.get("prompt", "")).split()),
+                "eval_count": len(tokens),
+                "load_duration": int(load_s * 1e9),
+            }
+
+            if not payload.get("stream", True):
+                if outcome == "drop":
+                    self.close_connection = True
+                    return
+                time.sleep(delay * len(tokens))
+                final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                self._send_json({"response": "".join(tokens), **final})
+                return
+
+            settings.count("streamed")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if outcome == "drop" and i == settings.drop_after:
+                    # Connexion coupée en cours de génération : ni ligne "done" ni fin de flux
+                    self.close_connection = True
+                    return
+                if i and delay:
+                    time.sleep(delay)
+                self._write_chunk({"response": token, "done": False})
+            final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self._write_chunk({"response": "", **final})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, payload):
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return MockOllamaHandler
+
+
+def start_mock_ollama(port=0, settings=None, **options):
+    """
+    Démarre le serveur dans un thread ; retourne (serveur, URL de base).
+    Les options sont celles de MockSettings (first_token_ms, tokens_per_sec...).
+    """
+    settings = settings or MockSettings(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(settings))
+    server.daemon_threads = True
+    server.settings = settings
+    threading.Thread(target=server.serve_forever, name="mock-ollama", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def add_mock_arguments(parser):
+    """Options du faux Ollama, partagées avec le générateur de charge."""
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="latence avant le premier token")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="débit de génération (0 = instantané)")
+    parser.add_argument("--answer-tokens", type=int, default=len(ANSWER_WORDS), help="tokens par réponse")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="part de réponses HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="part de requêtes sans réponse")
+    parser.add_argument("--hang-s", type=float, default=600.0, help="durée d'une requête sans réponse")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="part de flux coupés en cours de génération")
+    parser.add_argument("--drop-after", type=int, default=2, help="tokens envoyés avant la coupure")
+    parser.add_argument("--cold-load-ms", type=float, default=0.0, help="chargement du modèle (démarrage à froid)")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def settings_from_args(args):
+    return MockSettings(
+        first_token_ms=args.first_token_ms, tokens_per_sec=args.tokens_per_sec,
+        answer_tokens=args.answer_tokens, error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate, hang_s=args.hang_s, cold_load_ms=args.cold_load_ms,
+        drop_rate=args.drop_rate, drop_after=args.drop_after, seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11434)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_mock_ollama(args.port, settings_from_args(args))
+    print(f"🤖 Faux Ollama sur {url} (premier token {args.first_token_ms:.0f} ms, "
+          f"{args.tokens_per_sec or '∞'} tokens/s, erreurs {args.error_rate:.0%}, "
+          f"timeouts {args.timeout_rate:.0%}) — Ctrl+C pour arrêter")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,15 @@ load_dotenv()
 # ✅ Configuration LLM Local (Llama 3.2)
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "180"))  # secondes par génération
+# Pool partagé vers Ollama : générations simultanées max et file d'attente bornée
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2"))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "8"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60"))  # secondes d'attente d'un slot
+# Modèle gardé en mémoire par Ollama : durée après la dernière requête, rafraîchie pendant l'inactivité
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # format Ollama ("30m", "3600", "-1" = toujours)
+OLLAMA_KEEP_ALIVE_REFRESH = float(os.getenv("OLLAMA_KEEP_ALIVE_REFRESH", "600"))  # secondes, 0 = jamais
+OLLAMA_WARM_UP = os.getenv("OLLAMA_WARM_UP", "1") == "1"  # charge le modèle au démarrage du serveur
 # API keys and tokens (never hardcode secrets here)
 HF_TOKEN = os.getenv("HF_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -19,5 +28,103 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # App configuration
 MODEL_ID = "mistralai/Mistral-7B-Instruct-v0.2"
 TOP_K = 3
-CHROMA_DIR = "./chroma_data"
-COLLECTION_NAME = "lois_maroc"
\ No newline at end of file
+CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma_data")
+COLLECTION_NAME = "lois_maroc"
+INGEST_MANIFEST_FILE = os.path.join(CHROMA_DIR, "ingest_manifest.json")
+
+# Ingestion en pipeline : embeddings calculés en parallèle par batches adaptatifs
+INGEST_PIPELINE = os.getenv("INGEST_PIPELINE", "1") == "1"
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+INGEST_BATCH_CHARS = int(os.getenv("INGEST_BATCH_CHARS", "64000"))  # taille cible d'un batch
+INGEST_MIN_BATCH = int(os.getenv("INGEST_MIN_BATCH", "8"))
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "256"))
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))  # batches en attente d'écriture
+
+# Historique des conversations (SQLite) : connexions persistantes réutilisées
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+CONVERSATIONS_PAGE_SIZE = int(os.getenv("CONVERSATIONS_PAGE_SIZE", "50"))  # GET /conversations
+CONVERSATIONS_MAX_PAGE_SIZE = 200
+# Écriture différée des messages de /ask : un thread regroupe les INSERT toutes les N ms
+CONVERSATION_WRITE_BEHIND = os.getenv("CONVERSATION_WRITE_BEHIND", "1") == "1"
+CONVERSATION_FLUSH_MS = float(os.getenv("CONVERSATION_FLUSH_MS", "50"))
+CONVERSATION_FLUSH_MAX_BATCH = int(os.getenv("CONVERSATION_FLUSH_MAX_BATCH", "256"))
+CONVERSATION_FLUSH_TIMEOUT_S = float(os.getenv("CONVERSATION_FLUSH_TIMEOUT_S", "5"))  # attente max. d'une lecture de ses écritures
+
+# Modèle d'embedding des questions : même modèle que la fonction par défaut
+# de ChromaDB (all-MiniLM-L6-v2), les vecteurs déjà indexés restent valides
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+
+# Découpage des articles : "structure" (marqueurs I.-, 1°-, a)... et budget en tokens)
+# ou "sentences" (ancien découpage par phrases, 1000 caractères)
+CHUNKER = os.getenv("CHUNKER", "structure")
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", EMBEDDING_MODEL)  # le modèle tronque à 256 tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "220"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Recherche hybride : BM25 (index lexical construit à l'ingestion) + vecteurs, fusion RRF
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # candidats par branche avant fusion
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Reclassement des candidats par un cross-encoder (CPU) avant de garder les TOP_K
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "1") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")  # multilingue
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))  # candidats reclassés par requête
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))  # au-delà : ordre de la recherche conservé
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))  # le budget est vérifié entre deux batches
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "320"))  # tokens (question + chunk)
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "8192"))  # scores (question, chunk)
+LEXICAL_INDEX_DIR = os.path.join(CHROMA_DIR, "lexical_index")
+
+# Accès direct aux articles ("Article 2 du CGI") sans recherche vectorielle ni LLM
+ARTICLE_LOOKUP = os.getenv("ARTICLE_LOOKUP", "1") == "1"
+ARTICLE_INDEX_FILE = os.path.join(CHROMA_DIR, "article_index.json")
+
+# Assemblage du contexte : budget en tokens (tokenizer du modèle Ollama) et quasi-doublons
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "unsloth/Llama-3.2-3B-Instruct")  # même vocabulaire que llama3.2
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1200"))  # + préfixe, question et num_predict ≤ num_ctx
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))  # part de 3-grammes en commun
+CONTEXT_MIN_PART_TOKENS = int(os.getenv("CONTEXT_MIN_PART_TOKENS", "48"))  # article tronqué plus court : écarté
+CONTEXT_EXPAND_ARTICLES = os.getenv("CONTEXT_EXPAND_ARTICLES", "1") == "1"  # article dont plusieurs chunks sont retenus : complété
+
+# Filtrage par corpus (métadonnée 'corpus') : choisi par le paramètre 'corpus' de /ask,
+# sinon deviné par mots-clés avant la recherche vectorielle
+CORPUS_ROUTING = os.getenv("CORPUS_ROUTING", "1") == "1"
+CORPUS_ROUTER_MIN_SCORE = int(os.getenv("CORPUS_ROUTER_MIN_SCORE", "2"))  # mots-clés (mention explicite = 3)
+CORPUS_MIN_RESULTS = int(os.getenv("CORPUS_MIN_RESULTS", "1"))  # en dessous : recherche sur tous les corpus
+
+# Cache des réponses (question normalisée + chunks retrouvés)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # secondes, 0 = sans expiration
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # questions quasi identiques
+ANSWER_CACHE_PERSIST = os.getenv("ANSWER_CACHE_PERSIST", "1") == "1"  # base SQLite dans CHROMA_DIR
+ANSWER_CACHE_SYNC_S = float(os.getenv("ANSWER_CACHE_SYNC_S", "5"))  # relecture des écritures des autres processus
+# Questions identiques reçues en même temps : une seule recherche + génération partagée
+ASK_SINGLE_FLIGHT = os.getenv("ASK_SINGLE_FLIGHT", "1") == "1"
+# /ask/batch : questions par appel et générations en parallèle (au plus les slots Ollama)
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "500"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", str(OLLAMA_MAX_IN_FLIGHT)))
+# Journalisation : niveau (DEBUG affiche le détail des résultats de recherche) et format
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" ou "json" (une ligne JSON par événement)
+
+# Préchargement au démarrage (ChromaDB, index, modèle d'embedding, SQLite) ; sinon au premier usage
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "1") == "1"
+# Serveur de production ASGI (serve.py : uvicorn + asgi_app.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))  # processus : chacun charge modèle et index
+SERVER_LOOP = os.getenv("SERVER_LOOP", "auto")  # "auto" utilise uvloop s'il est installé
+# Threads pour les appels bloquants (Chroma, SQLite, embeddings) hors de la boucle d'événements
+ASGI_BLOCKING_THREADS = int(os.getenv("ASGI_BLOCKING_THREADS", "16"))
+# File d'attente vers Ollama en mode ASGI : une requête en attente ne coûte qu'une coroutine
+ASGI_LLM_MAX_QUEUE = int(os.getenv("ASGI_LLM_MAX_QUEUE", "512"))
+# Serveur de développement Flask (python app.py)
+FLASK_PORT = int(os.getenv("FLASK_PORT", "5000"))
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "0") == "1"
@@ -1,120 +1,43 @@
 """
 Script d'ingestion CSV simplifié
-ChromaDB génère les embeddings automatiquement
+Les CSV sont lus en flux (ligne → chunks → batches → ChromaDB)
 """
 
 import os
-import pandas as pd
-import uuid
-import re
+from config import CHROMA_DIR, INGEST_PIPELINE
 from services.vector_db import init_chroma, reset_chroma
+from preprocessing.load_csv import (
+    backfill_snippets, chunker_signature, iter_chunks, iter_fixed_batches, refresh_metadata, source_name_for
+)
+from preprocessing.pipeline import index_chunks
+from preprocessing.manifest import file_sha256, load_manifest, save_manifest, manifest_entry
+from services.answer_cache import answer_cache
+from services.lexical_index import rebuild_lexical_index
+from services.article_index import rebuild_article_index
 
-# =======================
-# 📂 Fonctions de chargement
-# =======================
-
-def load_csv(file_name):
-    """Charge un fichier CSV"""
-    if os.path.exists(file_name):
-        df = pd.read_csv(file_name, encoding='utf-8')
-        print(f"✅ Fichier chargé : {file_name} ({len(df)} lignes)")
-        return df
-    else:
-        raise FileNotFoundError(f"❌ {file_name} introuvable !")
-
-
-def preprocess_csv(df, file_name):
-    """Prétraite le DataFrame pour standardiser les colonnes"""
-    # Nettoyer les noms de colonnes
-    df.columns = [col.strip().lower() for col in df.columns]
-    
-    # Mapper les colonnes vers un format standard
-    col_mapping = {
-        'doc': 'DOC', 
-        'titre': 'Titre', 
-        'chapitre': 'Chapitre',
-        'section': 'Section', 
-        'article': 'Article',
-        'contenu': 'Contenu', 
-        'texte': 'Contenu', 
-        'pages': 'Pages'
-    }
-    
-    df = df.rename(columns={col: col_mapping.get(col, col) for col in df.columns})
-    
-    # Ajouter les colonnes manquantes
-    for col in ['DOC', 'Titre', 'Chapitre', 'Section', 'Article', 'Contenu', 'Pages']:
-        if col not in df.columns:
-            df[col] = ''
-    
-    # Créer le texte complet
-    df['texte_complet'] = df['Article'].fillna('') + ' ' + df['Contenu'].fillna('')
-    df['texte_complet'] = df['texte_complet'].str.replace('\r\n', ' ').str.strip()
-    
-    print(f"✅ Prétraitement terminé : {len(df)} entrées")
-    return df
-
-
-def chunk_text(text, max_chars=1000):
-    """Découpe un texte long en chunks plus petits"""
-    sents = re.split(r'(?<=[.!?])\s+', text.strip())
-    chunks, chunk = [], ""
-    
-    for sent in sents:
-        if len(chunk) + len(sent) < max_chars:
-            chunk += " " + sent
-        else:
-            if chunk.strip():
-                chunks.append(chunk.strip())
-            chunk = sent
-    
-    if chunk.strip():
-        chunks.append(chunk.strip())
-    
-    return chunks
-
-
-def prepare_chunks(df, source_name):
-    """Prépare les chunks pour l'ingestion dans ChromaDB"""
-    texts, metadatas, ids = [], [], []
-    
-    for idx, row in df.iterrows():
-        content = str(row['texte_complet']).strip()
-        
-        if not content or content == 'nan':
-            continue
-        
-        # Découper si trop long
-        chunks = chunk_text(content) if len(content) > 1000 else [content]
-        
-        for i, chunk in enumerate(chunks):
-            texts.append(chunk)
-            metadatas.append({
-                'source': source_name,
-                'doc': str(row['DOC']),
-                'article': str(row['Article']),
-                'pages': str(row['Pages']),
-                'titre': str(row['Titre']),
-                'chunk_id': i
-            })
-            ids.append(str(uuid.uuid4()))
-    
-    print(f"✅ {len(texts)} chunks créés depuis {source_name}")
-    return texts, metadatas, ids
-
+# Chunks gardés d'une ingestion à l'autre : métadonnées comparées par lots
+METADATA_REFRESH_BATCH = 500
 
 # =======================
 # 🚀 Fonction principale d'ingestion
 # =======================
 
-def ingest_csv_files(csv_files: list, reset: bool = False):
+def ingest_csv_files(csv_files: list, reset: bool = False, prune_missing: bool = False):
     """
     Ingère plusieurs fichiers CSV dans ChromaDB
-    ChromaDB génère les embeddings automatiquement
+    Chaque fichier est lu en flux : la mémoire reste bornée
+    
+    Ingestion incrémentale et idempotente : les IDs des chunks sont des
+    empreintes de leur contenu et le manifeste garde, par source, l'empreinte
+    du fichier et ses IDs. Un fichier inchangé est ignoré ; sinon seuls les
+    chunks nouveaux sont insérés, les chunks disparus supprimés et les
+    métadonnées des chunks gardés mises à jour si elles ont changé.
     
     Args:
         csv_files: Liste de chemins vers les fichiers CSV
         reset: Si True, réinitialise la base avant l'ingestion
+        prune_missing: Si True, supprime les chunks des sources du manifeste
+            absentes de csv_files (fichier retiré de data/)
     """
     print("\n" + "="*60)
     print("🚀 DÉMARRAGE DE L'INGESTION DES DOCUMENTS JURIDIQUES")
@@ -124,30 +47,100 @@ def ingest_csv_files(csv_files: list, reset: bool = False):
     if reset:
         print("🔄 Réinitialisation de ChromaDB...")
         client, collection = reset_chroma()
+        manifest = {}
     else:
         client, collection = init_chroma()
+        manifest = load_manifest()
     
-    # Traiter chaque fichier CSV
-    all_texts, all_metadatas, all_ids = [], [], []
+    # Un changement de découpage (réglages, tokenizer) impose de redécouper
+    chunker = chunker_signature()
     
+    total_added, total_removed, total_unchanged = 0, 0, 0
+    removed_ids = []
+    refreshed_ids = []
+    seen_sources = set()
+    
+    # Traiter chaque fichier CSV
     for csv_file in csv_files:
         print(f"\n📄 Traitement de : {csv_file}")
         print("-" * 60)
         
+        # Extraire le nom du fichier comme source
+        source_name = source_name_for(csv_file)
+        seen_sources.add(source_name)
+        
         try:
-            # Charger et prétraiter
-            df = load_csv(csv_file)
-            df = preprocess_csv(df, csv_file)
+            file_hash = file_sha256(csv_file)
+            entry = manifest.get(source_name)
+            
+            if entry and entry['sha256'] == file_hash and entry.get('chunker') == chunker:
+                print(f"⏭️  Fichier inchangé depuis la dernière ingestion ({len(entry['chunks'])} chunks)")
+                total_unchanged += len(entry['chunks'])
+                if not entry.get('snippets'):
+                    _backfill_snippets(collection, entry['chunks'])
+                    entry['snippets'] = True
+                    save_manifest(manifest)
+                continue
             
-            # Extraire le nom du fichier comme source
-            source_name = os.path.basename(csv_file).replace('.csv', '')
+            if entry is None and not reset:
+                # Source jamais ingérée avec manifeste : on retire d'éventuels
+                # anciens chunks (IDs aléatoires) pour ne pas les dupliquer,
+                # et les réponses en cache qui en dépendent
+                stale_ids = collection.get(where={"source": source_name}, include=[])['ids']
+                for i in range(0, len(stale_ids), 1000):
+                    collection.delete(ids=stale_ids[i:i + 1000])
+                if stale_ids:
+                    print(f"🧹 {len(stale_ids)} anciens chunks sans manifeste supprimés")
+                total_removed += len(stale_ids)
+                removed_ids.extend(stale_ids)
+                old_ids = set()
+            else:
+                old_ids = set(entry['chunks']) if entry else set()
             
-            # Préparer les chunks
-            texts, metadatas, ids = prepare_chunks(df, source_name)
+            # Découpage modifié : tout est réécrit (métadonnées des chunks inchangés comprises)
+            kept_ids = old_ids if entry and entry.get('chunker') == chunker else set()
             
-            all_texts.extend(texts)
-            all_metadatas.extend(metadatas)
-            all_ids.extend(ids)
+            # Flux des chunks du fichier ; seuls les nouveaux sont indexés
+            # (deux lignes identiques → un seul chunk). Un chunk gardé a le
+            # même texte, mais ses métadonnées (pages, titre, nombre de chunks
+            # de l'article...) ont pu changer : elles sont comparées par lots.
+            seen_ids = {}
+            kept_chunks = []
+            source_refreshed = []
+            
+            def new_chunks():
+                for chunk_id, text, meta in iter_chunks(csv_file, source_name):
+                    if chunk_id in seen_ids:
+                        continue
+                    seen_ids[chunk_id] = None
+                    if chunk_id not in kept_ids:
+                        yield chunk_id, text, meta
+                        continue
+                    kept_chunks.append((chunk_id, meta))
+                    if len(kept_chunks) >= METADATA_REFRESH_BATCH:
+                        source_refreshed.extend(refresh_metadata(collection, kept_chunks))
+                        kept_chunks.clear()
+            
+            added = _add_chunks(collection, new_chunks())
+            source_refreshed.extend(refresh_metadata(collection, kept_chunks))
+            
+            gone_ids = sorted(old_ids - seen_ids.keys())
+            for i in range(0, len(gone_ids), 1000):
+                collection.delete(ids=gone_ids[i:i + 1000])
+            
+            print(f"📊 {len(seen_ids)} chunks : {added} nouveaux, {len(gone_ids)} supprimés, "
+                  f"{len(seen_ids) - added} inchangés (dont {len(source_refreshed)} aux métadonnées mises à jour)")
+            
+            # Les métadonnées recalculées comprennent 'snippet' : plus rien à compléter
+            manifest[source_name] = manifest_entry(file_hash, seen_ids.keys(), chunker)
+            manifest[source_name]['snippets'] = True
+            save_manifest(manifest)
+            
+            total_added += added
+            total_removed += len(gone_ids)
+            total_unchanged += len(seen_ids) - added
+            removed_ids.extend(gone_ids)
+            refreshed_ids.extend(source_refreshed)
             
         except Exception as e:
             print(f"❌ Erreur avec {csv_file} : {e}")
@@ -155,43 +148,83 @@ def ingest_csv_files(csv_files: list, reset: bool = False):
             traceback.print_exc()
             continue
     
-    # Vérifier qu'on a des données
-    if not all_texts:
-        print("\n❌ Aucun document à ingérer !")
-        return
+    # Sources retirées de data/
+    if prune_missing:
+        for source_name in sorted(set(manifest) - seen_sources):
+            gone_ids = manifest.pop(source_name)['chunks']
+            print(f"\n🗑️  Source retirée : {source_name} ({len(gone_ids)} chunks supprimés)")
+            for i in range(0, len(gone_ids), 1000):
+                collection.delete(ids=gone_ids[i:i + 1000])
+            total_removed += len(gone_ids)
+            removed_ids.extend(gone_ids)
+        save_manifest(manifest)
     
-    print(f"\n📊 TOTAL : {len(all_texts)} chunks à ingérer")
+    print(f"\n📊 TOTAL : {total_added} chunks ajoutés, {total_removed} supprimés, {total_unchanged} inchangés")
     
-    # Insérer dans ChromaDB par batches
-    # ChromaDB va générer les embeddings automatiquement
-    print("\n💾 Insertion dans ChromaDB (embeddings auto)...")
-    batch_size = 100  # Batch plus petit pour éviter les timeouts
+    # Les réponses en cache reposant sur des chunks supprimés ou aux
+    # métadonnées modifiées sont obsolètes (un chunk modifié change d'ID :
+    # l'ancien est supprimé)
+    if answer_cache is not None:
+        if reset:
+            answer_cache.clear()
+        else:
+            answer_cache.invalidate_chunks(removed_ids + refreshed_ids)
     
-    for i in range(0, len(all_texts), batch_size):
-        end = min(i + batch_size, len(all_texts))
-        
-        print(f"   🔄 Batch {i//batch_size + 1} : traitement de {i} à {end}...", end='')
-        
-        collection.add(
-            ids=all_ids[i:end],
-            documents=all_texts[i:end],
-            metadatas=all_metadatas[i:end]
-            # Pas d'embeddings → ChromaDB les génère automatiquement
-        )
-        
-        print(f" ✅")
+    # Métadonnées mises à jour : le corpus ('doc') peut avoir changé
+    if reset or total_added or total_removed or refreshed_ids:
+        # Index lexical BM25 et index des articles reconstruits sur toute la collection
+        print("\n🔤 Construction des index lexical (BM25) et des articles...")
+        rebuild_lexical_index(collection)
+        rebuild_article_index(collection)
     
     # Résumé final
     print("\n" + "="*60)
     print("✅ INGESTION TERMINÉE AVEC SUCCÈS !")
     print("="*60)
     print(f"📊 Total documents dans ChromaDB : {collection.count()}")
-    print(f"💾 Stockage : {os.path.abspath('chroma_db/')}")
+    print(f"💾 Stockage : {os.path.abspath(CHROMA_DIR)}")
     print("\n💡 Testez maintenant :")
     print("   python test_chroma.py")
     print("   python app.py")
 
 
+def _backfill_snippets(collection, chunk_ids):
+    """Complète la métadonnée 'snippet' des chunks déjà indexés (sans nouvel embedding)"""
+    filled = backfill_snippets(collection, chunk_ids)
+    if filled:
+        print(f"🏷️  Extrait des références ajouté à {filled} chunks existants")
+    return filled
+
+
+def _add_chunks(collection, chunks):
+    """Insère un flux de chunks (id, texte, métadonnées) dans ChromaDB ; retourne leur nombre"""
+    if INGEST_PIPELINE:
+        # Découpage, embeddings (en parallèle) et écritures se chevauchent
+        print("\n💾 Insertion dans ChromaDB (pipeline, embeddings en parallèle)...")
+        return index_chunks(collection, chunks)
+    
+    # Insérer dans ChromaDB par batches
+    # ChromaDB va générer les embeddings automatiquement
+    print("\n💾 Insertion dans ChromaDB (embeddings auto)...")
+    batch_size = 100  # Batch plus petit pour éviter les timeouts
+    total = 0
+    
+    for n, batch in enumerate(iter_fixed_batches(chunks, batch_size), 1):
+        print(f"   🔄 Batch {n} : traitement de {total} à {total + len(batch)}...", end='')
+        
+        collection.upsert(
+            ids=[chunk_id for chunk_id, _, _ in batch],
+            documents=[text for _, text, _ in batch],
+            metadatas=[meta for _, _, meta in batch]
+            # Pas d'embeddings → ChromaDB les génère automatiquement
+        )
+        total += len(batch)
+        
+        print(" ✅")
+    
+    return total
+
+
 # =======================
 # 🎯 Script principal
 # =======================
@@ -252,7 +285,7 @@ if __name__ == "__main__":
         
         # Lancer l'ingestion
         try:
-            ingest_csv_files(csv_files, reset=reset)
+            ingest_csv_files(csv_files, reset=reset, prune_missing=True)
         except Exception as e:
             print(f"\n❌ Erreur : {e}")
             import traceback
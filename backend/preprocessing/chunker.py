@@ -0,0 +1,163 @@
+import re
+from typing import List, Tuple
+
+from config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_TOKENIZER
+from services.tokenizer import get_tokenizer
+
+# Marqueurs de structure des textes juridiques, du plus haut niveau au plus bas.
+# Ils doivent suivre un blanc : "(II-B-8°)" ou "cinq (5) ans" ne coupent pas.
+STRUCTURE_MARKERS = [
+    (1, r"[IVX]{1,5}\s?\.\s?(?:\d+\s?)?-"),        # I.-  II.3-
+    (2, r"[A-Z]\s?\.?\s?-(?=\s?\S)"),              # A.-  B-
+    (3, r"\d{1,2}\s?°\s?[-)]|\d{1,2}\)(?=\s)"),    # 1°-  2°)  3)
+    (4, r"[a-z]\)(?=\s)|-(?=\s)|\uf0d8"),         # a)  - puces
+]
+MARKER_RE = re.compile(
+    "|".join(f"(?P<l{level}>{pattern})" for level, pattern in STRUCTURE_MARKERS)
+)
+SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+# Un nouveau paragraphe de niveau I.- ferme le chunk courant s'il est rempli à moitié
+SECTION_FLUSH_RATIO = 0.5
+
+
+def split_units(text: str) -> List[Tuple[int, str]]:
+    """
+    Découpe un article en unités (niveau, texte) aux marqueurs de structure ;
+    le texte qui précède le premier marqueur est de niveau 0.
+    """
+    text = " ".join(text.split())
+    starts = [(0, 0)]
+    for match in MARKER_RE.finditer(text):
+        start = match.start()
+        if start > 0 and text[start - 1] == " ":
+            starts.append((start, int(match.lastgroup[1:])))
+
+    units = []
+    for (start, level), (end, _) in zip(starts, starts[1:] + [(len(text), 0)]):
+        unit = text[start:end].strip()
+        if unit:
+            units.append((level, unit))
+    return units
+
+
+class StructureChunker:
+    """
+    Chunker des articles de loi : coupe aux marqueurs d'énumération
+    (I.-, A.-, 1°-, a), tirets) plutôt qu'au milieu d'une liste, remplit
+    chaque chunk jusqu'à `max_tokens` tokens du modèle d'embedding et
+    répète les `overlap_tokens` derniers tokens (phrases entières si
+    possible) en tête du chunk suivant. Les chunks de suite sont préfixés
+    par l'intitulé de l'article.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 tokenizer_name: str = CHUNK_TOKENIZER):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.tokenizer = get_tokenizer(tokenizer_name)
+
+    @property
+    def signature(self) -> str:
+        """Identifie les réglages : un changement impose de redécouper les sources."""
+        return f"structure:{self.max_tokens}:{self.overlap_tokens}:{self.tokenizer.name}"
+
+    def count(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    def chunk(self, text: str, heading: str = "") -> List[Tuple[str, int]]:
+        """Chunks (texte, nombre de tokens) d'un article."""
+        text = " ".join(text.split())
+        if not text:
+            return []
+        total = self.count(text)
+        if total <= self.max_tokens:
+            return [(text, total)]
+
+        heading = " ".join(heading.split())
+        prefix = f"{heading} […] " if heading else ""
+        budget = self.max_tokens - self.count(prefix)
+        if budget < self.max_tokens // 2:
+            prefix, budget = "", self.max_tokens
+
+        pieces = []
+        for level, unit in split_units(text):
+            pieces.extend((level, piece, n) for piece, n in self._fit(unit, budget))
+
+        chunks: List[List[Tuple[str, int]]] = []
+        current, size = [], 0
+        for level, piece, n in pieces:
+            section_break = level == 1 and size >= budget * SECTION_FLUSH_RATIO
+            if current and (size + n > budget or section_break):
+                chunks.append(current)
+                current = self._overlap(current, budget - n)
+                size = sum(m for _, m in current)
+            current.append((piece, n))
+            size += n
+        if current:
+            chunks.append(current)
+
+        result = []
+        for i, parts in enumerate(chunks):
+            body = " ".join(piece for piece, _ in parts)
+            result.append(((prefix if i else "") + body, sum(n for _, n in parts) + (self.count(prefix) if i else 0)))
+        return result
+
+    def _fit(self, unit: str, budget: int) -> List[Tuple[str, int]]:
+        """Une unité trop longue est redécoupée en phrases, puis en groupes de mots."""
+        n = self.count(unit)
+        if n <= budget:
+            return [(unit, n)]
+        pieces = []
+        for sentence in SENTENCE_RE.split(unit):
+            n = self.count(sentence)
+            if n <= budget:
+                pieces.append((sentence, n))
+                continue
+            words, group = sentence.split(), []
+            for word in words:
+                if group and self.count(" ".join(group + [word])) > budget:
+                    pieces.append((" ".join(group), self.count(" ".join(group))))
+                    group = []
+                group.append(word)
+            if group:
+                pieces.append((" ".join(group), self.count(" ".join(group))))
+        return pieces
+
+    def _overlap(self, parts: List[Tuple[str, int]], room: int) -> List[Tuple[str, int]]:
+        """Fin du chunk précédent (≤ overlap_tokens) à répéter en tête du suivant."""
+        limit = min(self.overlap_tokens, room)
+        if limit <= 0:
+            return []
+        tail_sentences = []
+        for piece, _ in reversed(parts):
+            tail_sentences = SENTENCE_RE.split(piece) + tail_sentences
+            if self.count(" ".join(tail_sentences)) > limit:
+                break
+
+        tail, size = [], 0
+        for sentence in reversed(tail_sentences):
+            n = self.count(sentence)
+            if size + n > limit:
+                break
+            tail.insert(0, sentence)
+            size += n
+        if not tail:
+            # Dernière phrase trop longue : ses derniers mots
+            words = tail_sentences[-1].split() if tail_sentences else []
+            while words and self.count(" ".join(words)) > limit:
+                words = words[len(words) // 4 + 1:]
+            if words:
+                tail = [" ".join(words)]
+        text = " ".join(tail)
+        return [(text, self.count(text))] if text else []
+
+
+_chunker = None
+
+
+def get_chunker() -> StructureChunker:
+    global _chunker
+    if _chunker is None:
+        _chunker = StructureChunker()
+    return _chunker
@@ -1,31 +1,58 @@
+import csv
 import os
-import pandas as pd
-import uuid
 import re
 
-def load_csv(file_name):
-    if os.path.exists(file_name):
-        df = pd.read_csv(file_name)
-    else:
+from config import CHUNKER
+from preprocessing.manifest import article_parent_id, chunk_content_id
+from services.article_index import normalize_doc
+from services.retrieved_chunk import make_snippet
+
+# Colonnes standard : les CSV utilisent des noms variables (doc/Doc/DOC, texte/contenu...)
+COL_MAPPING = {
+    'doc': 'DOC', 'titre': 'Titre', 'chapitre': 'Chapitre',
+    'section': 'Section', 'article': 'Article',
+    'contenu': 'Contenu', 'texte': 'Contenu', 'pages': 'Pages'
+}
+STANDARD_COLUMNS = ['DOC', 'Titre', 'Chapitre', 'Section', 'Article', 'Contenu', 'Pages']
+
+MAX_CHUNK_CHARS = 1000
+
+# Version des métadonnées des chunks : la changer force la réécriture de tous les chunks
+# (2 : clé 'corpus' pour le filtrage par corpus). Une clé calculable depuis le texte
+# et les métadonnées ('snippet') se complète sans réécriture (voir backfill_snippets).
+METADATA_VERSION = 2
+
+
+def source_name_for(file_name):
+    """Nom de la source : nom du fichier sans extension."""
+    return os.path.basename(file_name).replace('.csv', '')
+
+
+def iter_rows(file_name):
+    """
+    Lit un CSV ligne par ligne (sans DataFrame) et produit des dicts aux
+    colonnes standardisées, avec le champ 'texte_complet' (Article + Contenu).
+    """
+    if not os.path.exists(file_name):
         raise FileNotFoundError(f"{file_name} introuvable !")
-    return df
-
-def preprocess_csv(df, file_name):
-    df.columns = [col.strip().lower() for col in df.columns]
-    col_mapping = {
-        'doc': 'DOC', 'titre': 'Titre', 'chapitre': 'Chapitre',
-        'section': 'Section', 'article': 'Article',
-        'contenu': 'Contenu', 'texte': 'Contenu', 'pages': 'Pages'
-    }
-    df = df.rename(columns={col: col_mapping.get(col, col) for col in df.columns})
-    for col in ['DOC', 'Titre', 'Chapitre', 'Section', 'Article', 'Contenu', 'Pages']:
-        if col not in df.columns:
-            df[col] = ''
-    df['texte_complet'] = df['Article'].fillna('') + ' ' + df['Contenu'].fillna('')
-    df['texte_complet'] = df['texte_complet'].str.replace('\r\n', ' ').str.strip()
-    return df
-
-def chunk_text(text, max_chars=1000):
+
+    with open(file_name, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [COL_MAPPING.get(col.strip().lower(), col.strip().lower()) for col in header]
+
+        for values in reader:
+            row = dict(zip(columns, values))
+            for col in STANDARD_COLUMNS:
+                row.setdefault(col, '')
+            texte = (row['Article'] + ' ' + row['Contenu']).replace('\r\n', ' ').strip()
+            row['texte_complet'] = texte
+            yield row
+
+
+def chunk_text(text, max_chars=MAX_CHUNK_CHARS):
     sents = re.split(r'(?<=[.!?])\s+', text.strip())
     chunks, chunk = [], ""
     for sent in sents:
@@ -39,22 +66,118 @@ def chunk_text(text, max_chars=1000):
         chunks.append(chunk.strip())
     return chunks
 
-def prepare_chunks(df, source_name):
-    texts, metadatas, ids = [], [], []
-    for idx, row in df.iterrows():
-        content = str(row['texte_complet']).strip()
+
+def chunker_signature(chunker=CHUNKER):
+    """Réglages du découpage et version des métadonnées, gardés dans le manifeste d'ingestion."""
+    if chunker == "structure":
+        from preprocessing.chunker import get_chunker
+        signature = get_chunker().signature
+    else:
+        signature = f"sentences:{MAX_CHUNK_CHARS}"
+    return f"{signature}|meta:{METADATA_VERSION}"
+
+
+def split_article(content, article, chunker=CHUNKER):
+    """Chunks (texte, nombre de tokens ou None) d'un article selon le découpage choisi."""
+    if chunker == "structure":
+        from preprocessing.chunker import get_chunker
+        return get_chunker().chunk(content, heading=article)
+    chunks = chunk_text(content) if len(content) > MAX_CHUNK_CHARS else [content]
+    return [(chunk, None) for chunk in chunks]
+
+
+def iter_chunks(file_name, source_name=None, chunker=CHUNKER):
+    """
+    Flux de chunks (id, texte, métadonnées) d'un CSV, ligne après ligne :
+    la mémoire reste bornée quelle que soit la taille du fichier.
+    Les IDs sont des empreintes du contenu (voir chunk_content_id) ;
+    'parent_id' regroupe les chunks d'un même article, 'corpus' sert au
+    filtrage par corpus de la recherche, 'snippet' est l'extrait cité dans
+    les références légales.
+    """
+    source_name = source_name or source_name_for(file_name)
+    for row in iter_rows(file_name):
+        content = row['texte_complet']
         if not content:
             continue
-        chunks = chunk_text(content) if len(content) > 1000 else [content]
-        for i, chunk in enumerate(chunks):
-            texts.append(chunk)
-            metadatas.append({
+        chunks = split_article(content, row['Article'], chunker)
+        parent_id = article_parent_id(source_name, row['Article'])
+        for i, (chunk, n_tokens) in enumerate(chunks):
+            meta = {
                 'source': source_name,
                 'doc': row['DOC'],
+                'corpus': normalize_doc(row['DOC'] or source_name),
                 'article': row['Article'],
                 'pages': row['Pages'],
                 'titre': row['Titre'],
-                'chunk_id': i
-            })
-            ids.append(str(uuid.uuid4()))
-    return texts, metadatas, ids
+                'chunk_id': i,
+                'parent_id': parent_id,
+                'chunk_count': len(chunks),
+                'snippet': make_snippet(chunk, row['Article'])
+            }
+            if n_tokens is not None:
+                meta['tokens'] = n_tokens
+            yield chunk_content_id(source_name, row['Article'], i, chunk), chunk, meta
+
+
+def backfill_snippets(collection, chunk_ids, batch_size=500):
+    """
+    Ajoute la métadonnée 'snippet' aux chunks indexés avant elle, par
+    collection.update : ni redécoupage ni nouvel embedding (le texte, donc
+    l'ID, est inchangé). Retourne le nombre de chunks complétés.
+    """
+    chunk_ids = list(chunk_ids)
+    filled = 0
+    for i in range(0, len(chunk_ids), batch_size):
+        page = collection.get(ids=chunk_ids[i:i + batch_size], include=['documents', 'metadatas'])
+        todo = [
+            (chunk_id, {**meta, 'snippet': make_snippet(doc, meta.get('article', ''))})
+            for chunk_id, doc, meta in zip(page['ids'], page['documents'], page['metadatas'])
+            if 'snippet' not in meta
+        ]
+        if todo:
+            collection.update(ids=[chunk_id for chunk_id, _ in todo], metadatas=[meta for _, meta in todo])
+            filled += len(todo)
+    return filled
+
+
+def refresh_metadata(collection, chunks):
+    """
+    Réécrit, par collection.update, les métadonnées des chunks gardés tels
+    quels (même texte, donc même ID) quand celles recalculées diffèrent de
+    celles indexées : nombre de chunks de l'article, pages, titre...
+    `chunks` : liste de (id, métadonnées recalculées). Retourne les IDs mis à jour.
+    """
+    if not chunks:
+        return []
+    fresh = dict(chunks)
+    page = collection.get(ids=list(fresh), include=['metadatas'])
+    todo = [
+        (chunk_id, fresh[chunk_id])
+        for chunk_id, meta in zip(page['ids'], page['metadatas'])
+        if any((meta or {}).get(key) != value for key, value in fresh[chunk_id].items())
+    ]
+    if todo:
+        collection.update(ids=[chunk_id for chunk_id, _ in todo], metadatas=[meta for _, meta in todo])
+    return [chunk_id for chunk_id, _ in todo]
+
+
+def iter_unique(chunks):
+    """Écarte les chunks dont l'ID a déjà été vu (lignes dupliquées)."""
+    seen = set()
+    for chunk in chunks:
+        if chunk[0] not in seen:
+            seen.add(chunk[0])
+            yield chunk
+
+
+def iter_fixed_batches(items, batch_size):
+    """Regroupe un flux en listes de `batch_size` éléments."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
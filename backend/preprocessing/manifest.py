@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from config import INGEST_MANIFEST_FILE
+
+
+def chunk_content_id(source_name, article, chunk_index, text):
+    """
+    ID déterministe d'un chunk : empreinte SHA-256 de sa source, de son
+    article, de sa position et de son texte. Le même contenu donne le même
+    ID d'une ingestion à l'autre ; un article modifié donne un nouvel ID.
+    """
+    digest = hashlib.sha256(
+        "\x1f".join([str(source_name), str(article), str(chunk_index), str(text)]).encode("utf-8")
+    ).hexdigest()
+    return f"{source_name}-{digest[:32]}"
+
+
+def article_parent_id(source_name, article):
+    """ID commun aux chunks d'un même article (métadonnée 'parent_id')."""
+    digest = hashlib.sha256(f"{source_name}\x1f{article}".encode("utf-8")).hexdigest()
+    return f"{source_name}-art-{digest[:16]}"
+
+
+def file_sha256(path):
+    """Empreinte SHA-256 du contenu d'un fichier."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest(path=INGEST_MANIFEST_FILE):
+    """
+    Manifeste d'ingestion : pour chaque source, l'empreinte du fichier
+    et les IDs des chunks actuellement dans ChromaDB.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=INGEST_MANIFEST_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def manifest_entry(file_hash, chunk_ids, chunker=None):
+    return {
+        "sha256": file_hash,
+        "chunker": chunker,
+        "chunks": list(chunk_ids),
+        "ingested_at": datetime.utcnow().isoformat(),
+    }
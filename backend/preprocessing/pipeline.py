@@ -0,0 +1,133 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from config import (
+    INGEST_EMBED_WORKERS, INGEST_BATCH_CHARS, INGEST_MIN_BATCH, INGEST_MAX_BATCH, INGEST_QUEUE_DEPTH
+)
+
+# Un chunk à indexer : (id, texte, métadonnées)
+Chunk = Tuple[str, str, Dict]
+
+_DONE = object()
+
+
+def iter_adaptive_batches(chunks: Iterable[Chunk], target_chars: int = INGEST_BATCH_CHARS,
+                          min_size: int = INGEST_MIN_BATCH, max_size: int = INGEST_MAX_BATCH) -> Iterator[List[Chunk]]:
+    """
+    Regroupe les chunks en batches d'environ `target_chars` caractères :
+    beaucoup de chunks courts ou peu de chunks longs par batch, pour un
+    coût d'embedding à peu près constant d'un batch à l'autre.
+    """
+    batch, size = [], 0
+    for chunk in chunks:
+        batch.append(chunk)
+        size += len(chunk[1])
+        if len(batch) >= max_size or (size >= target_chars and len(batch) >= min_size):
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+class _StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.chunks = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, chunks, seconds):
+        with self._lock:
+            self.chunks += chunks
+            self.busy += seconds
+
+    def report(self, workers=1):
+        # Débit d'un étage = chunks traités / temps actif (réparti sur ses workers)
+        rate = self.chunks * workers / self.busy if self.busy else 0.0
+        return f"   {self.name:<10} {self.chunks:>7} chunks  {self.busy:7.1f}s actifs  {rate:9.1f} chunks/s"
+
+
+def index_chunks(collection, chunks: Iterable[Chunk], embed_workers: int = INGEST_EMBED_WORKERS) -> int:
+    """
+    Indexe des chunks dans ChromaDB en pipeline, les étages se chevauchant :
+      1. découpage : consommation du générateur de chunks en batches adaptatifs
+      2. embedding : batches encodés en parallèle (pool de threads, modèle partagé)
+      3. écriture  : upsert dans ChromaDB avec les embeddings précalculés
+    Affiche le débit de chaque étage. Retourne le nombre de chunks indexés.
+    """
+    from services.embedding_service import embedding_service
+
+    chunk_stats = _StageStats("découpage")
+    embed_stats = _StageStats("embedding")
+    write_stats = _StageStats("écriture")
+
+    write_queue: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+    errors = []
+
+    def embed(batch):
+        start = time.perf_counter()
+        embeddings = embedding_service.embed_documents([text for _, text, _ in batch])
+        embed_stats.add(len(batch), time.perf_counter() - start)
+        return batch, embeddings
+
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is _DONE:
+                return
+            if errors:
+                continue  # on vide la file sans écrire après une erreur
+            batch, embeddings = item
+            start = time.perf_counter()
+            try:
+                collection.upsert(
+                    ids=[chunk_id for chunk_id, _, _ in batch],
+                    documents=[text for _, text, _ in batch],
+                    metadatas=[meta for _, _, meta in batch],
+                    embeddings=embeddings
+                )
+            except Exception as e:
+                errors.append(e)
+            write_stats.add(len(batch), time.perf_counter() - start)
+
+    writer_thread = threading.Thread(target=writer, name="ingest-writer", daemon=True)
+    writer_thread.start()
+
+    started = time.perf_counter()
+    in_flight = []
+    try:
+        with ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="ingest-embed") as pool:
+            batches = iter_adaptive_batches(chunks)
+            while True:
+                start = time.perf_counter()
+                batch = next(batches, None)
+                if batch is not None:
+                    chunk_stats.add(len(batch), time.perf_counter() - start)
+                    in_flight.append(pool.submit(embed, batch))
+
+                # Au plus 2 batches en attente par worker : mémoire bornée
+                while in_flight and (batch is None or len(in_flight) >= 2 * embed_workers):
+                    write_queue.put(in_flight.pop(0).result())
+                    if errors:
+                        raise errors[0]
+
+                if batch is None:
+                    break
+    finally:
+        write_queue.put(_DONE)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    total = write_stats.chunks
+    print(f"\n⏱️  Pipeline d'indexation : {total} chunks en {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:.1f} chunks/s)")
+    print(chunk_stats.report())
+    print(embed_stats.report(embed_workers))
+    print(write_stats.report())
+    return total
@@ -1,25 +1,786 @@
-from flask import Blueprint, request, jsonify
-from services.llm_service import ask_juridique
-from services.vector_db import init_chroma
-from services.conversation_db import init_db, create_conversation, add_message, get_conversation, list_conversations
-from config import TOP_K
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from services.llm_service import (
+    generate_juridique, stream_ollama_juridique, clean_juridique_answer,
+    format_ai_response_with_sources, format_sources_footer, generate_smart_fallback,
+    RESPONSE_HEADER, STREAM_INTERRUPTED_NOTICE, LLMStreamInterrupted, build_juridique_prompt,
+    llm_client, llm_lifecycle
+)
+from services.resources import resources
+from services.lexical_index import reciprocal_rank_fusion
+from services.article_index import normalize_article_number, ARTICLE_NUMBER_RE
+from services.corpus_router import corpus_router, CORPORA, DOC_HINTS
+from services.retrieved_chunk import RetrievedChunk
+from services.vector_db import get_article_chunks
+from services.answer_cache import answer_cache, normalize_question
+from services.single_flight import SingleFlight
+from services.metrics import (
+    RequestTimings, ANSWER_CACHE_LOOKUPS, COALESCED_REQUESTS, CORPUS_ROUTES, PROMPT_TOKENS, REGISTRY, CONTENT_TYPE
+)
+from services.conversation_db import (
+    create_conversation, add_message, queue_conversation, queue_message,
+    get_conversation, list_conversations
+)
+from config import (
+    TOP_K, HYBRID_CANDIDATES, RRF_K, RERANK_CANDIDATES, ASK_SINGLE_FLIGHT,
+    CORPUS_ROUTING, CORPUS_MIN_RESULTS, ASK_BATCH_MAX_QUESTIONS, ASK_BATCH_CONCURRENCY,
+    CONVERSATIONS_PAGE_SIZE, CONVERSATIONS_MAX_PAGE_SIZE, CONTEXT_EXPAND_ARTICLES, CONTEXT_MAX_TOKENS
+)
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import json
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
 
 chat_bp = Blueprint('chat', __name__)
 
 # ================================
-# ⚙️ Initialisation de ChromaDB
+# 🎯 Seuil de pertinence
 # ================================
+SIMILARITY_THRESHOLD = 0.3  # Réduit pour accepter plus de résultats
+
+
+NO_RESULTS_ANSWER = """❌ **Aucun article pertinent trouvé**
+
+Votre question ne semble pas correspondre aux documents juridiques disponibles dans notre base de données.
+
+💡 **Suggestions :**
+- Reformulez votre question de manière plus précise
+- Utilisez des termes juridiques (ex: "vol", "divorce", "contrat", "héritage")
+- Vérifiez l'orthographe
+
+📚 **Domaines couverts :**
+- Code pénal marocain
+- Code civil
+- Code de la famille
+- Code du travail
+- Code de commerce
 
-client, collection = init_chroma()
+_💼 Assistant Juridique Marocain_"""
 
-# Initialiser la DB d'historique
-init_db()
 
 # ================================
-# 🎯 Seuil de pertinence
+# 📖 Accès direct aux articles ("Article 2 du CGI")
 # ================================
-SIMILARITY_THRESHOLD = 0.3  # Réduit pour accepter plus de résultats
+# Mots qui n'empêchent pas de traiter la question comme une simple référence
+LOOKUP_FILLER = {
+    'que', 'dit', 'quel', 'quelle', 'est', 'le', 'la', 'les', 'l', 'de', 'du', 'des', 'd',
+    'contenu', 'texte', 'donne', 'donner', 'moi', 'montre', 'affiche', 'afficher', 'voir',
+    'lire', 'citer', 'article', 'loi', 'code', 'n', 'no', 'numéro', 'selon', 'dans', 'sur',
+    'svp', 'stp', 's', 'il', 'te', 'plait', 'plaît', 'me', 'en', 'vigueur', '2024',
+}
+# Au-delà de la référence seule, accès direct seulement si le corpus est connu
+# (cité, demandé ou deviné) et contient l'article ; sinon recherche + article remonté
+LOOKUP_MAX_EXTRA_WORDS = 2
+
+
+def _parse_article_reference(question):
+    """
+    Détecte un article cité dans la question.
+    Retourne (corpus cité ou None, numéro normalisé, nombre de mots hors
+    référence), ou None si aucun article n'est cité.
+    """
+    match = ARTICLE_NUMBER_RE.search(question)
+    if not match:
+        return None
+    number = normalize_article_number(match.group(0))
+    rest = question[:match.start()] + " " + question[match.end():]
+
+    doc_key = None
+    for key, pattern in DOC_HINTS:
+        hint = pattern.search(rest)
+        if hint:
+            doc_key = key
+            rest = rest[:hint.start()] + " " + rest[hint.end():]
+            break
+
+    extra = [w for w in re.findall(r"\w+", rest.lower()) if w not in LOOKUP_FILLER]
+    return doc_key, number, len(extra)
+
+
+def _answer_from_article_index(question, corpus=None):
+    """
+    Répond directement avec le texte de l'article demandé, sans recherche
+    vectorielle ni LLM. Retourne (réponse, nb_articles) ou None.
+    `corpus` (paramètre de /ask) s'applique si la question n'en cite aucun.
+    Question réduite à la référence : l'article de chaque corpus qui le
+    contient. Question plus large ("la durée de la société selon l'article 3") :
+    seulement si le corpus est connu et contient l'article, sinon None
+    (la recherche remonte alors l'article, voir _cited_chunk_ids).
+    """
+    article_index = resources.article_index
+    if article_index is None:
+        return None
+    reference = _parse_article_reference(question)
+    if reference is None:
+        return None
+
+    doc_key, number, extra = reference
+    doc_key = doc_key or corpus
+    if extra:
+        if extra > LOOKUP_MAX_EXTRA_WORDS:
+            return None
+        if doc_key is None and CORPUS_ROUTING:
+            doc_key, _ = corpus_router.route(question)
+        if doc_key is None:
+            logger.info("Article %s cité sans corpus déterminé → RAG", number)
+            return None
+
+    matches = article_index.lookup(number, doc_key)
+    if not matches:
+        logger.info("Article %s (%s) absent de l'index → RAG", number, doc_key or 'tous corpus')
+        return None
+
+    chunk_ids = [chunk_id for ids in matches.values() for chunk_id in ids]
+    fetched = resources.collection.get(ids=chunk_ids, include=['documents', 'metadatas'])
+    by_id = dict(zip(fetched['ids'], zip(fetched['documents'], fetched['metadatas'])))
+
+    sections = []
+    for ids in list(matches.values())[:TOP_K]:
+        parts = [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+        if not parts:
+            continue
+        meta = parts[0][1]
+        doc_name = str(meta.get('doc', meta.get('source', 'Document inconnu'))).strip()
+        text = "\n\n".join(str(doc).strip() for doc, _ in parts)
+        sections.append(f"📖 **{doc_name}**\n\n{text}")
+
+    if not sections:
+        return None
+
+    logger.info("Accès direct : article %s (%d corpus)", number, len(sections))
+    answer = "\n\n---\n\n".join(sections)
+    answer += "\n\n---\n_💼 Source : Base de données juridique marocaine_"
+    return answer, len(sections)
+
+
+# ================================
+# 🔧 Étapes communes à /ask et /ask/stream
+# ================================
+def _ensure_conversation(question, conversation_id):
+    """Crée une conversation si besoin et retourne son identifiant."""
+    if not conversation_id:
+        title = (question[:80] + '...') if len(question) > 80 else question
+        conversation_id = queue_conversation(title=title)
+    return conversation_id
+
+
+def _save_message(conversation_id, role, text):
+    """
+    Met le message en file d'écriture (write-behind) : aucune attente
+    SQLite sur le chemin de la réponse. Les erreurs d'écriture sont
+    journalisées par le thread d'écriture.
+    """
+    try:
+        queue_message(conversation_id, role, text, datetime.utcnow().isoformat())
+    except Exception as e:
+        logger.warning("Erreur d'enregistrement du message %s : %s", role, e)
+
+
+def _search_relevant_articles(question, query_embedding, timings, corpus=None, results=None):
+    """
+    Recherche dans ChromaDB (limitée au corpus `corpus` s'il est donné) et
+    filtre selon le seuil de similarité. Si le corpus donne moins de
+    CORPUS_MIN_RESULTS résultats, la recherche porte sur tous les corpus.
+    Si l'index lexical est chargé, fusionne avec la recherche BM25 (RRF).
+    Un article cité dans la question (sans accès direct) est remonté dans les résultats.
+    Si le cross-encoder est chargé, reclasse les candidats avant de garder les TOP_K.
+    `results` : résultats ChromaDB déjà obtenus (requête groupée de /ask/batch).
+    Retourne (ids, documents, métadonnées, corpus effectivement utilisé ou None).
+    """
+    if results is None:
+        with timings.stage("chroma_query"):
+            results = _query_vectors(query_embedding, corpus)
+
+    with timings.stage("filter"):
+        relevant_ids, relevant_docs, relevant_metas = _filter_by_similarity(results)
+
+    if corpus is not None and len(relevant_ids) < CORPUS_MIN_RESULTS:
+        # Corpus mal deviné (ou index sans métadonnée 'corpus') : recherche élargie
+        logger.info("Corpus %s : %d résultat(s) → recherche sur tous les corpus", corpus, len(relevant_ids))
+        CORPUS_ROUTES.inc(corpus=corpus, source="widened")
+        corpus = None
+        with timings.stage("chroma_query"):
+            results = _query_vectors(query_embedding)
+        with timings.stage("filter"):
+            relevant_ids, relevant_docs, relevant_metas = _filter_by_similarity(results)
+
+    limit = RERANK_CANDIDATES if resources.reranker is not None else TOP_K
+    if resources.lexical_index is not None:
+        with timings.stage("lexical_fusion"):
+            relevant_ids, relevant_docs, relevant_metas = _fuse_with_lexical(
+                question, relevant_ids, relevant_docs, relevant_metas, limit, corpus
+            )
+
+    with timings.stage("article_boost"):
+        cited_ids = _cited_chunk_ids(question, corpus)
+        if cited_ids:
+            relevant_ids, relevant_docs, relevant_metas = _boost_cited(
+                relevant_ids, relevant_docs, relevant_metas, cited_ids, limit
+            )
+
+    if resources.reranker is not None and len(relevant_ids) > 1:
+        with timings.stage("rerank"):
+            relevant_ids, relevant_docs, relevant_metas = _rerank(
+                question, relevant_ids, relevant_docs, relevant_metas
+            )
+
+    logger.debug("Total articles pertinents : %d", min(len(relevant_docs), TOP_K))
+    return relevant_ids[:TOP_K], relevant_docs[:TOP_K], relevant_metas[:TOP_K], corpus
+
+
+def _query_vectors(query_embedding, corpus=None):
+    """
+    Plus proches voisins dans ChromaDB (plus de candidats en recherche
+    hybride et pour le reclassement), dans le corpus `corpus` s'il est donné.
+    """
+    return _query_vectors_many([query_embedding], corpus)[0]
+
+
+def _query_vectors_many(query_embeddings, corpus=None):
+    """
+    _query_vectors pour plusieurs questions en une seule requête ChromaDB :
+    une liste de résultats (même format que collection.query pour une question).
+    """
+    n_results = TOP_K
+    if resources.lexical_index is not None:
+        n_results = max(n_results, HYBRID_CANDIDATES)
+    if resources.reranker is not None:
+        n_results = max(n_results, RERANK_CANDIDATES)
+    results = resources.collection.query(
+        query_embeddings=list(query_embeddings),
+        n_results=n_results,
+        where={"corpus": corpus} if corpus is not None else None
+    )
+    keys = [key for key in ('ids', 'distances', 'documents', 'metadatas') if results.get(key) is not None]
+    return [{key: [results[key][i]] for key in keys} for i in range(len(query_embeddings))]
+
+
+def _filter_by_similarity(results):
+    """Garde les résultats au-dessus du seuil de similarité : (ids, documents, métadonnées)."""
+    # Récupération des résultats
+    ids = results.get('ids', [[]])[0]
+    distances = results.get('distances', [[]])[0]
+    documents = results.get('documents', [[]])[0]
+    metadatas = results.get('metadatas', [[]])[0]
+
+    # Détail de chaque résultat en DEBUG seulement (rien n'est formaté sinon)
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    # Filtrer selon le seuil de similarité
+    relevant_ids = []
+    relevant_docs = []
+    relevant_metas = []
+
+    for i, distance in enumerate(distances):
+        # Convertir distance en similarité (0-1)
+        similarity = 1 - (distance / 2)
+        pertinent = similarity >= SIMILARITY_THRESHOLD
+
+        if pertinent:
+            relevant_ids.append(ids[i])
+            relevant_docs.append(documents[i])
+            relevant_metas.append(metadatas[i])
+
+        if debug:
+            meta = metadatas[i]
+            logger.debug(
+                "Résultat %d %s : similarité=%.4f distance=%.4f source=%s article=%s extrait=%r",
+                i + 1, "pertinent" if pertinent else "écarté", similarity, distance,
+                meta.get('doc', meta.get('source', 'N/A')), meta.get('article', 'N/A'), documents[i][:100]
+            )
+
+    if debug:
+        logger.debug("Filtrage (seuil = %s) : %d/%d pertinents", SIMILARITY_THRESHOLD, len(relevant_ids), len(ids))
+    return relevant_ids, relevant_docs, relevant_metas
+
+
+def _fuse_with_lexical(question, vector_ids, vector_docs, vector_metas, limit=TOP_K, corpus=None):
+    """
+    Recherche BM25 (dans le corpus `corpus` s'il est donné) puis fusion RRF
+    avec les résultats vectoriels filtrés : les `limit` premiers. Les chunks
+    trouvés uniquement par BM25 sont relus dans ChromaDB.
+    """
+    lexical_hits = resources.lexical_index.search(question, HYBRID_CANDIDATES, corpus=corpus)
+
+    fused_ids = reciprocal_rank_fusion(
+        [vector_ids, [doc_id for doc_id, _ in lexical_hits]], k=RRF_K
+    )[:limit]
+    logger.debug("Fusion RRF : %d résultats BM25, %d articles retenus", len(lexical_hits), len(fused_ids))
+    return _fused_results(fused_ids, dict(zip(vector_ids, zip(vector_docs, vector_metas))))
+
+
+def _cited_chunk_ids(question, corpus=None):
+    """
+    Chunks de l'article cité dans une question passée par la recherche
+    (dans le corpus cité, sinon `corpus`, sinon tous) : le premier chunk
+    de l'article de chaque corpus, puis la suite.
+    """
+    if resources.article_index is None:
+        return []
+    reference = _parse_article_reference(question)
+    if reference is None:
+        return []
+    doc_key, number, _ = reference
+    matches = list(resources.article_index.lookup(number, doc_key or corpus).values())
+    longest = max((len(ids) for ids in matches), default=0)
+    return [ids[i] for i in range(longest) for ids in matches if i < len(ids)]
+
+
+def _boost_cited(ids, docs, metas, cited_ids, limit=TOP_K):
+    """
+    Fusion RRF, à poids égal, des résultats de la recherche et des chunks de
+    l'article cité : un chunk cité déjà retrouvé passe en tête, les autres
+    s'intercalent avec les meilleurs résultats.
+    """
+    fused_ids = reciprocal_rank_fusion([ids, cited_ids], k=RRF_K)[:limit]
+    return _fused_results(fused_ids, dict(zip(ids, zip(docs, metas))))
+
+
+def _fused_results(fused_ids, known):
+    """(ids, documents, métadonnées) des IDs fusionnés ; ceux absents de `known` sont relus dans ChromaDB."""
+    missing = [doc_id for doc_id in fused_ids if doc_id not in known]
+    if missing:
+        fetched = resources.collection.get(ids=missing, include=['documents', 'metadatas'])
+        known.update(zip(fetched['ids'], zip(fetched['documents'], fetched['metadatas'])))
+
+    # Un ID absent de la collection (index en retard) est ignoré
+    fused_ids = [doc_id for doc_id in fused_ids if doc_id in known]
+    return (
+        fused_ids,
+        [known[doc_id][0] for doc_id in fused_ids],
+        [known[doc_id][1] for doc_id in fused_ids],
+    )
+
+
+def _rerank(question, ids, docs, metas):
+    """
+    Reclasse les candidats par le cross-encoder ; si le budget de temps
+    est dépassé, l'ordre de la recherche (vectorielle ou RRF) est conservé.
+    """
+    order = resources.reranker.rerank(question, ids, docs)
+    if order is None:
+        return ids, docs, metas
+    return [ids[i] for i in order], [docs[i] for i in order], [metas[i] for i in order]
+
+
+def _retrieved_chunks(ids, docs, metas):
+    """Résultats de la recherche sous forme de RetrievedChunk (jusqu'à la mise en forme)."""
+    return [RetrievedChunk.from_result(chunk_id, doc, meta) for chunk_id, doc, meta in zip(ids, docs, metas)]
+
+
+def _expand_articles(chunks):
+    """
+    Article dont plusieurs chunks sont retenus : complété par ses autres
+    chunks (get_article_chunks) pour être cité en entier, par ordre de
+    pertinence et tant que l'ensemble tient dans le budget de tokens du
+    contexte (aucun autre article n'est évincé). Retourne (chunks, nombre
+    d'articles complétés).
+    """
+    per_parent = {}
+    for chunk in chunks:
+        if chunk.parent_id:
+            per_parent.setdefault(chunk.parent_id, set()).add(chunk.id)
+    parents = [parent for parent, ids in per_parent.items() if len(ids) > 1]
+    if not CONTEXT_EXPAND_ARTICLES or not parents:
+        return chunks, 0
+
+    count = resources.context_builder.count
+    used = sum(count(chunk.text) for chunk in chunks)
+    expanded = list(chunks)
+    n_articles = 0
+    for parent in parents:
+        missing = [
+            RetrievedChunk.from_result(chunk_id, doc, meta)
+            for chunk_id, doc, meta in get_article_chunks(resources.collection, parent)
+            if chunk_id not in per_parent[parent]
+        ]
+        extra = sum(count(chunk.text) for chunk in missing)
+        if not missing or used + extra > CONTEXT_MAX_TOKENS:
+            continue
+        # L'article garde son rang (celui de son chunk le mieux classé) dans ContextBuilder
+        expanded.extend(missing)
+        used += extra
+        n_articles += 1
+    return expanded, n_articles
+
+
+def _build_context(chunks):
+    """
+    Construit le contexte juridique transmis au LLM (ContextBuilder :
+    articles réunis et complétés, quasi-doublons écartés, budget de tokens).
+    Retourne (contexte, références légales, statistiques).
+    """
+    chunks, expanded = _expand_articles(chunks)
+    context, references, stats = resources.context_builder.build(chunks)
+    stats["expanded"] = expanded
+    logger.debug("Contexte construit : %d caractères", len(context), extra={"context": stats})
+    return context, references, stats
+
+
+def _cached_answer(question, chunk_ids, query_embedding):
+    """Réponse déjà générée pour cette question et ces chunks, ou None."""
+    if answer_cache is None:
+        return None
+    answer = answer_cache.get(question, chunk_ids, query_embedding)
+    ANSWER_CACHE_LOOKUPS.inc(result="hit" if answer is not None else "miss")
+    if answer is not None:
+        logger.debug("Réponse servie depuis le cache")
+    return answer
+
+
+def _store_answer(question, chunk_ids, query_embedding, answer):
+    """Met en cache une réponse produite par le LLM (jamais un fallback)."""
+    if answer_cache is not None:
+        answer_cache.put(question, chunk_ids, answer, query_embedding)
+
+
+def _corpus_param(value):
+    """Paramètre 'corpus' de /ask ; retourne (corpus ou None = tous, erreur)."""
+    if value is None or str(value).strip().lower() in ("", "all", "tous"):
+        return None, None
+    corpus = str(value).strip().lower()
+    if corpus not in CORPORA:
+        return None, f"corpus inconnu : {value} (valeurs possibles : {', '.join(CORPORA)}, all)"
+    return corpus, None
+
+
+def _route_corpus(question, corpus):
+    """
+    Corpus de la recherche : celui demandé, sinon celui deviné par le
+    routeur (None = tous les corpus).
+    """
+    if corpus is not None:
+        source = "param"
+    elif CORPUS_ROUTING:
+        corpus, scores = corpus_router.route(question)
+        source = "router" if corpus is not None else "none"
+        logger.debug("Routage : %s (scores %s)", corpus or "tous corpus", scores)
+    else:
+        source = "none"
+    CORPUS_ROUTES.inc(corpus=corpus or "all", source=source)
+    return corpus
+
+
+def _prepare_answer(question, timings, corpus=None):
+    """
+    Étapes bloquantes communes à /ask et /ask/stream (serveurs Flask et ASGI) :
+    accès direct à l'article, routage vers un corpus, embedding, recherche,
+    cache des réponses. `corpus` : paramètre de la requête (None = routage).
+    Retourne un dict dont 'status' vaut :
+      - 'article_lookup', 'no_results' ou 'cached' : 'answer' est prête
+      - 'generate' : 'context' doit être envoyé au LLM, puis _complete_answer
+    """
+    # Référence directe à un article → réponse immédiate depuis l'index
+    prepared = _prepare_lookup(question, timings, corpus)
+    if prepared is not None:
+        return prepared
+
+    with timings.stage("route"):
+        corpus = _route_corpus(question, corpus)
+
+    # Recherche dans la base ChromaDB
+    with timings.stage("embed"):
+        query_embedding = resources.embeddings.embed_query(question)
+    return _prepare_from_search(question, timings, corpus, query_embedding)
+
+
+def _prepare_lookup(question, timings, corpus=None):
+    """Réponse 'article_lookup' si la question est une référence directe à un article, sinon None."""
+    with timings.stage("article_lookup"):
+        lookup = _answer_from_article_index(question, corpus)
+    if lookup is None:
+        return None
+    answer, nb_articles = lookup
+    return {"status": "article_lookup", "answer": answer, "sources_count": nb_articles, "corpus": corpus}
+
+
+def _prepare_from_search(question, timings, corpus, query_embedding, results=None):
+    """Suite de _prepare_answer une fois la question encodée : recherche, cache, contexte."""
+    relevant_ids, relevant_docs, relevant_metas, corpus = _search_relevant_articles(
+        question, query_embedding, timings, corpus, results
+    )
+
+    if not relevant_docs:
+        # Aucun article trouvé → Message d'erreur clair
+        return {"status": "no_results", "answer": NO_RESULTS_ANSWER, "sources_count": 0, "corpus": corpus}
+
+    prepared = {
+        "sources_count": len(relevant_docs),
+        "corpus": corpus,
+        "chunk_ids": relevant_ids,
+        "query_embedding": query_embedding,
+    }
+    answer = _cached_answer(question, relevant_ids, query_embedding)
+    if answer is not None:
+        return {**prepared, "status": "cached", "answer": answer}
+
+    # Articles trouvés → contexte pour la génération de la réponse juridique
+    with timings.stage("context"):
+        chunks = _retrieved_chunks(relevant_ids, relevant_docs, relevant_metas)
+        context, references, stats = _build_context(chunks)
+        prompt_tokens = resources.context_builder.count(build_juridique_prompt(question, context))
+    PROMPT_TOKENS.observe(prompt_tokens)
+    return {**prepared, "status": "generate", "context": context, "references": references,
+            "context_tokens": stats["tokens"], "prompt_tokens": prompt_tokens}
+
+
+def _complete_answer(question, prepared, answer, used_llm):
+    """Enregistre le résultat de la génération ; seule une réponse du LLM est mise en cache."""
+    if used_llm:
+        _store_answer(question, prepared["chunk_ids"], prepared["query_embedding"], answer)
+    prepared.update(status="generated", answer=answer, fallback=not used_llm)
+    return prepared
+
+
+def _interrupted_answer(prepared, answer):
+    """Réponse en streaming coupée : gardée pour l'historique, jamais mise en cache."""
+    prepared.update(status="generated", answer=answer, fallback=True)
+    return prepared
+
+
+# Questions identiques (normalisées) en cours de traitement dans /ask
+ask_flights = SingleFlight()
+
+
+def _answer_question(question, timings, corpus=None):
+    """Recherche puis génération complètes de /ask (calcul partagé par single-flight)."""
+    prepared = _prepare_answer(question, timings, corpus)
+    if prepared["status"] == "generate":
+        with timings.stage("llm"):
+            answer, used_llm = generate_juridique(question, prepared["context"], prepared["references"])
+        _complete_answer(question, prepared, answer, used_llm)
+    return prepared
+
+
+def _coalesced_answer(question, timings, corpus=None):
+    """
+    _answer_question, partagé entre les requêtes simultanées de même
+    question normalisée (et même corpus demandé) : une seule recherche
+    ChromaDB et une seule génération. Retourne (prepared, partagé).
+    """
+    if not ASK_SINGLE_FLIGHT:
+        return _answer_question(question, timings, corpus), False
+    start = time.perf_counter()
+    prepared, shared = ask_flights.do(
+        (normalize_question(question), corpus), lambda: _answer_question(question, timings, corpus)
+    )
+    if shared:
+        timings.record("coalesced_wait", time.perf_counter() - start)
+        COALESCED_REQUESTS.inc(endpoint=timings.endpoint)
+    return prepared, shared
+
+
+# ================================
+# 📦 Questions en lot (/ask/batch)
+# ================================
+def _batch_items(data):
+    """
+    Questions de /ask/batch : chaînes ou objets {"question", "corpus"} ;
+    'corpus' au niveau du lot s'applique aux questions qui n'en donnent pas.
+    Retourne ([(question, corpus)], erreur).
+    """
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return None, "questions doit être une liste non vide"
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        return None, f"au plus {ASK_BATCH_MAX_QUESTIONS} questions par lot ({len(questions)} reçues)"
+
+    default_corpus, error = _corpus_param(data.get('corpus'))
+    if error:
+        return None, error
+    items = []
+    for i, item in enumerate(questions):
+        corpus = default_corpus
+        if isinstance(item, dict):
+            if item.get('corpus') is not None:
+                corpus, error = _corpus_param(item.get('corpus'))
+                if error:
+                    return None, f"question {i} : {error}"
+            item = item.get('question')
+        question = str(item or '').strip()
+        if not question:
+            return None, f"question {i} manquante"
+        items.append((question, corpus))
+    return items, None
+
+
+def _prepare_batch(items, timings):
+    """
+    _prepare_answer pour un lot de questions (distinctes) : un seul batch
+    d'embedding et une requête ChromaDB par corpus pour toutes les
+    questions qui ne sont pas des références directes.
+    Retourne la liste des `prepared`, dans l'ordre de `items`.
+    """
+    prepared = [None] * len(items)
+    pending = []
+    for i, (question, corpus) in enumerate(items):
+        prepared[i] = _prepare_lookup(question, timings, corpus)
+        if prepared[i] is None:
+            with timings.stage("route"):
+                pending.append((i, _route_corpus(question, corpus)))
+    if not pending:
+        return prepared
+
+    with timings.stage("embed"):
+        embeddings = resources.embeddings.embed_queries([items[i][0] for i, _ in pending])
+
+    by_corpus = {}
+    for (i, corpus), embedding in zip(pending, embeddings):
+        by_corpus.setdefault(corpus, []).append((i, embedding))
+    for corpus, members in by_corpus.items():
+        with timings.stage("chroma_query"):
+            results = _query_vectors_many([embedding for _, embedding in members], corpus)
+        for (i, embedding), result in zip(members, results):
+            prepared[i] = _prepare_from_search(items[i][0], timings, corpus, embedding, result)
+    return prepared
+
+
+def _batch_groups(items):
+    """Regroupe les questions identiques (normalisées, même corpus) : clé → indices dans le lot."""
+    groups = {}
+    for i, (question, corpus) in enumerate(items):
+        groups.setdefault((normalize_question(question), corpus), []).append(i)
+    return list(groups.values())
+
+
+def _batch_lines(items, indices, prepared, persist, conversation_id):
+    """
+    Lignes NDJSON d'une question du lot (une par occurrence dans le lot) ;
+    enregistre les échanges dans l'historique si `persist`.
+    """
+    lines = []
+    for n, i in enumerate(indices):
+        question = items[i][0]
+        conv_id = conversation_id
+        if persist:
+            conv_id = _ensure_conversation(question, conversation_id)
+            _save_message(conv_id, 'user', question)
+            _save_message(conv_id, 'bot', prepared["answer"])
+        lines.append(_ndjson({"index": i, **_ask_payload(question, prepared, conv_id, coalesced=n > 0)}))
+    return lines
+
+
+def _batch_done(timings, items, prepared_list):
+    """Dernière ligne de /ask/batch ; clôture le chronométrage du lot."""
+    statuses = [prepared["status"] for prepared in prepared_list if prepared is not None]
+    done = {
+        "done": True,
+        "questions": len(items),
+        "generated": statuses.count("generated"),
+        "cached": statuses.count("cached"),
+        "fallback": sum(1 for prepared in prepared_list if prepared and prepared.get("fallback")),
+    }
+    timings.finish("success", questions=len(items), unique=len(prepared_list), generated=done["generated"])
+    return _ndjson(done)
+
+
+def _ndjson(payload):
+    """Une ligne NDJSON."""
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+def _generate_timed(question, context, references):
+    """generate_juridique chronométré (appelé depuis les threads de /ask/batch)."""
+    start = time.perf_counter()
+    answer, used_llm = generate_juridique(question, context, references)
+    return answer, used_llm, time.perf_counter() - start
+
+
+def _ask_payload(question, prepared, conversation_id, coalesced=False):
+    """Corps JSON de la réponse de /ask."""
+    status = prepared["status"]
+    return {
+        "question": question,
+        "answer": prepared["answer"],
+        "sources_count": prepared["sources_count"],
+        "corpus": prepared.get("corpus"),
+        "mode": "juridique",
+        "status": status if status in ("article_lookup", "no_results") else "success",
+        "cached": status == "cached",
+        "fallback": prepared.get("fallback", False),
+        "coalesced": coalesced,
+        "conversation_id": conversation_id
+    }
+
+
+def _meta_payload(question, prepared, conversation_id):
+    """Premier événement de /ask/stream."""
+    return {
+        "question": question,
+        "sources_count": prepared["sources_count"],
+        "corpus": prepared.get("corpus"),
+        "mode": "juridique",
+        "conversation_id": conversation_id
+    }
+
+
+def _stream_done(timings, prepared):
+    """Clôture le chronométrage de /ask/stream ; retourne l'événement 'done'."""
+    status = prepared["status"]
+    interrupted = prepared.get("interrupted", False)
+    fallback = prepared.get("fallback", False) or interrupted
+    if status in ("article_lookup", "no_results"):
+        done = {"status": status}
+    elif interrupted:
+        # Flux d'Ollama coupé : réponse partielle suivie des références
+        done = {"status": "fallback", "interrupted": True}
+    elif fallback:
+        done = {"status": "fallback"}
+    else:
+        done = {"status": "success", "cached": status == "cached"}
+    timings.finish(done["status"], fallback=fallback, cached=status == "cached",
+                   sources=prepared["sources_count"], prompt_tokens=prepared.get("prompt_tokens"))
+    return done
+
+
+def _health_payload(llm_stats, flight_stats):
+    """
+    Corps de /health (serveurs Flask et ASGI : chacun son client Ollama
+    et ses requêtes regroupées).
+    Ne déclenche aucun chargement : pendant le préchargement, les
+    ressources pas encore prêtes sont à None (voir /ready).
+    """
+    chroma = resources.peek("chroma")
+    embeddings = resources.peek("embeddings")
+    reranker = resources.peek("reranker")
+    return {
+        "status": "✅ OK",
+        "ready": resources.is_ready(),
+        "collection": chroma[1].name if chroma else None,
+        "documents_count": chroma[1].count() if chroma else None,
+        "mode": "juridique_uniquement",
+        "llm": llm_stats,
+        "llm_model": llm_lifecycle.get_stats(),
+        "single_flight": flight_stats,
+        "answer_cache": answer_cache.get_stats() if answer_cache is not None else None,
+        "embeddings": embeddings.get_stats() if embeddings else None,
+        "reranker": reranker.get_stats() if reranker else None
+    }
+
+
+def _ready_payload():
+    """Corps et code HTTP de /ready : 503 tant que toutes les ressources ne sont pas chargées."""
+    status = resources.get_status()
+    return status, 200 if status["ready"] else 503
+
+
+def _page_limit(value):
+    """Taille de page de GET /conversations ; retourne (limit, erreur)."""
+    try:
+        limit = min(int(value), CONVERSATIONS_MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return None, "limit doit être un entier"
+    if limit < 1:
+        return None, "limit doit être positif"
+    return limit, None
+
+
+def _sse(event, payload):
+    """Formate un événement Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
 
 # ================================
@@ -30,159 +791,225 @@ def ask():
     """
     Endpoint pour poser une question juridique.
     MODE JURIDIQUE UNIQUEMENT - Toujours avec références.
+    'corpus' (optionnel) : cgi, igoc ou loi_17_95 limite la recherche à ce
+    corpus ; sans lui, le corpus est deviné d'après la question.
     """
+    timings = RequestTimings('/ask')
     try:
         data = request.json
         question = data.get('question', '').strip()
         conversation_id = data.get('conversation_id')  # optionnel
 
         if not question:
+            timings.finish("bad_request")
             return jsonify({
                 "error": "❌ Question manquante.",
                 "question": ""
             }), 400
 
-        print(f"\n🔍 Question reçue : {question}")
+        corpus, error = _corpus_param(data.get('corpus'))
+        if error:
+            timings.finish("bad_request")
+            return jsonify({"error": f"❌ {error}", "question": question}), 400
+
+        logger.debug("Question reçue : %s", question)
 
         # Créer une conversation si besoin
-        if not conversation_id:
-            title = (question[:80] + '...') if len(question) > 80 else question
-            conversation_id = create_conversation(title=title)
+        conversation_id = _ensure_conversation(question, conversation_id)
 
         # Enregistrer le message utilisateur
-        try:
-            add_message(conversation_id, 'user', question, datetime.utcnow().isoformat())
-        except Exception as e:
-            print(f"⚠️ Erreur enregistre message utilisateur : {e}")
-
-        # Recherche dans la base ChromaDB
-        print(f"🔎 Recherche dans ChromaDB (Top {TOP_K})...")
-        results = collection.query(
-            query_texts=[question],
-            n_results=TOP_K
-        )
-
-        # Récupération des résultats
-        distances = results.get('distances', [[]])[0]
-        documents = results.get('documents', [[]])[0]
-        metadatas = results.get('metadatas', [[]])[0]
-
-        # 🔍 DEBUG : Afficher TOUS les résultats
-        print(f"\n🐛 DEBUG - Tous les résultats (avant filtrage) :")
-        for i, (dist, doc, meta) in enumerate(zip(distances, documents, metadatas), 1):
-            similarity = 1 - (dist / 2)
-            print(f"\n   📄 Résultat {i}:")
-            print(f"      Distance: {dist:.4f}")
-            print(f"      Similarité: {similarity:.4f}")
-            print(f"      Source: {meta.get('doc', meta.get('source', 'N/A'))}")
-            print(f"      Article: {meta.get('article', 'N/A')}")
-            print(f"      Extrait: {doc[:100]}...")
-
-        # Filtrer selon le seuil de similarité
-        relevant_docs = []
-        relevant_metas = []
-
-        print(f"\n📊 Filtrage (seuil = {SIMILARITY_THRESHOLD}) :")
-        for i, distance in enumerate(distances):
-            # Convertir distance en similarité (0-1)
-            similarity = 1 - (distance / 2)
-            
-            if similarity >= SIMILARITY_THRESHOLD:
-                relevant_docs.append(documents[i])
-                relevant_metas.append(metadatas[i])
-                print(f"   ✅ Document {i+1} : pertinent (similarité={similarity:.3f})")
-            else:
-                print(f"   ❌ Document {i+1} : non pertinent (similarité={similarity:.3f})")
+        _save_message(conversation_id, 'user', question)
 
-        nb_results = len(relevant_docs)
-        print(f"\n📊 Total articles pertinents : {nb_results}")
+        # Accès direct, recherche et cache ; sinon génération avec LLM + références
+        # (une seule fois pour les questions identiques reçues en même temps)
+        prepared, coalesced = _coalesced_answer(question, timings, corpus)
 
-        # ================================
-        # ⚖️ MODE JURIDIQUE UNIQUEMENT
-        # ================================
+        # Enregistrer la réponse (dans la conversation de chaque requête)
+        _save_message(conversation_id, 'bot', prepared["answer"])
 
-        if nb_results == 0:
-            # Aucun article trouvé → Message d'erreur clair
-            print("❌ Aucun article pertinent trouvé dans la base")
-            
-            answer = """❌ **Aucun article pertinent trouvé**
+        payload = _ask_payload(question, prepared, conversation_id, coalesced)
+        timings.finish(payload["status"], fallback=payload["fallback"], cached=payload["cached"],
+                       sources=payload["sources_count"], coalesced=coalesced,
+                       prompt_tokens=prepared.get("prompt_tokens"))
+        return jsonify(payload)
 
-Votre question ne semble pas correspondre aux documents juridiques disponibles dans notre base de données.
+    except Exception as e:
+        logger.exception("Erreur serveur : %s", e)
+        timings.finish("error")
 
-💡 **Suggestions :**
-- Reformulez votre question de manière plus précise
-- Utilisez des termes juridiques (ex: "vol", "divorce", "contrat", "héritage")
-- Vérifiez l'orthographe
+        return jsonify({
+            "error": f"Erreur serveur : {str(e)}",
+            "question": question if 'question' in locals() else ""
+        }), 500
 
-📚 **Domaines couverts :**
-- Code pénal marocain
-- Code civil
-- Code de la famille
-- Code du travail
-- Code de commerce
 
-_💼 Assistant Juridique Marocain_"""
+# ================================
+# 📡 Endpoint streaming : /ask/stream (SSE)
+# ================================
+@chat_bp.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """
+    Variante streaming de /ask (Server-Sent Events).
+    Accepte le même paramètre 'corpus' que /ask.
+    Événements envoyés dans l'ordre :
+      - meta       : conversation_id, sources_count, corpus
+      - token      : fragment de réponse (le premier est l'en-tête)
+      - references : bloc des références légales
+      - done       : statut final ; la réponse complète est alors enregistrée
+                     ("fallback" avec interrupted=true si le flux d'Ollama a été coupé)
+    """
+    data = request.json or {}
+    question = data.get('question', '').strip()
+    conversation_id = data.get('conversation_id')  # optionnel
+
+    if not question:
+        return jsonify({
+            "error": "❌ Question manquante.",
+            "question": ""
+        }), 400
+
+    corpus, error = _corpus_param(data.get('corpus'))
+    if error:
+        return jsonify({"error": f"❌ {error}", "question": question}), 400
+
+    logger.debug("Question reçue (streaming) : %s", question)
+    timings = RequestTimings('/ask/stream')
+
+    conversation_id = _ensure_conversation(question, conversation_id)
+    _save_message(conversation_id, 'user', question)
+
+    def generate():
+        try:
+            prepared = _prepare_answer(question, timings, corpus)
+            yield _sse('meta', _meta_payload(question, prepared, conversation_id))
+
+            if prepared["status"] != "generate":
+                yield _sse('token', {"text": prepared["answer"]})
+                _save_message(conversation_id, 'bot', prepared["answer"])
+                yield _sse('done', _stream_done(timings, prepared))
+                return
+
+            context, references = prepared["context"], prepared["references"]
+            llm_start = time.perf_counter()
+            tokens = stream_ollama_juridique(question, context)
+
+            # On attend le premier token avant d'envoyer l'en-tête :
+            # si Ollama ne répond pas, on bascule sur le fallback.
+            first_token = next(tokens, None)
+            timings.record("llm_first_token", time.perf_counter() - llm_start)
+            if first_token is None:
+                logger.warning("LLM local n'a pas répondu → utilisation du fallback")
+                answer = generate_smart_fallback(question, references)
+                _complete_answer(question, prepared, answer, used_llm=False)
+                yield _sse('token', {"text": answer})
+                _save_message(conversation_id, 'bot', answer)
+                yield _sse('done', _stream_done(timings, prepared))
+                return
 
-            # Enregistrer la réponse
+            yield _sse('token', {"text": RESPONSE_HEADER})
+            parts = [first_token]
+            yield _sse('token', {"text": first_token})
             try:
-                add_message(conversation_id, 'bot', answer, datetime.utcnow().isoformat())
-            except Exception as e:
-                print(f"⚠️ Erreur enregistre réponse bot : {e}")
+                for token in tokens:
+                    parts.append(token)
+                    yield _sse('token', {"text": token})
+            except LLMStreamInterrupted:
+                # Réponse coupée : signalée au client, jamais présentée comme complète
+                logger.warning("Flux du LLM interrompu → réponse partielle signalée")
+                prepared["interrupted"] = True
+                yield _sse('token', {"text": STREAM_INTERRUPTED_NOTICE})
+            timings.record("llm", time.perf_counter() - llm_start)
 
-            return jsonify({
-                "question": question,
-                "answer": answer,
-                "sources_count": 0,
-                "mode": "juridique",
-                "status": "no_results",
-                "conversation_id": conversation_id
-            })
+            yield _sse('references', {"text": "\n\n" + format_sources_footer(references)})
+
+            text = clean_juridique_answer(''.join(parts))
+            if prepared.get("interrupted"):
+                text += STREAM_INTERRUPTED_NOTICE
+            answer = format_ai_response_with_sources(text, references)
+            if prepared.get("interrupted"):
+                _interrupted_answer(prepared, answer)
+            else:
+                _complete_answer(question, prepared, answer, used_llm=True)
+            _save_message(conversation_id, 'bot', answer)
+            yield _sse('done', _stream_done(timings, prepared))
+
+        except Exception as e:
+            logger.exception("Erreur serveur (streaming) : %s", e)
+            timings.finish("error")
+            yield _sse('error', {"error": f"Erreur serveur : {str(e)}"})
 
-        else:
-            # Articles trouvés → Génération de la réponse juridique
-            print("⚖️ Mode juridique activé → Génération de la réponse avec LLM")
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-            # Construire le contexte
-            context = ""
-            for i, doc in enumerate(relevant_docs):
-                meta = relevant_metas[i]
-                doc_name = str(meta.get('doc', meta.get('source', 'Document inconnu'))).strip()
-                article = str(meta.get('article', 'Article sans titre')).strip()
-                doc_text = str(doc).strip()
 
-                context += f"{doc_name} - {article}\n{doc_text}\n\n"
+# ================================
+# 📦 Endpoint en lot : /ask/batch (NDJSON)
+# ================================
+@chat_bp.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """
+    Plusieurs questions en un appel :
+      {"questions": ["...", {"question": "...", "corpus": "cgi"}],
+       "corpus": "...", "persist": false, "conversation_id": "..."}
+    Un seul batch d'embedding et une requête ChromaDB par corpus, puis au
+    plus ASK_BATCH_CONCURRENCY générations en parallèle. La réponse est en
+    NDJSON : une ligne par question dès qu'elle est prête ("index" = rang
+    dans le lot, mêmes champs que /ask), puis une ligne {"done": true, ...}.
+    Avec "persist", chaque échange est enregistré (dans `conversation_id`
+    s'il est donné, sinon une conversation par question).
+    """
+    data = request.json or {}
+    items, error = _batch_items(data)
+    if error:
+        return jsonify({"error": f"❌ {error}"}), 400
+    persist = bool(data.get('persist'))
+    conversation_id = data.get('conversation_id')
 
-            print(f"📝 Contexte construit : {len(context)} caractères")
+    timings = RequestTimings('/ask/batch')
+    groups = _batch_groups(items)
+    unique = [items[indices[0]] for indices in groups]
 
-            # Générer la réponse avec LLM + références
-            answer = ask_juridique(question, context)
+    def generate():
+        try:
+            prepared_list = _prepare_batch(unique, timings)
 
-            print(f"✅ Réponse générée avec succès ({len(answer)} caractères)")
+            # Réponses déjà prêtes (accès direct, cache, aucun résultat) d'abord
+            to_generate = []
+            for indices, (question, _), prepared in zip(groups, unique, prepared_list):
+                if prepared["status"] == "generate":
+                    to_generate.append((indices, question, prepared))
+                else:
+                    yield from _batch_lines(items, indices, prepared, persist, conversation_id)
 
-            # Enregistrer la réponse
+            pool = ThreadPoolExecutor(max_workers=ASK_BATCH_CONCURRENCY, thread_name_prefix="ask-batch")
             try:
-                add_message(conversation_id, 'bot', answer, datetime.utcnow().isoformat())
-            except Exception as e:
-                print(f"⚠️ Erreur enregistre réponse bot : {e}")
+                futures = {
+                    pool.submit(_generate_timed, question, prepared["context"], prepared["references"]):
+                        (indices, question, prepared)
+                    for indices, question, prepared in to_generate
+                }
+                for future in as_completed(futures):
+                    indices, question, prepared = futures[future]
+                    answer, used_llm, seconds = future.result()
+                    timings.record("llm", seconds)
+                    _complete_answer(question, prepared, answer, used_llm)
+                    yield from _batch_lines(items, indices, prepared, persist, conversation_id)
+            finally:
+                # Client déconnecté : les générations pas encore commencées sont abandonnées
+                pool.shutdown(wait=False, cancel_futures=True)
 
-            return jsonify({
-                "question": question,
-                "answer": answer,
-                "sources_count": nb_results,
-                "mode": "juridique",
-                "status": "success",
-                "conversation_id": conversation_id
-            })
+            yield _batch_done(timings, items, prepared_list)
 
-    except Exception as e:
-        print(f"❌ Erreur serveur : {e}")
-        import traceback
-        traceback.print_exc()
+        except Exception as e:
+            logger.exception("Erreur serveur (lot) : %s", e)
+            timings.finish("error")
+            yield _ndjson({"error": f"Erreur serveur : {str(e)}"})
 
-        return jsonify({
-            "error": f"Erreur serveur : {str(e)}",
-            "question": question if 'question' in locals() else ""
-        }), 500
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
 
 
 # ================================
@@ -199,7 +1026,19 @@ def create_conv():
 
 @chat_bp.route('/conversations', methods=['GET'])
 def list_conv():
-    convs = list_conversations()
+    """
+    Historique paginé : ?limit=50&before=<created_at>&before_id=<id>
+    (curseur = created_at et id de la dernière conversation reçue).
+    """
+    limit, error = _page_limit(request.args.get('limit', CONVERSATIONS_PAGE_SIZE))
+    if error:
+        return jsonify({"error": error}), 400
+
+    convs = list_conversations(
+        limit=limit,
+        before=request.args.get('before'),
+        before_id=request.args.get('before_id')
+    )
     return jsonify(convs)
 
 
@@ -227,7 +1066,7 @@ def post_message(conv_id):
 
 
 # ================================
-# 🩺 Endpoint de santé
+# 🩺 Endpoints de santé et de métriques
 # ================================
 @chat_bp.route('/health', methods=['GET'])
 def health():
@@ -235,14 +1074,30 @@ def health():
     Vérifie que l'assistant et la base juridique sont opérationnels.
     """
     try:
-        return jsonify({
-            "status": "✅ OK",
-            "collection": collection.name,
-            "documents_count": collection.count(),
-            "mode": "juridique_uniquement"
-        })
+        return jsonify(_health_payload(llm_client.get_stats(), ask_flights.get_stats()))
     except Exception as e:
         return jsonify({
             "status": "❌ Erreur",
             "error": str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@chat_bp.route('/ready', methods=['GET'])
+def ready():
+    """
+    Disponibilité (readiness) : 200 quand ChromaDB, les index, le modèle
+    d'embedding et SQLite sont chargés, 503 sinon. Le détail donne le temps
+    de chargement de chaque ressource (démarrage à froid).
+    """
+    payload, status_code = _ready_payload()
+    return jsonify(payload), status_code
+
+
+@chat_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Compteurs et histogrammes au format texte Prometheus :
+    requêtes par statut, durée de chaque étape, latence du LLM et délai
+    avant le premier token, fallbacks, cache de réponses, écritures SQLite.
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,26 @@
+"""
+Point d'entrée de production : sert asgi_app.py avec uvicorn.
+Hôte, port, nombre de processus et boucle d'événements viennent de
+config.py (SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_LOOP).
+
+Usage (depuis backend/) :
+    python serve.py
+"""
+
+import uvicorn
+
+from config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_LOOP, LOG_LEVEL
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "asgi_app:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=SERVER_WORKERS,
+        loop=SERVER_LOOP,
+        log_level=LOG_LEVEL.lower(),
+        # La journalisation de l'application est configurée par asgi_app (setup_logging)
+        log_config=None,
+        proxy_headers=True,
+        timeout_keep_alive=30,
+    )
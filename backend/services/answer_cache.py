@@ -0,0 +1,408 @@
+import atexit
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL,
+    ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_PERSIST, ANSWER_CACHE_SYNC_S, CHROMA_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_FILENAME = os.path.join(CHROMA_DIR, "answer_cache.sqlite3")
+
+
+def normalize_question(question: str) -> str:
+    """Minuscules, ponctuation retirée, espaces compactés."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"[^\w]+", " ", text)
+    return " ".join(text.split())
+
+
+def _unit(embedding) -> np.ndarray:
+    """Embedding en float32 de norme 1 : la similarité cosinus devient un produit scalaire."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _AnswerStore:
+    """
+    Persistance du cache de réponses (SQLite, partagé par les workers et
+    l'ingestion) : une ligne par réponse, numérotée dans l'ordre d'écriture
+    (seq), et un journal des invalidations. Chaque processus relit ce qui
+    est plus récent que le dernier seq vu, jamais toute la base.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT UNIQUE,
+                    chunks TEXT,
+                    answer TEXT,
+                    embedding BLOB,
+                    created_at REAL
+                )
+                """
+            )
+            # chunk_ids séparés par des virgules ; "*" = cache vidé
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations (seq INTEGER PRIMARY KEY AUTOINCREMENT, chunk_ids TEXT)"
+            )
+
+    def last_seqs(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM answers").fetchone()[0]
+            invalidations = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+        return entries, invalidations
+
+    def changes(self, after_entry: int, after_invalidation: int):
+        """Invalidations puis réponses écrites depuis les seq donnés (une seule lecture cohérente)."""
+        with self._lock, self._conn:
+            invalidations = self._conn.execute(
+                "SELECT seq, chunk_ids FROM invalidations WHERE seq > ? ORDER BY seq", (after_invalidation,)
+            ).fetchall()
+            rows = self._conn.execute(
+                "SELECT seq, key, chunks, answer, embedding, created_at FROM answers WHERE seq > ? ORDER BY seq",
+                (after_entry,)
+            ).fetchall()
+        entries = [
+            (seq, {
+                "key": key,
+                "chunks": chunks,
+                "answer": answer,
+                "embedding": np.frombuffer(embedding, dtype=np.float32) if embedding is not None else None,
+                "created_at": created_at,
+            })
+            for seq, key, chunks, answer, embedding, created_at in rows
+        ]
+        return invalidations, entries
+
+    def write(self, entries: List[Dict], max_size: int):
+        """Ajoute ou remplace des réponses ; seules les `max_size` plus récentes sont gardées."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO answers (key, chunks, answer, embedding, created_at) VALUES (?,?,?,?,?)",
+                [
+                    (e["key"], e["chunks"], e["answer"],
+                     e["embedding"].tobytes() if e["embedding"] is not None else None,
+                     e["created_at"])
+                    for e in entries
+                ]
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE seq <= (SELECT seq FROM answers ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                (max_size,)
+            )
+
+    def invalidate(self, chunk_ids: Optional[Iterable[str]]) -> int:
+        """Supprime les réponses reposant sur ces chunks (toutes si None) et journalise l'invalidation."""
+        with self._lock, self._conn:
+            if chunk_ids is None:
+                self._conn.execute("DELETE FROM answers")
+                self._conn.execute("INSERT INTO invalidations (chunk_ids) VALUES ('*')")
+                return 0
+            targets = set(chunk_ids)
+            stale = [
+                (seq,) for seq, chunks in self._conn.execute("SELECT seq, chunks FROM answers")
+                if targets.intersection(chunks.split(","))
+            ]
+            self._conn.executemany("DELETE FROM answers WHERE seq = ?", stale)
+            self._conn.execute("INSERT INTO invalidations (chunk_ids) VALUES (?)", (",".join(sorted(targets)),))
+            return len(stale)
+
+
+_FLUSH = object()
+
+
+class AnswerCache:
+    """
+    Cache des réponses générées par le LLM.
+
+    Clé : question normalisée + IDs triés des chunks retrouvés par ChromaDB.
+    Une question proche (similarité des embeddings >= seuil) ayant retrouvé
+    exactement les mêmes chunks est aussi un hit : les entrées sont aussi
+    indexées par chunks, et seules celles des mêmes chunks sont comparées
+    (produit matriciel numpy, hors du verrou). Éviction LRU + TTL.
+
+    Persistance optionnelle (SQLite à côté de CHROMA_DIR) : get() ne lit
+    que la mémoire ; put() est écrit par un thread de fond (write-behind),
+    qui récupère aussi toutes les `sync_interval` s les réponses et
+    invalidations écrites par les autres processus (workers, ingestion).
+    """
+
+    def __init__(self, max_size: int, ttl: float, similarity_threshold: float, path: Optional[str] = None,
+                 sync_interval: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.path = path
+        self.sync_interval = sync_interval
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._by_chunks: Dict[str, Dict[str, Dict]] = {}  # chunks → {clé: entrée}
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._store = None
+        self._writes = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._seen_entry = 0
+        self._seen_invalidation = 0
+        if self.path:
+            self._load()
+
+    # -----------------------
+    # Clés
+    # -----------------------
+    @staticmethod
+    def _chunks_key(chunk_ids: Iterable[str]) -> str:
+        return ",".join(sorted(str(c) for c in chunk_ids))
+
+    def _key(self, question: str, chunk_ids: Iterable[str]) -> str:
+        return normalize_question(question) + "|" + self._chunks_key(chunk_ids)
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl > 0 and now - entry["created_at"] > self.ttl
+
+    # -----------------------
+    # API
+    # -----------------------
+    def get(self, question: str, chunk_ids: List[str], embedding: Optional[List[float]] = None) -> Optional[str]:
+        """Retourne la réponse en cache ou None."""
+        now = time.time()
+        key = self._key(question, chunk_ids)
+        self._ensure_started()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._discard(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["answer"]
+            candidates = self._candidates(self._chunks_key(chunk_ids), now) if embedding is not None else []
+
+        # Similarité calculée hors du verrou : get/put concurrents ne l'attendent pas
+        entry = self._most_similar(candidates, embedding) if candidates else None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["key"] in self._entries:
+                self._entries.move_to_end(entry["key"])
+            self.semantic_hits += 1
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, question: str, chunk_ids: List[str], answer: str, embedding: Optional[List[float]] = None):
+        """Enregistre une réponse (et l'embedding de la question si fourni)."""
+        key = self._key(question, chunk_ids)
+        entry = {
+            "key": key,
+            "chunks": self._chunks_key(chunk_ids),
+            "answer": answer,
+            "embedding": _unit(embedding) if embedding is not None else None,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            self._add(entry)
+            self._evict()
+        if self._store is not None:
+            self._ensure_started()
+            self._writes.put(entry)
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Supprime les entrées qui reposent sur l'un des chunks donnés (ré-ingestion)."""
+        targets = {str(c) for c in chunk_ids}
+        if not targets:
+            return 0
+        with self._lock:
+            removed = self._drop_chunks(targets)
+        if self._store is not None:
+            # Écrit tout de suite : l'ingestion se termine juste après
+            self.flush()
+            removed = max(removed, self._store.invalidate(targets))
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+        if self._store is not None:
+            self.flush()
+            self._store.invalidate(None)
+
+    def flush(self, timeout: float = None) -> bool:
+        """Attend que les réponses en file soient écrites ; False si timeout."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._writes.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+    # -----------------------
+    # Interne
+    # -----------------------
+    def _add(self, entry: Dict):
+        """Ajoute ou remplace une entrée (la plus récente) ; sous self._lock."""
+        self._entries[entry["key"]] = entry
+        self._entries.move_to_end(entry["key"])
+        self._by_chunks.setdefault(entry["chunks"], {})[entry["key"]] = entry
+
+    def _discard(self, key: str):
+        """Retire une entrée des deux index ; sous self._lock."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        same_chunks = self._by_chunks.get(entry["chunks"])
+        if same_chunks is not None:
+            same_chunks.pop(key, None)
+            if not same_chunks:
+                del self._by_chunks[entry["chunks"]]
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._discard(next(iter(self._entries)))
+
+    def _candidates(self, chunks_key: str, now: float) -> List[Dict]:
+        """Entrées valides avec embedding reposant sur les mêmes chunks (copie, sous self._lock)."""
+        return [
+            entry for entry in self._by_chunks.get(chunks_key, {}).values()
+            if entry["embedding"] is not None and not self._expired(entry, now)
+        ]
+
+    def _most_similar(self, candidates: List[Dict], embedding) -> Optional[Dict]:
+        scores = np.stack([entry["embedding"] for entry in candidates]) @ _unit(embedding)
+        best = int(np.argmax(scores))
+        return candidates[best] if scores[best] >= self.similarity_threshold else None
+
+    def _drop_chunks(self, targets: set) -> int:
+        stale = [
+            key for chunks_key, same_chunks in self._by_chunks.items()
+            if targets.intersection(chunks_key.split(","))
+            for key in same_chunks
+        ]
+        for key in stale:
+            self._discard(key)
+        return len(stale)
+
+    def _load(self):
+        try:
+            self._store = _AnswerStore(self.path)
+            self._seen_entry, self._seen_invalidation = self._store.last_seqs()
+            _, entries = self._store.changes(0, self._seen_invalidation)
+        except Exception as e:
+            logger.warning("Cache de réponses persistant indisponible, cache en mémoire seulement : %s", e)
+            self._store = None
+            return
+        now = time.time()
+        for _, entry in entries[-self.max_size:]:
+            if not self._expired(entry, now):
+                self._add(entry)
+
+    def _sync(self):
+        """Applique les invalidations et réponses écrites par les autres processus."""
+        invalidations, entries = self._store.changes(self._seen_entry, self._seen_invalidation)
+        if not invalidations and not entries:
+            return
+        with self._lock:
+            for seq, chunk_ids in invalidations:
+                if chunk_ids == "*":
+                    self._entries.clear()
+                    self._by_chunks.clear()
+                else:
+                    self._drop_chunks(set(chunk_ids.split(",")))
+                self._seen_invalidation = seq
+            for seq, entry in entries:
+                if entry["key"] not in self._entries:
+                    self._add(entry)
+                self._seen_entry = seq
+            self._evict()
+
+    def _ensure_started(self):
+        if self._thread is None and self._store is not None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="answer-cache-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        next_sync = time.monotonic() + self.sync_interval
+        while True:
+            try:
+                item = self._writes.get(timeout=max(0.0, next_sync - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            # Regroupe tout ce qui est en file dans une seule transaction
+            batch, flushes = [], []
+            while item is not None:
+                if isinstance(item, tuple) and item[0] is _FLUSH:
+                    flushes.append(item[1])
+                else:
+                    batch.append(item)
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            try:
+                if batch:
+                    self._store.write(batch, self.max_size)
+                if time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.sync_interval
+            except Exception as e:
+                logger.warning("Écriture du cache de réponses échouée : %s", e)
+            for done in flushes:
+                done.set()
+
+
+answer_cache = AnswerCache(
+    max_size=ANSWER_CACHE_SIZE,
+    ttl=ANSWER_CACHE_TTL,
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    path=CACHE_FILENAME if ANSWER_CACHE_PERSIST else None,
+    sync_interval=ANSWER_CACHE_SYNC_S
+) if ANSWER_CACHE_ENABLED else None
+
+if answer_cache is not None:
+    atexit.register(answer_cache.flush, 5.0)
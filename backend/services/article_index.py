@@ -0,0 +1,111 @@
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from config import ARTICLE_INDEX_FILE
+
+
+ARTICLE_SUFFIXES = "bis|ter|quater|quinquies|sexies|septies|octies|nonies|decies"
+ARTICLE_NUMBER_RE = re.compile(
+    rf"\barticle\s+(premier|1er|\d+)\s*({ARTICLE_SUFFIXES})?",
+    re.IGNORECASE
+)
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def normalize_article_number(label: str) -> Optional[str]:
+    """
+    "Article 2.- Personnes imposables" → "2", "Article Premier:" → "1",
+    "Article 82 quater427- ..." → "82 quater". None si aucun numéro.
+    """
+    match = ARTICLE_NUMBER_RE.search(str(label))
+    if not match:
+        return None
+    number = match.group(1).lower()
+    if number in ("premier", "1er"):
+        number = "1"
+    number = str(int(number))
+    if match.group(2):
+        number += " " + match.group(2).lower()
+    return number
+
+
+def normalize_doc(doc: str) -> str:
+    """Clé courte du corpus : "cgi", "igoc", "loi_17_95" ou le nom simplifié."""
+    text = _strip_accents(str(doc)).lower()
+    if "impot" in text or "cgi" in text:
+        return "cgi"
+    if "igoc" in text or "change" in text:
+        return "igoc"
+    if "17-95" in text or "17_95" in text:
+        return "loi_17_95"
+    return re.sub(r"[^a-z0-9]+", "_", text).strip("_")
+
+
+def _meta_value(meta: Dict, key: str) -> str:
+    # ingest_simple écrit "doc"/"article", init_index écrit "DOC"/"Article"
+    return str(meta.get(key, meta.get(key.upper(), meta.get(key.capitalize(), ""))))
+
+
+class ArticleIndex:
+    """Index exact (corpus, numéro d'article) → IDs des chunks, dans l'ordre."""
+
+    def __init__(self, entries: Dict[str, List[str]]):
+        self.entries = entries
+
+    @staticmethod
+    def key(doc_key: str, number: str) -> str:
+        return f"{doc_key}|{number}"
+
+    def lookup(self, number: str, doc_key: Optional[str] = None) -> Dict[str, List[str]]:
+        """Chunks de l'article `number`, par corpus (tous les corpus si doc_key est None)."""
+        if doc_key is not None:
+            ids = self.entries.get(self.key(doc_key, number))
+            return {doc_key: ids} if ids else {}
+        suffix = "|" + number
+        return {
+            key.split("|", 1)[0]: ids
+            for key, ids in self.entries.items()
+            if key.endswith(suffix)
+        }
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def rebuild_article_index(collection, path: str = ARTICLE_INDEX_FILE, page_size: int = 5000):
+    """Construit l'index des articles à partir des métadonnées de la collection."""
+    chunks: Dict[str, List] = {}
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+            number = normalize_article_number(_meta_value(meta, "article"))
+            if number is None:
+                continue
+            key = ArticleIndex.key(normalize_doc(_meta_value(meta, "doc")), number)
+            chunks.setdefault(key, []).append((int(meta.get("chunk_id", 0) or 0), chunk_id))
+        offset += len(page["ids"])
+
+    entries = {key: [chunk_id for _, chunk_id in sorted(items)] for key, items in chunks.items()}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+    print(f"✅ Index des articles : {len(entries)} articles → {path}")
+
+
+def load_article_index(path: str = ARTICLE_INDEX_FILE) -> Optional[ArticleIndex]:
+    """Charge l'index des articles ; None s'il n'a pas encore été construit."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return ArticleIndex(json.load(f))
@@ -0,0 +1,165 @@
+import re
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+from config import CONTEXT_TOKENIZER, CONTEXT_MAX_TOKENS, CONTEXT_DEDUP_THRESHOLD, CONTEXT_MIN_PART_TOKENS
+from services.metrics import CONTEXT_TOKENS, CONTEXT_ARTICLES_DROPPED
+from services.retrieved_chunk import CONTINUATION_MARK, RetrievedChunk, strip_continuation
+from services.tokenizer import get_tokenizer
+
+# Recouvrement maximal (en mots) cherché entre deux chunks consécutifs d'un article
+MAX_OVERLAP_WORDS = 120
+SENTENCE_END_RE = re.compile(r"[.;:!?](?=\s)")
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _join_siblings(previous: str, following: str) -> str:
+    """Accole deux chunks consécutifs sans répéter leur recouvrement (fin de l'un = début de l'autre)."""
+    left, right = previous.split(), following.split()
+    for size in range(min(len(left), len(right), MAX_OVERLAP_WORDS), 0, -1):
+        if left[-size:] == right[:size]:
+            return " ".join(left + right[size:])
+    return " ".join(left + right)
+
+
+class ContextBuilder:
+    """
+    Assemblage du contexte envoyé au LLM à partir des chunks retenus :
+    - les chunks d'un même article (parent_id) sont réunis dans l'ordre de
+      chunk_id, sans l'intitulé répété ni le recouvrement entre chunks ;
+      un chunk manquant entre deux autres est signalé par […]
+    - un article quasi identique à un article déjà retenu (3-grammes de
+      mots en commun) est écarté
+    - les articles sont ajoutés par ordre de pertinence tant qu'ils tiennent
+      dans le budget de tokens (tokenizer du modèle) ; le dernier peut être
+      tronqué en fin de phrase
+    Les références légales (premier chunk de chaque article retenu) sont
+    retournées avec le contexte : rien n'est relu dans le texte assemblé.
+    """
+
+    def __init__(self, tokenizer_name: str, max_tokens: int, dedup_threshold: float, min_part_tokens: int):
+        self.tokenizer_name = tokenizer_name
+        self.max_tokens = max_tokens
+        self.dedup_threshold = dedup_threshold
+        self.min_part_tokens = min_part_tokens
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    self._tokenizer = get_tokenizer(self.tokenizer_name)
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    def build(self, chunks: Sequence[RetrievedChunk]) -> Tuple[str, List[RetrievedChunk], Dict]:
+        """
+        Retourne (contexte, références des articles retenus dans l'ordre du
+        contexte, statistiques : tokens, articles, chunks fusionnés ou écartés...).
+        """
+        articles = self._group(chunks)
+        stats = {"chunks": len(chunks), "articles": 0, "merged": len(chunks) - len(articles),
+                 "duplicates": 0, "over_budget": 0, "truncated": False, "tokens": 0}
+
+        kept_shingles: List[set] = []
+        blocks, references = [], []
+        for position, (first, text) in enumerate(articles):
+            header = first.reference
+            shingles = _shingles(text)
+            if any(self._is_duplicate(shingles, other) for other in kept_shingles):
+                stats["duplicates"] += 1
+                continue
+
+            block = f"{header}\n{text}\n\n"
+            n = self.count(block)
+            room = self.max_tokens - stats["tokens"]
+            if n > room:
+                # Le premier article est toujours gardé, tronqué au besoin
+                truncate = room >= self.min_part_tokens or not blocks
+                if truncate:
+                    block, n = self._truncate(header, text, room)
+                    stats["truncated"] = True
+                    blocks.append(block)
+                    references.append(first)
+                    stats["tokens"] += n
+                stats["over_budget"] = len(articles) - position - (1 if truncate else 0)
+                break
+
+            blocks.append(block)
+            references.append(first)
+            stats["tokens"] += n
+            kept_shingles.append(shingles)
+
+        stats["articles"] = len(blocks)
+        CONTEXT_TOKENS.observe(stats["tokens"])
+        for reason in ("duplicates", "over_budget"):
+            if stats[reason]:
+                CONTEXT_ARTICLES_DROPPED.inc(stats[reason], reason=reason)
+        return "".join(blocks), references, stats
+
+    def _group(self, chunks) -> List[Tuple[RetrievedChunk, str]]:
+        """
+        (premier chunk, texte) de chaque article, dans l'ordre de pertinence
+        de son chunk le mieux classé.
+        """
+        groups: Dict[str, Dict[int, RetrievedChunk]] = {}
+        for chunk in chunks:
+            key = chunk.parent_id or f"{chunk.doc}|{chunk.article}"
+            groups.setdefault(key, {}).setdefault(chunk.chunk_index, chunk)
+
+        articles = []
+        for parts in groups.values():
+            text, last = "", None
+            for index, chunk in sorted(parts.items()):
+                part = strip_continuation(chunk.text, chunk.article) if index > 0 else chunk.text
+                if last is None:
+                    text = part
+                elif index == last + 1:
+                    text = _join_siblings(text, part)
+                else:
+                    text = f"{text}{CONTINUATION_MARK}{part}"
+                last = index
+            articles.append((parts[min(parts)], text))
+        return articles
+
+    def _is_duplicate(self, shingles: set, other: set) -> bool:
+        """Quasi-doublon : la plus grande part des 3-grammes du plus court est dans l'autre."""
+        if not shingles or not other:
+            return False
+        return len(shingles & other) / min(len(shingles), len(other)) >= self.dedup_threshold
+
+    def _truncate(self, header: str, text: str, room: int) -> Tuple[str, int]:
+        """Bloc tronqué au plus de mots tenant dans `room` tokens, coupé en fin de phrase si possible."""
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(f"{header}\n{' '.join(words[:middle])} …\n\n") <= room:
+                low = middle
+            else:
+                high = middle - 1
+
+        kept = " ".join(words[:low])
+        ends = [m.end() for m in SENTENCE_END_RE.finditer(kept + " ")]
+        if ends and ends[-1] >= len(kept) // 2:
+            kept = kept[:ends[-1]]
+        block = f"{header}\n{kept} …\n\n"
+        return block, self.count(block)
+
+
+context_builder = ContextBuilder(
+    CONTEXT_TOKENIZER,
+    max_tokens=CONTEXT_MAX_TOKENS,
+    dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+    min_part_tokens=CONTEXT_MIN_PART_TOKENS
+)
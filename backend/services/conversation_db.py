@@ -1,92 +1,311 @@
+import atexit
+import logging
 import sqlite3
 import os
+import queue
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Any
 
-from config import CHROMA_DIR
+from config import (
+    CHROMA_DIR, SQLITE_POOL_SIZE,
+    CONVERSATION_WRITE_BEHIND, CONVERSATION_FLUSH_MS, CONVERSATION_FLUSH_MAX_BATCH, CONVERSATION_FLUSH_TIMEOUT_S
+)
+from services.metrics import STAGE_SECONDS, SQLITE_ROWS
+
+logger = logging.getLogger(__name__)
 
 
 DB_FILENAME = os.path.join(CHROMA_DIR, "conversations.sqlite3")
 
 
-def _get_conn():
-    os.makedirs(CHROMA_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_FILENAME, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+class _ConnectionPool:
+    """
+    Pool de connexions SQLite persistantes, partagé entre les threads Flask.
+    Chaque connexion est configurée une seule fois (WAL, synchronous=NORMAL)
+    et garde son cache de requêtes préparées d'un appel à l'autre.
+    Rien n'est ouvert avant la première connexion : `setup` (création du
+    schéma) s'exécute alors une fois, avant toute requête.
+    """
 
+    def __init__(self, path: str, size: int, setup=None):
+        self.path = path
+        self.size = size
+        self.setup = setup
+        self._idle = queue.LifoQueue()
+        self._ready = False
+        self._lock = threading.Lock()
 
-def init_db():
-    """Crée les tables si elles n'existent pas."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS conversations (
-            id TEXT PRIMARY KEY,
-            title TEXT,
-            created_at TEXT
+    def _connect(self):
+        conn = None
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    conn = self._open()
+                    if self.setup is not None:
+                        self.setup(conn)
+                    self._ready = True
+        return conn or self._open()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put(conn)
+            else:
+                conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _create_schema(conn):
+    """Crée les tables si elles n'existent pas (à la première connexion du pool)."""
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                created_at TEXT
+            )
+            """
         )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            conversation_id TEXT,
-            role TEXT,
-            text TEXT,
-            timestamp TEXT,
-            FOREIGN KEY(conversation_id) REFERENCES conversations(id)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT,
+                role TEXT,
+                text TEXT,
+                timestamp TEXT,
+                FOREIGN KEY(conversation_id) REFERENCES conversations(id)
+            )
+            """
         )
+        # Dernier message d'une conversation et pagination de l'historique
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_created ON conversations(created_at, id)")
+
+
+_pool = _ConnectionPool(DB_FILENAME, SQLITE_POOL_SIZE, setup=_create_schema)
+
+
+def _get_conn():
+    """Connexion du pool, à utiliser avec `with _get_conn() as conn:`."""
+    return _pool.connection()
+
+
+_INSERT_CONVERSATION = "INSERT INTO conversations (id, title, created_at) VALUES (?,?,?)"
+_INSERT_MESSAGE = "INSERT INTO messages (conversation_id, role, text, timestamp) VALUES (?,?,?,?)"
+
+_FLUSH = object()
+_STOP = object()
+
+
+class _WriteBehind:
+    """
+    Écriture différée de l'historique : les INSERT sont mis en file et un
+    thread de fond les regroupe dans une seule transaction toutes les
+    `interval_ms` ms. L'ordre d'arrivée est conservé (conversation avant
+    ses messages). Chaque soumission reçoit un numéro d'ordre : flush()
+    attend seulement que ce qui a été soumis avant son appel soit écrit,
+    pas que la file se vide (elle ne se vide jamais sous charge soutenue).
+    """
+
+    def __init__(self, interval_ms: float, max_batch: int):
+        self.interval = interval_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._submitted = 0   # numéro de la dernière soumission
+        self._committed = 0   # soumissions écrites (la file est traitée dans l'ordre)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, sql: str, params: tuple):
+        self._ensure_started()
+        # Numéro et mise en file sous le même verrou : l'ordre de la file est celui des numéros
+        with self._cond:
+            self._submitted += 1
+            self._queue.put((sql, params))
+
+    def flush(self, timeout: float = CONVERSATION_FLUSH_TIMEOUT_S) -> bool:
         """
-    )
-    conn.commit()
-    conn.close()
+        Écrit immédiatement la file et attend que les soumissions antérieures
+        à l'appel soient en base ; False si timeout.
+        """
+        with self._cond:
+            ticket = self._submitted
+            if self._committed >= ticket:
+                return True
+        self._queue.put(_FLUSH)
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._committed >= ticket, timeout)
+        if not done:
+            logger.warning("Écritures différées de l'historique non terminées après %.1f s", timeout)
+        return done
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.flush()
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [] if item is _FLUSH else [item]
+
+            # Regroupe ce qui arrive pendant la fenêtre (sauf flush demandé)
+            deadline = time.monotonic() + self.interval
+            while item is not _FLUSH and len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.put(_STOP)
+                    break
+                if item is not _FLUSH:
+                    batch.append(item)
+
+            if batch:
+                self._write(batch)
+                with self._cond:
+                    self._committed += len(batch)
+                    self._cond.notify_all()
+            elif item is _FLUSH:
+                with self._cond:
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        try:
+            with STAGE_SECONDS.time(stage="sqlite_write"), _get_conn() as conn, conn:
+                for sql, params in batch:
+                    conn.execute(sql, params)
+            SQLITE_ROWS.inc(len(batch))
+        except Exception as e:
+            # Transaction annulée : on réessaie ligne par ligne pour ne perdre que la fautive
+            logger.warning("Écriture groupée de l'historique échouée (%s), reprise ligne par ligne", e)
+            for sql, params in batch:
+                try:
+                    with _get_conn() as conn, conn:
+                        conn.execute(sql, params)
+                    SQLITE_ROWS.inc()
+                except Exception as row_error:
+                    logger.error("Écriture historique perdue : %s", row_error)
+
+
+_writer = _WriteBehind(CONVERSATION_FLUSH_MS, CONVERSATION_FLUSH_MAX_BATCH)
+
+
+def flush_writes(timeout: float = CONVERSATION_FLUSH_TIMEOUT_S) -> bool:
+    """Attend que les écritures différées soumises jusqu'ici soient en base."""
+    return _writer.flush(timeout)
+
+
+def close_db():
+    """Vide la file d'écriture puis ferme les connexions du pool (arrêt)."""
+    _writer.stop()
+    _pool.close_all()
+
+
+atexit.register(close_db)
+
+
+def init_db():
+    """Ouvre une première connexion : crée le fichier et les tables si besoin."""
+    with _get_conn():
+        pass
 
 
 def create_conversation(title: str = None) -> str:
     conv_id = str(uuid.uuid4())
     created_at = datetime.utcnow().isoformat()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO conversations (id, title, created_at) VALUES (?,?,?)", (conv_id, title, created_at))
-    conn.commit()
-    conn.close()
+    with STAGE_SECONDS.time(stage="sqlite_write"), _get_conn() as conn, conn:
+        conn.execute(_INSERT_CONVERSATION, (conv_id, title, created_at))
+    SQLITE_ROWS.inc()
     return conv_id
 
 
 def add_message(conversation_id: str, role: str, text: str, timestamp: str = None) -> int:
     if timestamp is None:
         timestamp = datetime.utcnow().isoformat()
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO messages (conversation_id, role, text, timestamp) VALUES (?,?,?,?)",
-        (conversation_id, role, text, timestamp)
-    )
-    msg_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return msg_id
+    # Les messages en file passent d'abord, pour garder l'ordre des ids
+    _writer.flush()
+    with STAGE_SECONDS.time(stage="sqlite_write"), _get_conn() as conn, conn:
+        cur = conn.execute(_INSERT_MESSAGE, (conversation_id, role, text, timestamp))
+    SQLITE_ROWS.inc()
+    return cur.lastrowid
+
+
+def queue_conversation(title: str = None) -> str:
+    """Comme create_conversation, mais l'INSERT est différé (write-behind)."""
+    if not CONVERSATION_WRITE_BEHIND:
+        return create_conversation(title)
+    conv_id = str(uuid.uuid4())
+    _writer.submit(_INSERT_CONVERSATION, (conv_id, title, datetime.utcnow().isoformat()))
+    return conv_id
+
+
+def queue_message(conversation_id: str, role: str, text: str, timestamp: str = None):
+    """Comme add_message, mais l'INSERT est différé (write-behind)."""
+    if timestamp is None:
+        timestamp = datetime.utcnow().isoformat()
+    if not CONVERSATION_WRITE_BEHIND:
+        add_message(conversation_id, role, text, timestamp)
+        return
+    _writer.submit(_INSERT_MESSAGE, (conversation_id, role, text, timestamp))
 
 
 def get_conversation(conversation_id: str) -> Dict[str, Any]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, title, created_at FROM conversations WHERE id = ?", (conversation_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return None
-
-    cur.execute(
-        "SELECT role, text, timestamp FROM messages WHERE conversation_id = ? ORDER BY id ASC",
-        (conversation_id,)
-    )
-    messages = [dict(m) for m in cur.fetchall()]
-    conn.close()
+    _writer.flush()  # lecture de ses propres écritures
+    with _get_conn() as conn:
+        row = conn.execute(
+            "SELECT id, title, created_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if not row:
+            return None
+
+        messages = [dict(m) for m in conn.execute(
+            "SELECT role, text, timestamp FROM messages WHERE conversation_id = ? ORDER BY id ASC",
+            (conversation_id,)
+        ).fetchall()]
 
     return {
         "id": row["id"],
@@ -96,21 +315,43 @@ def get_conversation(conversation_id: str) -> Dict[str, Any]:
     }
 
 
-def list_conversations() -> List[Dict[str, Any]]:
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, title, created_at FROM conversations ORDER BY created_at DESC")
-    rows = cur.fetchall()
-    results = []
-    for r in rows:
-        conv_id = r["id"]
-        cur.execute("SELECT role, text, timestamp FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT 1", (conv_id,))
-        last = cur.fetchone()
-        results.append({
-            "id": conv_id,
+def list_conversations(limit: int = 50, before: str = None, before_id: str = None) -> List[Dict[str, Any]]:
+    """
+    Conversations de la plus récente à la plus ancienne, avec leur dernier
+    message, en une seule requête. Pagination par curseur : passer
+    `before` (created_at) et `before_id` (id) du dernier élément reçu.
+    """
+    query = """
+        SELECT c.id, c.title, c.created_at, m.role, m.text, m.timestamp
+        FROM conversations c
+        LEFT JOIN messages m ON m.id = (
+            SELECT MAX(id) FROM messages WHERE conversation_id = c.id
+        )
+    """
+    params = []
+    if before is not None and before_id is not None:
+        query += " WHERE (c.created_at, c.id) < (?, ?)"
+        params += [before, before_id]
+    elif before is not None:
+        query += " WHERE c.created_at < ?"
+        params.append(before)
+    query += " ORDER BY c.created_at DESC, c.id DESC LIMIT ?"
+    params.append(limit)
+
+    _writer.flush()  # lecture de ses propres écritures
+    with _get_conn() as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    return [
+        {
+            "id": r["id"],
             "title": r["title"],
             "created_at": r["created_at"],
-            "last_message": dict(last) if last else None,
-        })
-    conn.close()
-    return results
+            "last_message": {
+                "role": r["role"],
+                "text": r["text"],
+                "timestamp": r["timestamp"],
+            } if r["role"] is not None else None,
+        }
+        for r in rows
+    ]
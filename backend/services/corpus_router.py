@@ -0,0 +1,93 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from config import CORPUS_ROUTER_MIN_SCORE
+
+
+# Corpus indexés : clé (métadonnée 'corpus', voir normalize_doc) → libellé
+CORPORA = {
+    "cgi": "Code Général des Impôts",
+    "igoc": "Instruction Générale des Opérations de Change",
+    "loi_17_95": "Loi n° 17-95 relative aux sociétés anonymes",
+}
+
+# Mention explicite d'un corpus (accès direct aux articles et routage)
+DOC_HINTS = [
+    ('cgi', re.compile(r"\bcgi\b|code g[ée]n[ée]ral des imp[ôo]ts|\bimp[ôo]ts?\b", re.IGNORECASE)),
+    ('igoc', re.compile(r"\bigoc\b|op[ée]rations? de change|office des changes", re.IGNORECASE)),
+    ('loi_17_95', re.compile(r"17\s*[-./]\s*95|soci[ée]t[ée]s? anonymes?", re.IGNORECASE)),
+]
+
+# Vocabulaire propre à chaque corpus (texte sans accents, en minuscules)
+CORPUS_KEYWORDS = {
+    "cgi": [
+        r"\bimpots?\b", r"\bfisca\w*", r"\btva\b", r"\bir\b", r"\bis\b", r"\btaxes?\b",
+        r"\bdeductib\w*", r"\bamortissements?\b", r"\bexonerations?\b", r"\bexonere\w*",
+        r"\bcontribuables?\b", r"\bimposab\w*", r"\bimposition\b", r"\bdroits? d.enregistrement\b",
+        r"\btimbre\b", r"\bvaleur ajoutee\b", r"\bcotisation minimale\b", r"\bplus.values?\b",
+        r"\bredevab\w*", r"\bretenue a la source\b", r"\bbenefices? imposab\w*",
+        r"\brevenus? (?:salariaux|fonciers|professionnels)\b",
+    ],
+    "igoc": [
+        r"\bchanges?\b", r"\bdevises?\b", r"\boffice des changes\b", r"\bnon.residents?\b",
+        r"\brapatriement\b", r"\btransferts?\b", r"\bdotations?\b", r"\bimportations?\b",
+        r"\bexportations?\b", r"\bdirhams? convertibles?\b", r"\bcomptes? en devises\b",
+        r"\bintermediaires? agrees?\b", r"\bcession de devises\b", r"\bmarocains? residant a l.etranger\b",
+    ],
+    "loi_17_95": [
+        r"\bsocietes? anonymes?\b", r"\bactionnaires?\b", r"\bconseil d.administration\b",
+        r"\bassemblees? generales?\b", r"\bcommissaires? aux comptes\b", r"\bcapital social\b",
+        r"\bdirectoire\b", r"\bconseil de surveillance\b", r"\badministrateurs?\b",
+        r"\bstatuts\b", r"\bactions? (?:de|en) (?:numeraire|apport|priorite)\b", r"\bfusions?\b",
+        r"\bliquidation\b", r"\bdissolution\b", r"\bpresident directeur general\b",
+    ],
+}
+
+# Une mention explicite pèse plus qu'un terme du vocabulaire
+HINT_WEIGHT = 3
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+class CorpusRouter:
+    """
+    Choix du corpus probable d'une question, avant la recherche vectorielle :
+    mentions explicites (DOC_HINTS) et vocabulaire propre à chaque corpus,
+    pondérés et comptés. Sans gagnant net, la recherche porte sur tous les
+    corpus : un mauvais routage coûte plus cher qu'une recherche globale.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], min_score: int):
+        self.patterns = {
+            corpus: [re.compile(pattern) for pattern in patterns]
+            for corpus, patterns in keywords.items()
+        }
+        self.min_score = min_score
+
+    def scores(self, question: str) -> Dict[str, int]:
+        folded = _fold(question)
+        scores = {corpus: 0 for corpus in self.patterns}
+        for corpus, pattern in DOC_HINTS:
+            if pattern.search(question):
+                scores[corpus] += HINT_WEIGHT
+        for corpus, patterns in self.patterns.items():
+            scores[corpus] += sum(1 for pattern in patterns if pattern.search(folded))
+        return scores
+
+    def route(self, question: str) -> Tuple[Optional[str], Dict[str, int]]:
+        """Retourne (corpus ou None, scores) ; None = recherche sur tous les corpus."""
+        scores = self.scores(question)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0
+        # Gagnant net : score minimal atteint et au moins le double du suivant
+        if best_score >= self.min_score and best_score >= 2 * runner_up:
+            return best, scores
+        return None, scores
+
+
+corpus_router = CorpusRouter(CORPUS_KEYWORDS, min_score=CORPUS_ROUTER_MIN_SCORE)
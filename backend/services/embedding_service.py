@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_CACHE_SIZE,
+    EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingService:
+    """
+    Service d'embedding partagé (sentence-transformers) :
+    - le modèle est chargé une seule fois par processus, au premier usage
+    - les questions arrivant en même temps sont encodées en un seul batch
+    - cache LRU question → vecteur pour les questions répétées
+    """
+
+    def __init__(self, model_name: str, device: str, cache_size: int, batch_window_ms: float, max_batch: int):
+        self.model_name = model_name
+        self.device = device
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+
+        self._pending: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # -----------------------
+    # Modèle
+    # -----------------------
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    logger.info("Chargement du modèle d'embedding : %s", self.model_name)
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def _encode(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+        vectors = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    # -----------------------
+    # API
+    # -----------------------
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding d'une question (cache LRU + batch avec les requêtes concurrentes)."""
+        key = text.strip()
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        self._ensure_worker()
+        future = Future()
+        self._pending.put((key, future))
+        return future.result()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeddings de plusieurs questions (/ask/batch) : cache LRU, puis un
+        seul batch pour les questions absentes du cache.
+        """
+        keys = [text.strip() for text in texts]
+        vectors = {}
+        with self._cache_lock:
+            for key in dict.fromkeys(keys):
+                vector = self._cache.get(key)
+                if vector is not None:
+                    self._cache.move_to_end(key)
+                    vectors[key] = vector
+            self.hits += len(vectors)
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            self.misses += len(missing)
+
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing)))
+            self._store(encoded)
+            vectors.update(encoded)
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        """Embeddings de documents (ingestion) : pas de cache."""
+        if not texts:
+            return []
+        return self._encode(list(texts), batch_size=batch_size)
+
+    def get_stats(self) -> dict:
+        with self._cache_lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "cache_size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "batches": self.batches,
+            }
+
+    # -----------------------
+    # Batch des questions concurrentes
+    # -----------------------
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            # Petite fenêtre pour regrouper les requêtes arrivées en même temps
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._pending.get(timeout=self.batch_window))
+            except queue.Empty:
+                pass
+
+            texts = list(dict.fromkeys(key for key, _ in batch))
+            try:
+                vectors = dict(zip(texts, self._encode(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self._store(vectors)
+            for key, future in batch:
+                future.set_result(vectors[key])
+
+    def _store(self, vectors: dict):
+        with self._cache_lock:
+            self.batches += 1
+            for key, vector in vectors.items():
+                self._cache[key] = vector
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+embedding_service = EmbeddingService(
+    EMBEDDING_MODEL,
+    device=EMBEDDING_DEVICE,
+    cache_size=EMBEDDING_CACHE_SIZE,
+    batch_window_ms=EMBEDDING_BATCH_WINDOW_MS,
+    max_batch=EMBEDDING_MAX_BATCH
+)
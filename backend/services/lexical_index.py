@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import LEXICAL_INDEX_DIR
+from services.article_index import normalize_doc
+
+
+# Mots vides français (les termes juridiques courts comme "is", "ir", "tva" sont conservés)
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "elle", "en", "et",
+    "il", "ils", "la", "le", "les", "leur", "leurs", "l", "d", "qu", "n", "s", "c", "j",
+    "m", "ne", "ni", "ou", "par", "pas", "pour", "que", "qui", "quoi", "sa", "se", "ses",
+    "son", "sont", "sur", "un", "une", "est", "y", "quel", "quelle", "quels", "quelles",
+}
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules, accents retirés, tokens alphanumériques hors mots vides."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in re.findall(r"[a-z0-9]+", text) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Index BM25 sur le texte des chunks.
+
+    Format sur disque (un dossier) :
+      meta.json, terms.json, ids.json  → vocabulaire trié et IDs des chunks
+      offsets.npy  (int64)  → postings du terme t = [offsets[t], offsets[t+1])
+      doc_idx.npy  (uint32) → indice du chunk pour chaque posting
+      tf.npy       (uint16) → fréquence du terme dans le chunk
+      doc_len.npy  (uint32) → longueur (en tokens) de chaque chunk
+      corpus.npy   (uint8)  → corpus de chaque chunk (indice dans meta.json["corpora"])
+    Les tableaux sont ouverts en mémoire mappée (np.load(mmap_mode='r')).
+    """
+
+    def __init__(self, ids, terms, offsets, doc_idx, tf, doc_len, avgdl, corpora=None, corpus_idx=None):
+        self.ids = ids
+        self.term_index = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_idx = doc_idx
+        self.tf = tf
+        self.doc_len = doc_len
+        self.avgdl = avgdl
+        # Index construit avant le filtrage par corpus : corpora vide, pas de filtre possible
+        self.corpora = {name: i for i, name in enumerate(corpora or [])}
+        self.corpus_idx = corpus_idx
+
+    def has_corpus(self, corpus: str) -> bool:
+        return corpus in self.corpora and self.corpus_idx is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query: str, k: int, corpus: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Retourne les k meilleurs (id, score BM25) pour la requête, parmi les
+        chunks du corpus `corpus` s'il est donné (ignoré si l'index ne le connaît pas).
+        """
+        n_docs = len(self.ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        for term in set(tokenize(query)):
+            t = self.term_index.get(term)
+            if t is None:
+                continue
+            start, end = int(self.offsets[t]), int(self.offsets[t + 1])
+            docs = self.doc_idx[start:end]
+            tf = self.tf[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if corpus is not None and self.has_corpus(corpus):
+            scores[self.corpus_idx != self.corpora[corpus]] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) == 0:
+            return []
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(self.ids[i], float(scores[i])) for i in candidates]
+
+
+def build_lexical_index(ids: Sequence[str], texts: Sequence[str], path: str = LEXICAL_INDEX_DIR,
+                        corpora: Optional[Sequence[str]] = None):
+    """Construit l'index BM25 des chunks (et leur corpus, si donné) et l'écrit dans `path`."""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_len = np.zeros(len(ids), dtype=np.uint32)
+
+    for i, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_len[i] = len(tokens)
+        for term, count in Counter(tokens).items():
+            postings.setdefault(term, []).append((i, min(count, 65535)))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    for t, term in enumerate(terms):
+        offsets[t + 1] = offsets[t] + len(postings[term])
+
+    doc_idx = np.empty(int(offsets[-1]), dtype=np.uint32)
+    tf = np.empty(int(offsets[-1]), dtype=np.uint16)
+    for t, term in enumerate(terms):
+        pairs = postings[term]
+        doc_idx[offsets[t]:offsets[t + 1]] = [p[0] for p in pairs]
+        tf[offsets[t]:offsets[t + 1]] = [p[1] for p in pairs]
+
+    avgdl = float(doc_len.mean()) if len(ids) else 0.0
+    meta = {"n_docs": len(ids), "n_terms": len(terms), "avgdl": avgdl}
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    np.save(os.path.join(path, "doc_idx.npy"), doc_idx)
+    np.save(os.path.join(path, "tf.npy"), tf)
+    np.save(os.path.join(path, "doc_len.npy"), doc_len)
+    if corpora is not None:
+        names = sorted(set(corpora))
+        codes = {name: i for i, name in enumerate(names)}
+        np.save(os.path.join(path, "corpus.npy"), np.array([codes[c] for c in corpora], dtype=np.uint8))
+        meta["corpora"] = names
+    with open(os.path.join(path, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(list(ids), f)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    print(f"✅ Index lexical BM25 : {len(ids)} chunks, {len(terms)} termes → {path}")
+
+
+def rebuild_lexical_index(collection, path: str = LEXICAL_INDEX_DIR, page_size: int = 5000):
+    """Reconstruit l'index BM25 à partir de tous les chunks de la collection."""
+    ids, texts, corpora = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        corpora.extend(chunk_corpus(meta) for meta in page["metadatas"])
+        offset += len(page["ids"])
+    build_lexical_index(ids, texts, path, corpora)
+
+
+def chunk_corpus(meta) -> str:
+    """Corpus d'un chunk : métadonnée 'corpus', déduite de 'doc' pour un chunk plus ancien."""
+    meta = meta or {}
+    if meta.get("corpus"):
+        return meta["corpus"]
+    return normalize_doc(meta.get("doc") or meta.get("DOC") or meta.get("source", ""))
+
+
+def load_lexical_index(path: str = LEXICAL_INDEX_DIR) -> Optional[LexicalIndex]:
+    """Charge l'index (mémoire mappée) ; None s'il n'a pas encore été construit."""
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+        terms = json.load(f)
+    with open(os.path.join(path, "ids.json"), encoding="utf-8") as f:
+        ids = json.load(f)
+    corpus_path = os.path.join(path, "corpus.npy")
+    return LexicalIndex(
+        ids=ids,
+        terms=terms,
+        offsets=np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"),
+        doc_idx=np.load(os.path.join(path, "doc_idx.npy"), mmap_mode="r"),
+        tf=np.load(os.path.join(path, "tf.npy"), mmap_mode="r"),
+        doc_len=np.load(os.path.join(path, "doc_len.npy"), mmap_mode="r"),
+        avgdl=meta["avgdl"] or 1.0,
+        corpora=meta.get("corpora"),
+        corpus_idx=np.load(corpus_path, mmap_mode="r") if os.path.exists(corpus_path) else None,
+    )
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Fusionne plusieurs classements d'IDs (Reciprocal Rank Fusion)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Sequence
+
+import httpx
+
+from config import (
+    OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_TIMEOUT,
+    OLLAMA_MAX_IN_FLIGHT, OLLAMA_QUEUE_TIMEOUT, OLLAMA_KEEP_ALIVE, ASGI_LLM_MAX_QUEUE
+)
+from services.llm_service import (
+    JURIDIQUE_OPTIONS, LLMOverloadedError, LLMStreamInterrupted, keep_alive_value,
+    build_juridique_prompt, clean_juridique_answer,
+    format_ai_response_with_sources, generate_smart_fallback,
+    _record_generation, _count_failure
+)
+from services.metrics import LLM_FIRST_TOKEN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+# =======================
+# 🔌 Client HTTP Ollama asynchrone (mode ASGI)
+# =======================
+class AsyncOllamaClient:
+    """
+    Équivalent asynchrone d'OllamaClient pour le serveur ASGI : une
+    requête en attente du LLM ne mobilise aucun thread, seulement une
+    coroutine. Les limites sont les mêmes :
+    - au plus `max_in_flight` générations envoyées à Ollama (sémaphore asyncio)
+    - refus immédiat quand plus de `max_queue` requêtes attendent un slot
+    La file peut donc être bien plus longue qu'avec les workers Flask.
+    Le client httpx est créé dans la boucle d'événements (start) et fermé
+    à l'arrêt du serveur (aclose).
+    """
+
+    def __init__(self, base_url, max_in_flight, max_queue, queue_timeout, timeout, keep_alive=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        self._client = None
+        self._slots = None
+        self._waiting = 0
+        self._in_flight = 0
+        self._requests = 0
+        self._rejected = 0
+        self._queue_timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def start(self):
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+        )
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Réserve un slot de génération (attente bornée par queue_timeout)."""
+        # Une seule boucle d'événements : pas de verrou nécessaire pour les compteurs
+        if self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise LLMOverloadedError(f"{self._waiting} requêtes déjà en attente (max {self.max_queue})")
+        self._waiting += 1
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._queue_timeouts += 1
+            raise LLMOverloadedError(f"aucun slot libre après {self.queue_timeout}s d'attente")
+        finally:
+            self._waiting -= 1
+
+        waited = time.perf_counter() - start
+        self._in_flight += 1
+        self._requests += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def _with_keep_alive(self, payload: dict) -> dict:
+        if self.keep_alive is None or "keep_alive" in payload:
+            return payload
+        return {**payload, "keep_alive": keep_alive_value(self.keep_alive)}
+
+    async def generate(self, payload: dict) -> httpx.Response:
+        """POST /api/generate non streaming (le corps est lu dans le slot)."""
+        async with self._slot():
+            return await self._client.post("/api/generate", json=self._with_keep_alive(payload))
+
+    @asynccontextmanager
+    async def stream(self, payload: dict):
+        """POST /api/generate en streaming ; le slot est gardé jusqu'à la fin du flux."""
+        async with self._slot():
+            async with self._client.stream("POST", "/api/generate", json=self._with_keep_alive(payload)) as response:
+                yield response
+
+    def get_stats(self) -> dict:
+        """Métriques de la file d'attente vers Ollama (mêmes clés qu'OllamaClient)."""
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "requests": self._requests,
+            "rejected": self._rejected,
+            "queue_timeouts": self._queue_timeouts,
+            "queue_wait_avg_ms": round(1000 * self._wait_total / self._requests, 2) if self._requests else 0.0,
+            "queue_wait_max_ms": round(1000 * self._wait_max, 2),
+        }
+
+
+async_llm_client = AsyncOllamaClient(
+    OLLAMA_BASE_URL,
+    max_in_flight=OLLAMA_MAX_IN_FLIGHT,
+    max_queue=ASGI_LLM_MAX_QUEUE,
+    queue_timeout=OLLAMA_QUEUE_TIMEOUT,
+    timeout=OLLAMA_TIMEOUT,
+    keep_alive=OLLAMA_KEEP_ALIVE
+)
+
+
+# =======================
+# 💬 Fonctions principales
+# =======================
+async def generate_juridique_async(question: str, context: str, references: Sequence = ()):
+    """Version asynchrone de generate_juridique : retourne (réponse, llm_utilisé)."""
+    if not context or not context.strip():
+        return "❌ Aucun article pertinent n'a été trouvé dans la base de données juridique.", False
+
+    ai_response = await call_ollama_juridique_async(question, context)
+
+    if ai_response:
+        return format_ai_response_with_sources(ai_response, references), True
+
+    logger.warning("LLM local n'a pas répondu → utilisation du fallback")
+    return generate_smart_fallback(question, references), False
+
+
+async def call_ollama_juridique_async(question: str, context: str):
+    """Version asynchrone de call_ollama_juridique (None si Ollama ne répond pas)."""
+    try:
+        response = await async_llm_client.generate({
+            "model": OLLAMA_MODEL,
+            "prompt": build_juridique_prompt(question, context),
+            "stream": False,
+            "options": JURIDIQUE_OPTIONS
+        })
+
+        if response.status_code == 200:
+            data = response.json()
+            _record_generation("juridique", data)
+            return clean_juridique_answer(data.get("response", ""))
+        _record_async_failure("juridique", status_code=response.status_code)
+        return None
+
+    except Exception as e:
+        _record_async_failure("juridique", error=e)
+        return None
+
+
+async def stream_ollama_juridique_async(question: str, context: str):
+    """
+    Version asynchrone de stream_ollama_juridique : produit les tokens
+    d'Ollama au fur et à mesure. Ne produit rien si Ollama est indisponible ;
+    lève LLMStreamInterrupted si le flux est coupé après le premier token.
+    """
+    first_token = True
+    try:
+        start = time.perf_counter()
+
+        async with async_llm_client.stream({
+            "model": OLLAMA_MODEL,
+            "prompt": build_juridique_prompt(question, context),
+            "stream": True,
+            "options": JURIDIQUE_OPTIONS
+        }) as response:
+            if response.status_code != 200:
+                _record_async_failure("streaming", status_code=response.status_code)
+                return
+
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                token = data.get("response", "")
+                if token:
+                    if first_token:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, mode="streaming")
+                        first_token = False
+                    yield token
+                if data.get("done"):
+                    _record_generation("streaming", data, first_token_measured=True)
+                    return
+
+        _count_failure("streaming", "interrupted", "Flux Ollama terminé sans la ligne finale \"done\"")
+
+    except Exception as e:
+        _record_async_failure("streaming", error=e)
+
+    if not first_token:
+        raise LLMStreamInterrupted("flux Ollama interrompu avant la fin de la génération")
+
+
+def _record_async_failure(mode: str, error: Exception = None, status_code: int = None):
+    """Comme _record_failure, pour les exceptions httpx."""
+    if status_code is not None:
+        outcome, message = "http_error", f"Erreur Ollama : Status {status_code}"
+    elif isinstance(error, LLMOverloadedError):
+        outcome, message = "overloaded", f"Ollama saturé, requête refusée : {error}"
+    elif isinstance(error, httpx.TimeoutException):
+        outcome, message = "timeout", f"Timeout Ollama ({OLLAMA_TIMEOUT}s dépassé)"
+    elif isinstance(error, httpx.RemoteProtocolError):
+        outcome, message = "interrupted", "Connexion à Ollama coupée en cours de réponse"
+    elif isinstance(error, httpx.TransportError):
+        outcome, message = "unavailable", "Ollama n'est pas démarré. Lancez : ollama serve"
+    else:
+        outcome, message = "error", f"Erreur Ollama : {str(error)[:100]}"
+    _count_failure(mode, outcome, message)
@@ -1,11 +1,301 @@
 import requests
 import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Sequence, Tuple
+from requests.adapters import HTTPAdapter
+
+from config import (
+    OLLAMA_BASE_URL, OLLAMA_MODEL, OLLAMA_TIMEOUT,
+    OLLAMA_MAX_IN_FLIGHT, OLLAMA_MAX_QUEUE, OLLAMA_QUEUE_TIMEOUT,
+    OLLAMA_KEEP_ALIVE, OLLAMA_KEEP_ALIVE_REFRESH
+)
+from services.metrics import (
+    LLM_REQUESTS, LLM_FIRST_TOKEN_SECONDS, LLM_GENERATION_SECONDS, LLM_MODEL_LOADS, LLM_PROMPT_EVAL_TOKENS, gauge
+)
+
+logger = logging.getLogger(__name__)
+
+# En-tête commun des réponses juridiques (aussi envoyé en premier en streaming)
+RESPONSE_HEADER = "💬 **Réponse juridique :**\n\n"
+# Articles cités après la réponse (et dans le fallback)
+MAX_REFERENCES = 3
+# Ajouté à une réponse en streaming coupée avant la fin de la génération
+STREAM_INTERRUPTED_NOTICE = (
+    "\n\n⚠️ *Réponse interrompue : le modèle local a cessé de répondre. "
+    "Référez-vous aux articles ci-dessous.*"
+)
+
+# Au-delà, le temps de chargement rapporté par Ollama signifie que le modèle
+# n'était pas en mémoire (quelques ms quand il l'est déjà)
+COLD_LOAD_SECONDS = 0.5
+
+
+def keep_alive_value(value: str):
+    """keep_alive au format attendu par Ollama : nombre de secondes ou durée ("30m")."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+# =======================
+# 🔌 Client HTTP Ollama partagé
+# =======================
+class LLMOverloadedError(Exception):
+    """Levée quand la file d'attente vers Ollama est pleine (fast-fail)."""
+
+
+class LLMStreamInterrupted(Exception):
+    """
+    Levée par les générateurs de streaming quand le flux d'Ollama s'arrête
+    après le premier token sans la ligne finale "done" (timeout, connexion
+    coupée) : la réponse déjà produite est incomplète.
+    """
+
+
+class OllamaClient:
+    """
+    Client Ollama partagé par tous les workers Flask :
+    - une Session requests avec pool de connexions keep-alive
+    - au plus `max_in_flight` générations simultanées (sémaphore)
+    - refus immédiat quand plus de `max_queue` requêtes attendent un slot
+    - métriques d'attente dans la file (voir get_stats)
+    - keep_alive ajouté à chaque requête (durée de maintien du modèle en mémoire)
+    """
+
+    def __init__(self, base_url, max_in_flight, max_queue, queue_timeout, timeout, keep_alive=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._requests = 0
+        self._rejected = 0
+        self._queue_timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def _slot(self):
+        """Réserve un slot de génération (bloquant, borné par queue_timeout)."""
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise LLMOverloadedError(
+                    f"{self._waiting} requêtes déjà en attente (max {self.max_queue})"
+                )
+            self._waiting += 1
+
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self._waiting -= 1
+            if not acquired:
+                self._queue_timeouts += 1
+            else:
+                self._in_flight += 1
+                self._requests += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+        if not acquired:
+            raise LLMOverloadedError(f"aucun slot libre après {self.queue_timeout}s d'attente")
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def _with_keep_alive(self, payload: dict) -> dict:
+        if self.keep_alive is None or "keep_alive" in payload:
+            return payload
+        return {**payload, "keep_alive": keep_alive_value(self.keep_alive)}
+
+    def generate(self, payload: dict) -> requests.Response:
+        """POST /api/generate non streaming (le corps est lu dans le slot)."""
+        with self._slot():
+            return self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._with_keep_alive(payload),
+                timeout=self.timeout
+            )
+
+    def load_model(self, model: str, prompt: str = None, options: dict = None) -> dict:
+        """
+        Charge le modèle (et repousse son expiration) hors des slots de
+        génération : sans prompt, Ollama charge le modèle sans rien générer.
+        """
+        payload = {"model": model, "stream": False}
+        if prompt is not None:
+            payload.update(prompt=prompt, options=options or {})
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._with_keep_alive(payload),
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @contextmanager
+    def stream(self, payload: dict):
+        """POST /api/generate en streaming ; le slot est gardé jusqu'à la fin du flux."""
+        with self._slot():
+            with self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._with_keep_alive(payload),
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                yield response
+
+    def get_stats(self) -> dict:
+        """Métriques de la file d'attente vers Ollama."""
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "requests": self._requests,
+                "rejected": self._rejected,
+                "queue_timeouts": self._queue_timeouts,
+                "queue_wait_avg_ms": round(1000 * self._wait_total / self._requests, 2) if self._requests else 0.0,
+                "queue_wait_max_ms": round(1000 * self._wait_max, 2),
+            }
+
+
+llm_client = OllamaClient(
+    OLLAMA_BASE_URL,
+    max_in_flight=OLLAMA_MAX_IN_FLIGHT,
+    max_queue=OLLAMA_MAX_QUEUE,
+    queue_timeout=OLLAMA_QUEUE_TIMEOUT,
+    timeout=OLLAMA_TIMEOUT,
+    keep_alive=OLLAMA_KEEP_ALIVE
+)
+
+gauge("rag_llm_in_flight", "Générations Ollama en cours", lambda: llm_client.get_stats()["in_flight"])
+gauge("rag_llm_waiting", "Requêtes en attente d'un slot Ollama", lambda: llm_client.get_stats()["waiting"])
+
 
 # =======================
-# 🏠 Configuration LLM Local
+# ♻️ Cycle de vie du modèle
 # =======================
-OLLAMA_BASE_URL = "http://localhost:11434"
-OLLAMA_MODEL = "llama3.2"  # ✅ Llama 3.2
+class LLMLifecycle:
+    """
+    Garde le modèle chargé dans Ollama :
+    - préchargement au démarrage (warm_up) : chargement du modèle et
+      première évaluation du début fixe du prompt juridique
+    - keep_alive envoyé avec chaque requête (OllamaClient) et rafraîchi
+      par une requête vide quand aucune génération n'a eu lieu depuis
+      `refresh_interval` secondes
+    Les appels passent hors des slots de génération (load_model).
+    """
+
+    def __init__(self, client, model, refresh_interval):
+        self.client = client
+        self.model = model
+        self.refresh_interval = refresh_interval
+        self.state = "unknown"
+        self.warm_up_s = None
+        self.refreshes = 0
+        self._last_used = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def touch(self):
+        """Une génération vient d'avoir lieu : le keep_alive d'Ollama est reparti."""
+        self._last_used = time.monotonic()
+
+    def warm_up(self) -> bool:
+        """Charge le modèle et évalue le début fixe du prompt (un seul token généré)."""
+        start = time.perf_counter()
+        try:
+            data = self.client.load_model(
+                self.model, prompt=JURIDIQUE_PROMPT_PREFIX, options={**JURIDIQUE_OPTIONS, "num_predict": 1}
+            )
+        except Exception as e:
+            self.state = "unavailable"
+            logger.warning("Préchargement du modèle %s impossible : %s", self.model, e)
+            return False
+
+        self.warm_up_s = round(time.perf_counter() - start, 3)
+        self.state = "loaded"
+        _record_generation("warm_up", data)
+        logger.info("Modèle %s préchargé en %.1f s", self.model, self.warm_up_s,
+                    extra={"warm_up_s": self.warm_up_s, "prompt_tokens": data.get("prompt_eval_count")})
+        return True
+
+    def refresh(self) -> bool:
+        """Requête vide : Ollama (re)charge le modèle si besoin et repousse son expiration."""
+        start = time.perf_counter()
+        try:
+            self.client.load_model(self.model)
+        except Exception as e:
+            self.state = "unavailable"
+            logger.warning("Rafraîchissement du keep_alive impossible : %s", e)
+            return False
+
+        seconds = time.perf_counter() - start
+        if seconds >= COLD_LOAD_SECONDS:
+            LLM_MODEL_LOADS.inc(mode="refresh")
+            logger.info("Modèle %s rechargé par Ollama (%.1f s)", self.model, seconds)
+        self.state = "loaded"
+        self.refreshes += 1
+        self.touch()
+        return True
+
+    def _run(self, warm_up):
+        if warm_up:
+            self.warm_up()
+        if self.refresh_interval <= 0:
+            return
+        while not self._stop.wait(self.refresh_interval):
+            idle = time.monotonic() - (self._last_used or 0)
+            if idle >= self.refresh_interval:
+                self.refresh()
+
+    def start(self, warm_up=True):
+        """Préchargement puis rafraîchissement en arrière-plan (une seule fois par processus)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(warm_up,), name="llm-lifecycle", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_stats(self) -> dict:
+        return {
+            "model": self.model,
+            "state": self.state,
+            "keep_alive": self.client.keep_alive,
+            "warm_up_s": self.warm_up_s,
+            "refreshes": self.refreshes,
+            "idle_s": round(time.monotonic() - self._last_used, 1) if self._last_used else None,
+        }
+
+
+llm_lifecycle = LLMLifecycle(llm_client, OLLAMA_MODEL, refresh_interval=OLLAMA_KEEP_ALIVE_REFRESH)
+
 
 # =======================
 # 💬 Fonctions principales
@@ -14,8 +304,6 @@ def ask_general(question: str) -> str:
     """
     Génère une réponse générale (non juridique) avec Llama 3.2 local.
     """
-    print("\n🌐 Mode assistant général activé (Llama 3.2)")
-    
     ai_response = call_ollama_general(question)
     
     if ai_response:
@@ -40,34 +328,89 @@ ollama serve
 N'hésitez pas à me poser une question juridique ! ⚖️"""
 
 
-def ask_juridique(question: str, context: str) -> str:
+def ask_juridique(question: str, context: str, references: Sequence = ()) -> str:
     """
     Génère une réponse juridique basée sur le contexte avec Llama 3.2 local.
+    `references` : chunks (RetrievedChunk) cités après la réponse.
+    """
+    answer, _ = generate_juridique(question, context, references)
+    return answer
+
+
+def generate_juridique(question: str, context: str, references: Sequence = ()):
+    """
+    Comme ask_juridique, mais retourne (réponse, llm_utilisé) pour que
+    l'appelant sache si la réponse vient du LLM ou du fallback.
     """
     if not context or not context.strip():
-        return "❌ Aucun article pertinent n'a été trouvé dans la base de données juridique."
+        return "❌ Aucun article pertinent n'a été trouvé dans la base de données juridique.", False
 
-    print("\n⚖️ Mode juridique activé (Llama 3.2)")
-    
     ai_response = call_ollama_juridique(question, context)
 
     if ai_response:
-        return format_ai_response_with_sources(ai_response, context)
+        return format_ai_response_with_sources(ai_response, references), True
 
-    print("⚠️ LLM local n'a pas répondu → Utilisation du fallback")
-    return generate_smart_fallback(question, context)
+    logger.warning("LLM local n'a pas répondu → utilisation du fallback")
+    return generate_smart_fallback(question, references), False
 
 
 # =======================
 # 🦙 Ollama - Appels API
 # =======================
+JURIDIQUE_OPTIONS = {
+    "temperature": 0.7,
+    "num_predict": 400,
+    "top_p": 0.9,
+    "stop": ["\n\nQUESTION", "\n\nCONTEXTE"]
+}
+
+
+# Début fixe du prompt juridique, identique pour toutes les questions :
+# Ollama garde en cache l'évaluation du plus long préfixe commun avec le
+# prompt précédent et ne réévalue que la suite (contexte et question).
+# Il est évalué une première fois au préchargement (LLMLifecycle.warm_up).
+JURIDIQUE_PROMPT_PREFIX = """Tu es un assistant juridique expert en droit marocain. Tu dois expliquer les lois de manière claire et accessible.
+
+INSTRUCTIONS IMPORTANTES :
+1. Commence par une phrase d'introduction claire qui répond directement à la question
+2. Explique les principes juridiques en langage simple (comme si tu parlais à quelqu'un qui n'est pas juriste)
+3. Base-toi UNIQUEMENT sur le contexte juridique fourni ci-dessous
+4. Structure ta réponse en 2-3 paragraphes maximum (150-250 mots)
+5. Ne cite PAS les numéros d'articles (ils seront ajoutés automatiquement après)
+6. Termine par un conseil pratique ou une recommandation
+
+"""
+
+
+def build_juridique_prompt(question: str, context: str) -> str:
+    """
+    Construit le prompt juridique (structuré et explicite) envoyé à Ollama.
+    Les parties variables viennent après le début fixe (réutilisé par Ollama).
+    """
+    return f"""{JURIDIQUE_PROMPT_PREFIX}CONTEXTE JURIDIQUE :
+{context}
+
+QUESTION DE L'UTILISATEUR :
+{question}
+
+RÉPONSE EN FRANÇAIS :"""
+
+
+def clean_juridique_answer(answer: str) -> str:
+    """
+    Nettoie les préfixes parfois recopiés par le modèle.
+    """
+    answer = answer.strip()
+    answer = answer.replace("RÉPONSE EN FRANÇAIS:", "").strip()
+    answer = answer.replace("Réponse :", "").strip()
+    return answer
+
+
 def call_ollama_general(question: str) -> str:
     """
     Appelle Ollama (Llama 3.2) localement pour une question générale.
     """
     try:
-        print(f"🔄 Appel à Ollama (modèle: {OLLAMA_MODEL})...")
-        
         prompt = f"""Tu es un assistant conversationnel utile et amical. 
 Réponds en français de manière claire et concise.
 
@@ -75,38 +418,27 @@ Question : {question}
 
 Réponse :"""
 
-        response = requests.post(
-            f"{OLLAMA_BASE_URL}/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 300,
-                    "top_p": 0.9
-                }
-            },
-            timeout=180
-        )
+        response = llm_client.generate({
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 300,
+                "top_p": 0.9
+            }
+        })
 
         if response.status_code == 200:
             data = response.json()
-            answer = data.get("response", "").strip()
-            print(f"✅ Réponse reçue ({len(answer)} caractères)")
-            return answer
+            _record_generation("general", data)
+            return data.get("response", "").strip()
         else:
-            print(f"❌ Erreur Ollama : Status {response.status_code}")
+            _record_failure("general", status_code=response.status_code)
             return None
 
-    except requests.exceptions.Timeout:
-        print("❌ Timeout Ollama (180s dépassé)")
-        return None
-    except requests.exceptions.ConnectionError:
-        print("❌ Ollama n'est pas démarré. Lancez : ollama serve")
-        return None
     except Exception as e:
-        print(f"❌ Erreur Ollama : {str(e)[:100]}")
+        _record_failure("general", error=e)
         return None
 
 
@@ -115,127 +447,181 @@ def call_ollama_juridique(question: str, context: str) -> str:
     Appelle Ollama (Llama 3.2) localement pour une question juridique.
     """
     try:
-        print(f"🔄 Appel juridique à Ollama (modèle: {OLLAMA_MODEL})...")
-        
-        # Prompt plus structuré et explicite
-        prompt = f"""Tu es un assistant juridique expert en droit marocain. Tu dois expliquer les lois de manière claire et accessible.
-
-CONTEXTE JURIDIQUE :
-{context}
-
-QUESTION DE L'UTILISATEUR :
-{question}
-
-INSTRUCTIONS IMPORTANTES :
-1. Commence par une phrase d'introduction claire qui répond directement à la question
-2. Explique les principes juridiques en langage simple (comme si tu parlais à quelqu'un qui n'est pas juriste)
-3. Base-toi UNIQUEMENT sur le contexte juridique fourni ci-dessus
-4. Structure ta réponse en 2-3 paragraphes maximum (150-250 mots)
-5. Ne cite PAS les numéros d'articles (ils seront ajoutés automatiquement après)
-6. Termine par un conseil pratique ou une recommandation
-
-RÉPONSE EN FRANÇAIS :"""
+        prompt = build_juridique_prompt(question, context)
 
-        response = requests.post(
-            f"{OLLAMA_BASE_URL}/api/generate",
-            json={
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 400,
-                    "top_p": 0.9,
-                    "stop": ["\n\nQUESTION", "\n\nCONTEXTE"]
-                }
-            },
-            timeout=180
-        )
+        response = llm_client.generate({
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "options": JURIDIQUE_OPTIONS
+        })
 
         if response.status_code == 200:
             data = response.json()
-            answer = data.get("response", "").strip()
-            
-            # Nettoyer la réponse
-            answer = answer.replace("RÉPONSE EN FRANÇAIS:", "").strip()
-            answer = answer.replace("Réponse :", "").strip()
-            
-            print(f"✅ Réponse juridique reçue ({len(answer)} caractères)")
-            return answer
+            _record_generation("juridique", data)
+            return clean_juridique_answer(data.get("response", ""))
         else:
-            print(f"❌ Erreur Ollama : Status {response.status_code}")
+            _record_failure("juridique", status_code=response.status_code)
             return None
 
-    except requests.exceptions.Timeout:
-        print("❌ Timeout Ollama (180s dépassé)")
-        return None
-    except requests.exceptions.ConnectionError:
-        print("❌ Ollama n'est pas démarré. Lancez : ollama serve")
-        return None
     except Exception as e:
-        print(f"❌ Erreur Ollama : {str(e)[:100]}")
+        _record_failure("juridique", error=e)
         return None
 
 
+def stream_ollama_juridique(question: str, context: str):
+    """
+    Variante streaming de call_ollama_juridique : produit les tokens
+    d'Ollama au fur et à mesure (générateur de chaînes).
+    Ne produit rien si Ollama est indisponible ; lève LLMStreamInterrupted
+    si le flux s'arrête avant la ligne finale "done" après le premier token.
+    """
+    first_token = True
+    try:
+        prompt = build_juridique_prompt(question, context)
+        start = time.perf_counter()
+
+        with llm_client.stream({
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": True,
+            "options": JURIDIQUE_OPTIONS
+        }) as response:
+            if response.status_code != 200:
+                _record_failure("streaming", status_code=response.status_code)
+                return
+
+            # Ollama envoie une ligne JSON par fragment : {"response": "...", "done": false}
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                token = data.get("response", "")
+                if token:
+                    if first_token:
+                        # Délai réel, attente dans la file vers Ollama comprise
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start, mode="streaming")
+                        first_token = False
+                    yield token
+                if data.get("done"):
+                    _record_generation("streaming", data, first_token_measured=True)
+                    return
+
+        _count_failure("streaming", "interrupted", "Flux Ollama terminé sans la ligne finale \"done\"")
+
+    except Exception as e:
+        _record_failure("streaming", error=e)
+
+    if not first_token:
+        raise LLMStreamInterrupted("flux Ollama interrompu avant la fin de la génération")
+
+
+def _record_generation(mode: str, data: dict, first_token_measured: bool = False):
+    """
+    Compte une génération réussie. Ollama renvoie ses durées (ns) dans la
+    réponse finale : chargement + lecture du prompt ≈ délai avant le premier
+    token d'une réponse non streamée.
+    """
+    LLM_REQUESTS.inc(mode=mode, outcome="ok")
+    llm_lifecycle.touch()
+
+    # Démarrage à froid : Ollama a dû charger le modèle pour cette requête
+    load_s = data.get("load_duration", 0) / 1e9
+    start = "cold" if load_s >= COLD_LOAD_SECONDS else "warm"
+    if start == "cold":
+        LLM_MODEL_LOADS.inc(mode=mode)
+        logger.info("Modèle chargé par Ollama pour la requête (%.1f s)", load_s,
+                    extra={"llm_mode": mode, "load_s": round(load_s, 3)})
+    if "total_duration" in data:
+        LLM_GENERATION_SECONDS.observe(data["total_duration"] / 1e9, mode=mode, start=start)
+    if "prompt_eval_count" in data:
+        LLM_PROMPT_EVAL_TOKENS.observe(data["prompt_eval_count"], mode=mode)
+
+    if not first_token_measured and "prompt_eval_duration" in data:
+        first_token_ns = data.get("load_duration", 0) + data.get("prompt_eval_duration", 0)
+        LLM_FIRST_TOKEN_SECONDS.observe(first_token_ns / 1e9, mode=mode)
+    if logger.isEnabledFor(logging.DEBUG):
+        eval_s = data.get("eval_duration", 0) / 1e9
+        logger.debug(
+            "Génération Ollama terminée", extra={
+                "llm_mode": mode,
+                "prompt_tokens": data.get("prompt_eval_count"),
+                "output_tokens": data.get("eval_count"),
+                "tokens_per_s": round(data.get("eval_count", 0) / eval_s, 1) if eval_s else None,
+            }
+        )
+
+
+def _record_failure(mode: str, error: Exception = None, status_code: int = None):
+    """Journalise et compte un appel à Ollama échoué, par cause."""
+    if status_code is not None:
+        outcome, message = "http_error", f"Erreur Ollama : Status {status_code}"
+    elif isinstance(error, LLMOverloadedError):
+        outcome, message = "overloaded", f"Ollama saturé, requête refusée : {error}"
+    elif isinstance(error, requests.exceptions.Timeout):
+        outcome, message = "timeout", f"Timeout Ollama ({OLLAMA_TIMEOUT}s dépassé)"
+    elif isinstance(error, requests.exceptions.ChunkedEncodingError):
+        outcome, message = "interrupted", "Connexion à Ollama coupée en cours de réponse"
+    elif isinstance(error, requests.exceptions.ConnectionError):
+        outcome, message = "unavailable", "Ollama n'est pas démarré. Lancez : ollama serve"
+    else:
+        outcome, message = "error", f"Erreur Ollama : {str(error)[:100]}"
+    _count_failure(mode, outcome, message)
+
+
+def _count_failure(mode: str, outcome: str, message: str):
+    """Compte et journalise un échec déjà classé (aussi utilisé par le client asynchrone)."""
+    LLM_REQUESTS.inc(mode=mode, outcome=outcome)
+    logger.error(message, extra={"llm_mode": mode, "outcome": outcome})
+
+
 # =======================
 # 🧾 Mise en forme finale
 # =======================
-def format_ai_response_with_sources(ai_response: str, context: str) -> str:
+def format_ai_response_with_sources(ai_response: str, references: Sequence) -> str:
     """
     Formate la réponse IA + ajoute les articles à la fin
     """
-    articles = []
-    for line in context.split('\n\n'):
-        line = line.strip()
-        if line and len(line) > 20:
-            articles.append(line)
+    return f"""{RESPONSE_HEADER}{ai_response.strip()}
 
-    formatted = f"""💬 **Réponse juridique :**
+{format_sources_footer(references)}"""
 
-{ai_response.strip()}
 
----
+def format_sources_footer(references: Sequence) -> str:
+    """
+    Construit le bloc des références légales ajouté après la réponse IA,
+    à partir des chunks cités (RetrievedChunk : intitulé et extrait
+    calculé à l'ingestion). Le bloc est mis en cache par références.
+    """
+    return _sources_footer(tuple((ref.reference, ref.snippet) for ref in references[:MAX_REFERENCES]))
+
+
+@lru_cache(maxsize=1024)
+def _sources_footer(references: Tuple[Tuple[str, str], ...]) -> str:
+    footer = """---
 
 📚 **Références légales :**
 """
 
-    for i, article in enumerate(articles[:3], 1):
-        lines = article.split('\n')
-        if len(lines) >= 2:
-            reference = lines[0].strip()
-            content = ' '.join(lines[1:]).strip()
-            if len(content) > 250:
-                content = content[:250] + "..."
-            formatted += f"\n**{i}. {reference}**\n> {content}\n"
+    for i, (reference, snippet) in enumerate(references, 1):
+        footer += f"\n**{i}. {reference}**\n> {snippet}\n"
 
-    formatted += "\n---\n_💼 Source : Base de données juridique marocaine "
-    return formatted
+    footer += "\n---\n_💼 Source : Base de données juridique marocaine "
+    return footer
 
 
 # =======================
 # 🧩 Fallback sans IA
 # =======================
-def generate_smart_fallback(question: str, context: str) -> str:
+def generate_smart_fallback(question: str, references: Sequence) -> str:
     """
     Génère une réponse basique si Ollama ne répond pas
     """
-    articles = []
-    for line in context.split('\n\n'):
-        line = line.strip()
-        if line and len(line) > 20:
-            articles.append(line)
-
     intro = f"💬 **Réponse juridique :**\n\n"
     intro += f"D'après la législation marocaine, concernant votre question sur **{question}**, voici les dispositions pertinentes :\n\n"
 
-    for i, article in enumerate(articles[:3], 1):
-        lines = article.split('\n')
-        if len(lines) >= 2:
-            reference = lines[0].strip()
-            content = ' '.join(lines[1:]).strip()
-            if len(content) > 250:
-                content = content[:250] + "..."
-            intro += f"**{i}. {reference}**\n> {content}\n\n"
+    for i, ref in enumerate(references[:MAX_REFERENCES], 1):
+        intro += f"**{i}. {ref.reference}**\n> {ref.snippet}\n\n"
 
     intro += "---\n📌 **Remarque :** Cette réponse est basée sur les textes juridiques marocains en vigueur. Pour une interprétation détaillée, consultez un avocat.\n\n_💼 Source : Base de données juridique marocaine_"
     return intro
\ No newline at end of file
@@ -0,0 +1,253 @@
+import bisect
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Secondes : de la recherche en mémoire (ms) aux générations du LLM (minutes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Tailles de prompt et de contexte (tokens)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Compteur monotone, par combinaison d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(v)}" for key, v in values]
+
+
+class Gauge(_Metric):
+    """Valeur instantanée, lue à chaque export par `function`."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, function: Callable[[], float]):
+        super().__init__(name, help)
+        self.function = function
+
+    def _samples(self):
+        try:
+            value = self.function()
+        except Exception:
+            return []
+        return [f"{self.name} {_format_value(value)}"] if value is not None else []
+
+
+class Histogram(_Metric):
+    """Histogramme cumulatif (buckets, somme, nombre), par combinaison d'étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts[0][index] += 1
+            counts[1] += value
+            counts[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((key, ([*c[0]], c[1], c[2])) for key, c in self._values.items())
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(self.label_names, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Export au format texte Prometheus (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, help, labels=()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def gauge(name, help, function) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, function))
+
+
+# =======================
+# 📈 Métriques de l'application
+# =======================
+REQUESTS = counter("rag_requests_total", "Requêtes traitées par endpoint et statut final", ["endpoint", "status"])
+REQUEST_SECONDS = histogram("rag_request_duration_seconds", "Durée totale des requêtes", ["endpoint"])
+STAGE_SECONDS = histogram(
+    "rag_stage_duration_seconds",
+    "Durée de chaque étape (embed, chroma_query, filter, lexical_fusion, context, llm, sqlite_write...)",
+    ["stage"]
+)
+LLM_REQUESTS = counter("rag_llm_requests_total", "Appels à Ollama par mode et résultat", ["mode", "outcome"])
+LLM_FIRST_TOKEN_SECONDS = histogram(
+    "rag_llm_time_to_first_token_seconds", "Délai avant le premier token du LLM", ["mode"]
+)
+LLM_GENERATION_SECONDS = histogram(
+    "rag_llm_generation_seconds",
+    "Durée des générations Ollama : modèle déjà en mémoire (warm) ou chargé pour la requête (cold)",
+    ["mode", "start"]
+)
+LLM_MODEL_LOADS = counter("rag_llm_model_loads_total", "Chargements du modèle par Ollama (démarrages à froid)", ["mode"])
+FALLBACKS = counter("rag_fallback_total", "Réponses produites par le fallback (LLM indisponible)", ["endpoint"])
+RERANKS = counter(
+    "rag_rerank_total", "Reclassements par cross-encoder (reranked, cached, over_budget, error)", ["outcome"]
+)
+COALESCED_REQUESTS = counter(
+    "rag_coalesced_requests_total", "Requêtes servies par le calcul d'une question identique simultanée", ["endpoint"]
+)
+CORPUS_ROUTES = counter(
+    "rag_corpus_routes_total",
+    "Corpus de la recherche : choisi par le paramètre (param), deviné (router), tous (none) ou élargi (widened)",
+    ["corpus", "source"]
+)
+CONTEXT_TOKENS = histogram(
+    "rag_context_tokens", "Taille du contexte envoyé au LLM après assemblage (tokens)", buckets=TOKEN_BUCKETS
+)
+PROMPT_TOKENS = histogram(
+    "rag_prompt_tokens", "Taille estimée du prompt juridique complet (tokens)", buckets=TOKEN_BUCKETS
+)
+LLM_PROMPT_EVAL_TOKENS = histogram(
+    "rag_llm_prompt_eval_tokens",
+    "Tokens du prompt évalués par Ollama (prompt_eval_count, hors préfixe déjà en cache)",
+    ["mode"], buckets=TOKEN_BUCKETS
+)
+CONTEXT_ARTICLES_DROPPED = counter(
+    "rag_context_articles_dropped_total", "Articles écartés à l'assemblage du contexte", ["reason"]
+)
+ANSWER_CACHE_LOOKUPS = counter("rag_answer_cache_lookups_total", "Consultations du cache de réponses", ["result"])
+SQLITE_ROWS = counter("rag_sqlite_rows_written_total", "Lignes écrites dans l'historique SQLite")
+
+
+class RequestTimings:
+    """
+    Chronométrage d'une requête : chaque étape alimente l'histogramme
+    STAGE_SECONDS et le résumé journalisé à la fin de la requête.
+    """
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+    def finish(self, status: str, fallback: bool = False, **fields):
+        total = time.perf_counter() - self._start
+        REQUESTS.inc(endpoint=self.endpoint, status=status)
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint)
+        if fallback:
+            FALLBACKS.inc(endpoint=self.endpoint)
+        logger.info(
+            "requête %s terminée : %s en %.1f ms", self.endpoint, status, total * 1000,
+            extra={
+                "endpoint": self.endpoint, "status": status, "fallback": fallback,
+                "total_ms": round(total * 1000, 2),
+                **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+                **fields,
+            }
+        )
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from config import (
+    RERANK_MODEL, RERANK_DEVICE, RERANK_BUDGET_MS, RERANK_BATCH_SIZE,
+    RERANK_MAX_LENGTH, RERANK_CACHE_SIZE
+)
+from services.answer_cache import normalize_question
+from services.metrics import RERANKS
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """
+    Reclassement des candidats de la recherche par un cross-encoder
+    (sentence-transformers, CPU) :
+    - le modèle est chargé une seule fois par processus, au premier usage
+    - les paires (question, chunk) sont scorées par batches
+    - budget de temps par requête : si le coût estimé ou le temps écoulé
+      le dépasse, rerank retourne None et l'appelant garde l'ordre d'origine
+    - cache LRU des scores par (question normalisée, chunk) : une question
+      répétée ne recalcule rien
+    """
+
+    def __init__(self, model_name: str, device: str, budget_ms: float, batch_size: int,
+                 max_length: int, cache_size: int):
+        self.model_name = model_name
+        self.device = device
+        self.budget = budget_ms / 1000.0
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.cache_size = cache_size
+
+        self._model = None
+        self._model_lock = threading.Lock()
+
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.over_budget = 0
+        # Coût moyen d'une paire (s), pour ne pas commencer un calcul hors budget
+        self._pair_seconds: Optional[float] = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    logger.info("Chargement du cross-encoder : %s", self.model_name)
+                    self._model = CrossEncoder(self.model_name, device=self.device, max_length=self.max_length)
+        return self._model
+
+    def _cached_scores(self, key: str, ids: List[str]) -> dict:
+        scores = {}
+        with self._cache_lock:
+            for chunk_id in ids:
+                score = self._cache.get((key, chunk_id))
+                if score is not None:
+                    self._cache.move_to_end((key, chunk_id))
+                    scores[chunk_id] = score
+            self.hits += len(scores)
+            self.misses += len(ids) - len(scores)
+        return scores
+
+    def _store(self, key: str, scores: dict):
+        with self._cache_lock:
+            for chunk_id, score in scores.items():
+                self._cache[(key, chunk_id)] = score
+                self._cache.move_to_end((key, chunk_id))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _observe_cost(self, seconds_per_pair: float):
+        previous = self._pair_seconds
+        self._pair_seconds = seconds_per_pair if previous is None else 0.8 * previous + 0.2 * seconds_per_pair
+
+    def rerank(self, question: str, ids: List[str], texts: List[str]) -> Optional[List[int]]:
+        """
+        Indices des candidats du plus au moins pertinent, ou None si le
+        budget de temps est dépassé (ou en cas d'erreur du modèle).
+        """
+        start = time.perf_counter()
+        key = normalize_question(question)
+        scores = self._cached_scores(key, ids)
+        todo = [i for i, chunk_id in enumerate(ids) if chunk_id not in scores]
+
+        if todo and self._pair_seconds is not None and len(todo) * self._pair_seconds > self.budget:
+            # L'estimation décroît à chaque refus : un pic passager ne bloque pas le reclassement
+            self._pair_seconds *= 0.9
+            return self._give_up(len(todo), start)
+
+        try:
+            for batch_start in range(0, len(todo), self.batch_size):
+                if time.perf_counter() - start > self.budget:
+                    return self._give_up(len(todo) - batch_start, start)
+                batch = todo[batch_start:batch_start + self.batch_size]
+                batch_time = time.perf_counter()
+                values = self.model.predict(
+                    [(question, texts[i]) for i in batch],
+                    batch_size=len(batch),
+                    show_progress_bar=False
+                )
+                self._observe_cost((time.perf_counter() - batch_time) / len(batch))
+                computed = {ids[i]: float(value) for i, value in zip(batch, values)}
+                self._store(key, computed)
+                scores.update(computed)
+        except Exception as e:
+            RERANKS.inc(outcome="error")
+            logger.warning("Reclassement impossible (%s) → ordre de la recherche", e)
+            return None
+
+        RERANKS.inc(outcome="reranked" if todo else "cached")
+        return sorted(range(len(ids)), key=lambda i: scores[ids[i]], reverse=True)
+
+    def _give_up(self, remaining: int, start: float):
+        self.over_budget += 1
+        RERANKS.inc(outcome="over_budget")
+        logger.info(
+            "Budget de reclassement dépassé → ordre de la recherche",
+            extra={"pairs_remaining": remaining, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+        )
+        return None
+
+    def get_stats(self) -> dict:
+        with self._cache_lock:
+            return {
+                "model": self.model_name,
+                "cache_size": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "over_budget": self.over_budget,
+                "pair_ms": round(self._pair_seconds * 1000, 3) if self._pair_seconds is not None else None,
+            }
+
+
+reranker = Reranker(
+    RERANK_MODEL,
+    device=RERANK_DEVICE,
+    budget_ms=RERANK_BUDGET_MS,
+    batch_size=RERANK_BATCH_SIZE,
+    max_length=RERANK_MAX_LENGTH,
+    cache_size=RERANK_CACHE_SIZE
+)
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+
+from config import HYBRID_SEARCH, ARTICLE_LOOKUP, RERANK_ENABLED
+from services.metrics import histogram
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_LOAD_SECONDS = histogram(
+    "rag_resource_load_seconds", "Durée de chargement des ressources partagées (démarrage à froid)", ["resource"]
+)
+
+_MISSING = object()
+# Index pas encore construit (serveur démarré avant la première ingestion) :
+# rien n'est gardé, le chargement est retenté à l'utilisation suivante
+_NOT_BUILT = object()
+
+
+# =======================
+# 🔧 Chargeurs
+# =======================
+def _load_chroma():
+    from services.vector_db import init_chroma
+    return init_chroma()
+
+
+def _load_lexical_index():
+    if not HYBRID_SEARCH:
+        return None
+    from services.lexical_index import load_lexical_index
+    index = load_lexical_index()
+    return _NOT_BUILT if index is None else index
+
+
+def _load_article_index():
+    if not ARTICLE_LOOKUP:
+        return None
+    from services.article_index import load_article_index
+    index = load_article_index()
+    return _NOT_BUILT if index is None else index
+
+
+def _load_embeddings():
+    from services.embedding_service import embedding_service
+    embedding_service.model  # chargement du modèle sentence-transformers
+    return embedding_service
+
+
+def _load_reranker():
+    if not RERANK_ENABLED:
+        return None
+    from services.reranker import reranker
+    try:
+        reranker.model  # chargement du cross-encoder
+    except Exception as e:
+        # Comme l'index lexical absent : la recherche fonctionne sans reclassement
+        logger.warning("Cross-encoder indisponible (%s) → pas de reclassement", e)
+        return None
+    return reranker
+
+
+def _load_context_builder():
+    from services.context_builder import context_builder
+    context_builder.tokenizer  # chargement du tokenizer du modèle
+    return context_builder
+
+
+def _load_sqlite():
+    from services.conversation_db import init_db
+    init_db()
+    return True
+
+
+class Resources:
+    """
+    Registre des ressources partagées de l'application, une seule instance
+    par processus : client et collection ChromaDB, index lexical, index des
+    articles, modèle d'embedding, cross-encoder, tokenizer du contexte, base
+    SQLite de l'historique.
+    Rien n'est chargé à l'import : chaque ressource l'est à sa première
+    utilisation, ou d'avance par warm_up() au démarrage du serveur.
+    La durée de chaque chargement est mesurée (status, /ready, métriques).
+    Un index pas encore construit vaut None sans être gardé : il est pris
+    en compte dès que l'ingestion l'a créé, sans redémarrage.
+    """
+
+    # Ordre du préchargement
+    LOADERS = {
+        "chroma": _load_chroma,
+        "embeddings": _load_embeddings,
+        "lexical_index": _load_lexical_index,
+        "article_index": _load_article_index,
+        "reranker": _load_reranker,
+        "context_builder": _load_context_builder,
+        "sqlite": _load_sqlite,
+    }
+
+    def __init__(self):
+        self._values = {}
+        self._status = {name: {"state": "pending"} for name in self.LOADERS}
+        self._locks = {name: threading.Lock() for name in self.LOADERS}
+        self._created = time.perf_counter()
+        self._warm_up_thread = None
+        self._warm_up_lock = threading.Lock()
+        self.warm_up_s = None
+        self.ready_after_s = None
+
+    def get(self, name):
+        """La ressource `name`, chargée au premier appel (une seule fois, même en concurrence)."""
+        value = self._values.get(name, _MISSING)
+        if value is not _MISSING:
+            return value
+        with self._locks[name]:
+            value = self._values.get(name, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            previous = self._status[name]
+            self._status[name] = {"state": "loading"}
+            start = time.perf_counter()
+            try:
+                value = self.LOADERS[name]()
+            except Exception as e:
+                self._status[name] = {"state": "error", "error": str(e)[:200]}
+                logger.error("Échec du chargement de %s : %s", name, e)
+                raise
+            seconds = time.perf_counter() - start
+
+            if value is _NOT_BUILT:
+                # Le serveur fonctionne sans (recherche vectorielle seule, pas d'accès direct)
+                self._status[name] = {"state": "loaded", "missing": True}
+                if not previous.get("missing"):
+                    logger.warning("Index %s introuvable → ignoré jusqu'à sa construction (relancez l'ingestion)",
+                                   name)
+                if self.ready_after_s is None and self.is_ready():
+                    self.ready_after_s = round(time.perf_counter() - self._created, 3)
+                return None
+
+            self._values[name] = value
+            self._status[name] = {"state": "loaded", "load_ms": round(seconds * 1000, 1)}
+            RESOURCE_LOAD_SECONDS.observe(seconds, resource=name)
+            logger.info("Ressource %s chargée en %.0f ms", name, seconds * 1000,
+                        extra={"resource": name, "load_ms": round(seconds * 1000, 1)})
+            if self.ready_after_s is None and self.is_ready():
+                self.ready_after_s = round(time.perf_counter() - self._created, 3)
+            return value
+
+    def peek(self, name):
+        """La ressource si elle est déjà chargée, sinon None (ne déclenche aucun chargement)."""
+        value = self._values.get(name, _MISSING)
+        return None if value is _MISSING else value
+
+    # -----------------------
+    # Accès nommés
+    # -----------------------
+    @property
+    def chroma_client(self):
+        return self.get("chroma")[0]
+
+    @property
+    def collection(self):
+        return self.get("chroma")[1]
+
+    @property
+    def embeddings(self):
+        return self.get("embeddings")
+
+    @property
+    def lexical_index(self):
+        return self.get("lexical_index")
+
+    @property
+    def article_index(self):
+        return self.get("article_index")
+
+    @property
+    def reranker(self):
+        return self.get("reranker")
+
+    @property
+    def context_builder(self):
+        return self.get("context_builder")
+
+    def ensure_sqlite(self):
+        self.get("sqlite")
+
+    # -----------------------
+    # Démarrage et disponibilité
+    # -----------------------
+    def warm_up(self) -> dict:
+        """Charge toutes les ressources ; les erreurs sont journalisées, pas levées."""
+        start = time.perf_counter()
+        for name in self.LOADERS:
+            try:
+                self.get(name)
+            except Exception:
+                pass
+        self.warm_up_s = round(time.perf_counter() - start, 3)
+        logger.info("Préchargement terminé en %.2f s", self.warm_up_s,
+                    extra={"ready": self.is_ready(), "warm_up_s": self.warm_up_s})
+        return self.get_status()
+
+    def start_warm_up(self):
+        """Lance warm_up dans un thread (une seule fois) : le serveur répond pendant le chargement."""
+        with self._warm_up_lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+                self._warm_up_thread.start()
+
+    def is_ready(self) -> bool:
+        return all(status["state"] == "loaded" for status in self._status.values())
+
+    def get_status(self) -> dict:
+        """Disponibilité et temps de chargement de chaque ressource (démarrage à froid)."""
+        return {
+            "ready": self.is_ready(),
+            "resources": {name: dict(status) for name, status in self._status.items()},
+            "warm_up_s": self.warm_up_s,
+            # Depuis la création du registre (import de l'application)
+            "ready_after_s": self.ready_after_s,
+        }
+
+
+resources = Resources()
@@ -0,0 +1,66 @@
+from typing import Optional
+
+# Longueur de l'extrait cité dans les références légales
+SNIPPET_CHARS = 250
+# Le chunker préfixe les chunks de suite par "intitulé […] " (voir StructureChunker)
+CONTINUATION_MARK = " […] "
+
+
+def strip_continuation(text: str, heading: str) -> str:
+    """Retire l'intitulé de l'article répété en tête d'un chunk de suite."""
+    heading = " ".join(str(heading).split())
+    if heading and text.startswith(heading + CONTINUATION_MARK):
+        return text[len(heading) + len(CONTINUATION_MARK):]
+    return text
+
+
+def make_snippet(text: str, heading: str = "", limit: int = SNIPPET_CHARS) -> str:
+    """Extrait affiché dans les références : début du chunk, sans l'intitulé répété."""
+    text = strip_continuation(" ".join(str(text).split()), heading)
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+class RetrievedChunk:
+    """
+    Chunk retenu par la recherche, transmis tel quel jusqu'à la mise en
+    forme : assemblage du contexte, références légales et fallback lisent
+    ses champs au lieu de re-découper le texte du contexte.
+    L'extrait ('snippet') est calculé à l'ingestion ; pour un chunk indexé
+    avant, il l'est ici.
+    """
+
+    __slots__ = ("id", "doc", "article", "text", "snippet", "parent_id", "chunk_index")
+
+    def __init__(self, id: str, doc: str, article: str, text: str, snippet: str,
+                 parent_id: Optional[str] = None, chunk_index: int = 0):
+        self.id = id
+        self.doc = doc
+        self.article = article
+        self.text = text
+        self.snippet = snippet
+        self.parent_id = parent_id
+        self.chunk_index = chunk_index
+
+    @classmethod
+    def from_result(cls, chunk_id: str, text: str, meta: dict) -> "RetrievedChunk":
+        """Depuis un résultat ChromaDB (id, document, métadonnées)."""
+        meta = meta or {}
+        article = str(meta.get('article', 'Article sans titre')).strip()
+        text = " ".join(str(text).split())
+        return cls(
+            id=chunk_id,
+            doc=str(meta.get('doc', meta.get('source', 'Document inconnu'))).strip(),
+            article=article,
+            text=text,
+            snippet=meta.get('snippet') or make_snippet(text, article),
+            parent_id=meta.get('parent_id'),
+            chunk_index=int(meta.get('chunk_id', 0) or 0),
+        )
+
+    @property
+    def reference(self) -> str:
+        """Intitulé de la référence : "document - article"."""
+        return f"{self.doc} - {self.article}"
+
+    def __repr__(self):
+        return f"RetrievedChunk({self.id!r}, {self.reference!r})"
@@ -0,0 +1,48 @@
+import logging
+import re
+import threading
+from typing import Dict
+
+
+class _HeuristicTokenizer:
+    """
+    Estimation sans dépendance quand le tokenizer du modèle est indisponible :
+    mots et ponctuation, les mots longs comptant pour plusieurs tokens.
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        return sum(1 + len(word) // 6 for word in re.findall(r"\w+|[^\w\s]", text))
+
+
+class _HFTokenizer:
+    def __init__(self, name: str):
+        from transformers import AutoTokenizer
+        self.name = name
+        self._tokenizer = AutoTokenizer.from_pretrained(name)
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+
+logger = logging.getLogger(__name__)
+
+_tokenizers: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_tokenizer(name: str):
+    """
+    Tokenizer Hugging Face `name` (chargé une fois par processus), ou
+    l'estimation heuristique s'il ne peut pas être chargé (hors ligne...).
+    """
+    if name not in _tokenizers:
+        with _lock:
+            if name not in _tokenizers:
+                try:
+                    _tokenizers[name] = _HFTokenizer(name)
+                except Exception as e:
+                    logger.warning("Tokenizer '%s' indisponible (%s) → estimation heuristique", name, str(e)[:80])
+                    _tokenizers[name] = _HeuristicTokenizer()
+    return _tokenizers[name]
@@ -55,4 +55,16 @@ def reset_chroma():
     )
     print(f"✅ Collection '{COLLECTION_NAME}' recréée")
     
-    return client, collection
\ No newline at end of file
+    return client, collection
+
+def get_article_chunks(collection, parent_id):
+    """
+    Tous les chunks d'un article (métadonnée 'parent_id'), dans l'ordre du
+    texte : permet d'élargir un chunk retrouvé à l'article complet
+    """
+    result = collection.get(where={"parent_id": parent_id}, include=["documents", "metadatas"])
+    chunks = sorted(
+        zip(result['ids'], result['documents'], result['metadatas']),
+        key=lambda chunk: chunk[2].get('chunk_id', 0)
+    )
+    return chunks